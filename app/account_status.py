@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+from app.clients.operator_client import operator_client
+from app.config import settings
+from app.logging_config import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class AccountStatusCache:
+    """
+    Operator account statuses keyed by external player id.
+
+    Filled in bulk from the operator and patched by status webhooks so wallet
+    requests never wait on a remote call. Players without a fresh entry are
+    treated as active; the operator still has the final say on every call.
+    """
+
+    def __init__(self, ttl_seconds: float | None = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.account_status_ttl_seconds
+        self._statuses: dict[str, tuple[str, float]] = {}
+
+    def status(self, external_player_id: str) -> str | None:
+        entry = self._statuses.get(external_player_id)
+        if entry is None or entry[1] < time.monotonic():
+            return None
+        return entry[0]
+
+    def is_blocked(self, external_player_id: str) -> bool:
+        return self.status(external_player_id) in settings.blocked_account_statuses
+
+    def update(self, external_player_id: str, status: str):
+        self._statuses[external_player_id] = (status.lower(), time.monotonic() + self.ttl_seconds)
+
+    def replace_all(self, statuses: list[dict]) -> int:
+        expires_at = time.monotonic() + self.ttl_seconds
+        self._statuses = {item["playerId"]: (item["status"].lower(), expires_at) for item in statuses}
+        return len(self._statuses)
+
+    def clear(self):
+        self._statuses = {}
+
+
+account_status_cache = AccountStatusCache()
+
+
+async def refresh_account_statuses() -> int:
+    statuses = await operator_client.list_player_statuses()
+    count = account_status_cache.replace_all(statuses)
+    logger.info("Refreshed %s operator account statuses", count)
+    return count
+
+
+async def background_status_refresh_worker():
+    while True:
+        try:
+            await refresh_account_statuses()
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Account status refresh failed: error=%s", exc)
+        await asyncio.sleep(settings.account_status_refresh_seconds)
@@ -0,0 +1,180 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import func
+
+from app import database
+from app.config import WalletAction, settings
+from app.logging_config import get_logger
+from app.models import models
+from app.outbox_log import outbox_log
+
+
+logger = get_logger(__name__)
+
+
+class AdmissionController:
+    """
+    Decides whether new wallet calls are admitted, from signals sampled in this process.
+
+    While any signal is over its threshold, debits are shed with a retryable 503 so
+    the operator backlog stops growing; credits are still admitted so wins settle.
+    Independently, each player may only have a few wallet calls in flight, so one
+    busy player cannot hold every slot while others wait.
+    """
+
+    def __init__(self):
+        self.outbox_depth = 0
+        self.oldest_pending_seconds = 0.0
+        self.commit_latency_ms = 0.0
+        self.loop_lag_ms = 0.0
+        self.sampled_at: datetime | None = None
+        self.shed = 0
+        self.throttled = 0
+        self._inflight: dict[str, int] = {}
+        self._commits_since_sample = 0
+
+    def observe_commit(self, seconds: float):
+        alpha = settings.admission_ewma_alpha
+        self.commit_latency_ms += alpha * (seconds * 1000 - self.commit_latency_ms)
+        self._commits_since_sample += 1
+
+    def age_commit_latency(self):
+        """
+        Decay commit latency toward zero over a sample interval without commits.
+
+        Shed debits never reach a commit, so without this a debit-only workload would
+        keep shedding on a stale latency until some credit happened to commit.
+        """
+        if not self._commits_since_sample:
+            self.commit_latency_ms *= 1 - settings.admission_ewma_alpha
+        self._commits_since_sample = 0
+
+    def observe_loop_lag(self, seconds: float):
+        alpha = settings.admission_ewma_alpha
+        self.loop_lag_ms += alpha * (max(seconds, 0.0) * 1000 - self.loop_lag_ms)
+
+    def overloaded(self) -> list[str]:
+        """
+        Names of the signals currently over their thresholds.
+        """
+        checks = {
+            "outbox_depth": self.outbox_depth > settings.admission_max_outbox_depth,
+            "oldest_pending": self.oldest_pending_seconds > settings.admission_max_oldest_pending_seconds,
+            "commit_latency": self.commit_latency_ms > settings.admission_max_commit_latency_ms,
+            "loop_lag": self.loop_lag_ms > settings.admission_max_loop_lag_ms,
+        }
+        return [name for name, over in checks.items() if over]
+
+    def check(self, wallet_action: str):
+        if not settings.admission_enabled or wallet_action != WalletAction.DEBIT:
+            return
+        reasons = self.overloaded()
+        if reasons:
+            self.shed += 1
+            logger.warning("Shedding debit: reasons=%s", ",".join(reasons))
+            raise HTTPException(
+                status_code=503,
+                detail="overloaded",
+                headers={"Retry-After": str(settings.admission_retry_after_seconds)},
+            )
+
+    @asynccontextmanager
+    async def player_slot(self, player_id: str):
+        if settings.admission_enabled and self._inflight.get(player_id, 0) >= settings.admission_player_max_inflight:
+            self.throttled += 1
+            raise HTTPException(
+                status_code=429,
+                detail="too many requests in flight for player",
+                headers={"Retry-After": "1"},
+            )
+        self._inflight[player_id] = self._inflight.get(player_id, 0) + 1
+        try:
+            yield
+        finally:
+            remaining = self._inflight[player_id] - 1
+            if remaining:
+                self._inflight[player_id] = remaining
+            else:
+                del self._inflight[player_id]
+
+    def sample_outbox(self):
+        """
+        Read operator outbox depth and oldest undelivered record across shards and the outbox log (blocking).
+        """
+        model = models.OperatorWebhookOutbox
+        depth = 0
+        oldest: datetime | None = None
+        sessions = database.ShardSessions()
+        try:
+            for _, db in sessions.all():
+                count, first = (
+                    db.query(func.count(model.id), func.min(model.created_at))
+                    .filter(model.status.in_(("pending", "failed")))
+                    .one()
+                )
+                depth += count
+                if first is not None and (oldest is None or first < oldest):
+                    oldest = first
+        finally:
+            sessions.close()
+        if settings.outbox_backend == "log":
+            count, first = outbox_log.backlog("operator")
+            depth += count
+            if first is not None and (oldest is None or first < oldest.replace(tzinfo=None)):
+                oldest = first
+        now = datetime.utcnow()
+        self.outbox_depth = depth
+        self.oldest_pending_seconds = (now - oldest.replace(tzinfo=None)).total_seconds() if oldest else 0.0
+        self.sampled_at = now
+
+    def state(self) -> dict:
+        reasons = self.overloaded()
+        return {
+            "enabled": settings.admission_enabled,
+            "shedding": settings.admission_enabled and bool(reasons),
+            "reasons": reasons,
+            "signals": {
+                "outboxDepth": self.outbox_depth,
+                "oldestPendingSeconds": round(self.oldest_pending_seconds, 3),
+                "commitLatencyMs": round(self.commit_latency_ms, 3),
+                "loopLagMs": round(self.loop_lag_ms, 3),
+                "sampledAt": self.sampled_at.isoformat() if self.sampled_at else None,
+            },
+            "thresholds": {
+                "outboxDepth": settings.admission_max_outbox_depth,
+                "oldestPendingSeconds": settings.admission_max_oldest_pending_seconds,
+                "commitLatencyMs": settings.admission_max_commit_latency_ms,
+                "loopLagMs": settings.admission_max_loop_lag_ms,
+                "playerMaxInflight": settings.admission_player_max_inflight,
+            },
+            "playersInflight": len(self._inflight),
+            "shed": self.shed,
+            "throttled": self.throttled,
+        }
+
+    def clear(self):
+        self.__init__()
+
+
+admission_controller = AdmissionController()
+
+
+async def background_admission_worker():
+    while True:
+        admission_controller.age_commit_latency()
+        try:
+            await asyncio.to_thread(admission_controller.sample_outbox)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Admission sampling failed: error=%s", exc)
+        await asyncio.sleep(settings.admission_sample_seconds)
+
+
+async def background_loop_lag_monitor(interval: float = 0.1):
+    while True:
+        started = time.monotonic()
+        await asyncio.sleep(interval)
+        admission_controller.observe_loop_lag(time.monotonic() - started - interval)
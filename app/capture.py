@@ -0,0 +1,127 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import settings
+from app.logging_config import get_logger
+
+
+logger = get_logger(__name__)
+
+# Never written to a capture file; the replay driver signs and authenticates on its own.
+SECRET_HEADERS = {"authorization", "x-signature", "x-timestamp", "cookie", "proxy-authorization"}
+
+
+class CaptureWriter:
+    """
+    Append-only JSONL file of captured requests, one compact line per request.
+
+    Lines are collected in memory and appended every CAPTURE_FLUSH_EVERY requests
+    by a single background thread, off the event loop. Each flush is one write on a
+    descriptor opened with O_APPEND, so API workers sharing the file never split or
+    interleave each other's lines.
+    """
+
+    def __init__(self):
+        self._fd: int | None = None
+        self._path: str | None = None
+        self._lines: list[bytes] = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="capture")
+
+    def write(self, record: dict):
+        self._lines.append((json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8"))
+        if len(self._lines) >= settings.capture_flush_every:
+            lines, self._lines = self._lines, []
+            self._executor.submit(self._append, settings.capture_file, lines)
+
+    def flush(self):
+        """
+        Append pending lines and wait for every queued append (blocking).
+        """
+        lines, self._lines = self._lines, []
+        self._executor.submit(self._append, settings.capture_file, lines).result()
+
+    def _append(self, path: str, lines: list[bytes]):
+        if not lines:
+            return
+        try:
+            if self._fd is None or self._path != path:
+                self._close_fd()
+                self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                self._path = path
+            data = b"".join(lines)
+            while data:
+                data = data[os.write(self._fd, data):]
+        except OSError as exc:
+            logger.warning("Traffic capture write failed: path=%s error=%s", path, exc)
+
+    def _close_fd(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def close(self):
+        self.flush()
+        self._executor.submit(self._close_fd).result()
+
+
+capture_writer = CaptureWriter()
+
+
+def _captured(path: str) -> bool:
+    return bool(settings.capture_file) and any(path.startswith(prefix) for prefix in settings.capture_paths)
+
+
+class TrafficCaptureMiddleware:
+    """
+    ASGI middleware recording wallet and webhook traffic when CAPTURE_FILE is set.
+
+    Each line holds the wall-clock start time, method, path, query string, headers
+    without secrets, the JSON body, whether the request was signed, the response
+    status and the duration in milliseconds.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _captured(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        started = time.time()
+        chunks: list[bytes] = []
+        status: list[int] = []
+
+        async def capture_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                chunks.append(message.get("body", b""))
+            return message
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope["headers"]}
+            raw_body = b"".join(chunks)
+            try:
+                body = json.loads(raw_body) if raw_body else None
+            except ValueError:
+                body = raw_body.decode("utf-8", "replace")
+            record = {
+                "ts": round(started, 6),
+                "m": scope["method"],
+                "p": scope["path"],
+                "q": scope["query_string"].decode("latin-1"),
+                "h": {k: v for k, v in headers.items() if k not in SECRET_HEADERS and k not in ("host", "content-length")},
+                "b": body,
+                "signed": "x-signature" in headers,
+                "s": status[0] if status else 500,
+                "ms": round((time.time() - started) * 1000, 3),
+            }
+            capture_writer.write(record)
@@ -0,0 +1,13 @@
+from datetime import datetime
+
+
+def range_params(created_from: datetime | None, created_to: datetime | None) -> dict:
+    """
+    ``createdFrom`` / ``createdTo`` query parameters understood by the operator and RGS list endpoints.
+    """
+    params = {}
+    if created_from is not None:
+        params["createdFrom"] = created_from.isoformat()
+    if created_to is not None:
+        params["createdTo"] = created_to.isoformat()
+    return params
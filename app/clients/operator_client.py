@@ -1,15 +1,53 @@
+from datetime import datetime
+
 import httpx
 from fastapi import HTTPException
+from app.clients.common import range_params
 from app.config import settings
 
+
 class OperatorClient:
     def __init__(self):
-        base_url = str(settings.operator_base_url)
-        self.client = httpx.AsyncClient(base_url=base_url, timeout=10.0)
+        self._client: httpx.AsyncClient | None = None
         self._tokens = []
-    
-    async def list_transactions(self):
-        resp = await self.client.get("/v2/transactions")
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=str(settings.operator_base_url), timeout=10.0)
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def list_transactions(self, created_from: datetime | None = None, created_to: datetime | None = None):
+        items: list[dict] = []
+        after_id = 0
+        while True:
+            resp = await self.client.get(
+                "/v2/transactions", params={**range_params(created_from, created_to), "limit": settings.reconciliation_page_size, "afterId": after_id}
+            )
+            if resp.status_code != 200:
+                raise HTTPException(status_code=resp.status_code, detail=resp.text)
+            items.extend(resp.json())
+            next_after_id = resp.headers.get("X-Next-After-Id")
+            if not next_after_id:
+                return items
+            after_id = int(next_after_id)
+
+    async def digest(self, granularity: str, start: datetime, end: datetime) -> list[dict]:
+        resp = await self.client.get(
+            "/v2/transactions/digest",
+            params={"granularity": granularity, "start": start.isoformat(), "end": end.isoformat()},
+        )
+        if resp.status_code == 200:
+            return resp.json()
+        raise HTTPException(status_code=resp.status_code, detail=resp.text)
+
+    async def list_player_statuses(self):
+        resp = await self.client.get("/v2/players/statuses")
         if resp.status_code == 200:
             return resp.json()
         raise HTTPException(status_code=resp.status_code, detail=resp.text)
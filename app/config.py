@@ -1,7 +1,22 @@
 from enum import Enum
-from pydantic import AnyHttpUrl
+from pydantic import AnyHttpUrl, BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Optional
+from typing import Literal, Optional
+
+
+class DeliveryTarget(BaseModel):
+    """
+    Per-target overrides for outbound delivery; unset values fall back to the global settings.
+    """
+    base_url: AnyHttpUrl
+    rate_limit_per_minute: Optional[int] = None
+    max_retries: Optional[int] = None
+    retry_backoff_seconds: Optional[float] = None
+    max_connections: Optional[int] = None
+    concurrency: Optional[int] = None
+    timeout_seconds: Optional[float] = None
+    breaker_failure_threshold: Optional[int] = None
+    breaker_reset_seconds: Optional[float] = None
 
 
 class Settings(BaseSettings):
@@ -12,11 +27,90 @@ class Settings(BaseSettings):
     hmac_secret: str = "change_secret"
     bearer_token: Optional[str] = None
     db_url: str = "sqlite:///./integration.db"
+    shard_db_urls: list[str] = []
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_mmap_size: int = 268_435_456
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_cache_size_kib: int = 65_536
+    group_commit_enabled: bool = False
+    group_commit_interval_ms: float = 2.0
+    group_commit_max_batch: int = 256
+    outbox_dedup_cache_size: int = 10_000
+    outbox_max_attempts: int = 10
+    outbox_max_backoff_seconds: float = 300.0
+    outbox_backend: Literal["db", "log"] = "db"
+    outbox_log_dir: str = "./outbox-log"
+    outbox_log_segment_bytes: int = 64 * 1024 * 1024
+    outbox_log_compact_live_ratio: float = 0.25
+    outbox_log_fsync: bool = False
+    outbox_lane_weights: dict[str, int] = {"credit": 4, "debit": 2, "notification": 1}
+    outbox_lane_concurrency: dict[str, int] = {"credit": 8, "debit": 8, "notification": 4}
+    outbox_max_inflight: int = 16
+    outbox_starvation_seconds: float = 30.0
+    outbox_lane_metrics_window: int = 1000
+    bulk_replay_chunk_size: int = 1000
+    bulk_replay_release_per_second: float = 50.0
+    webhook_inbox_enabled: bool = False
+    webhook_inbox_batch_size: int = 500
+    webhook_inbox_poll_seconds: float = 0.5
+    create_schema_on_startup: bool = True
+    run_background_tasks: bool = True
+    run_outbox_worker: bool = True
+    api_workers: int = 1
+    dispatcher_processes: int = 0
+    dispatcher_index: int = 0
+    dispatcher_count: int = 1
     max_retries: int = 3
     retry_backoff_seconds: float = 1.0
     rate_limit_per_minute: int = 60
+    delivery_targets: dict[str, DeliveryTarget] = {}
+    target_concurrency: int = 8
+    target_max_connections: int = 20
+    target_timeout_seconds: float = 10.0
+    breaker_failure_threshold: int = 5
+    breaker_reset_seconds: float = 30.0
     timestamp_skew_seconds: int = 5
     supported_currencies: list[str] = ["USD", "EUR"]
+    player_mapping_cache_size: int = 100_000
+    player_mapping_ttl_seconds: float = 300.0
+    player_mapping_negative_ttl_seconds: float = 30.0
+    player_mapping_preload_limit: int = 50_000
+    player_mapping_fallback_suffix: str = "_ext"
+    starting_balance_cents: int = 0
+    account_status_ttl_seconds: float = 300.0
+    account_status_refresh_seconds: float = 60.0
+    blocked_account_statuses: list[str] = ["blocked", "suspended", "closed"]
+    operator_call_mode: Literal["outbox", "sync"] = "outbox"
+    operator_sync_deadline_ms: float = 800.0
+    admission_enabled: bool = True
+    admission_max_outbox_depth: int = 10_000
+    admission_max_oldest_pending_seconds: float = 120.0
+    admission_max_commit_latency_ms: float = 500.0
+    admission_max_loop_lag_ms: float = 250.0
+    admission_player_max_inflight: int = 4
+    admission_retry_after_seconds: int = 5
+    admission_sample_seconds: float = 1.0
+    admission_ewma_alpha: float = 0.2
+    reconciliation_page_size: int = 1000
+    reconciliation_mode: Literal["full", "digest"] = "full"
+    reconciliation_window_hours: int = 24
+    reconciliation_digest_levels: list[Literal["day", "hour", "minute"]] = ["hour", "minute"]
+    capture_file: str = ""
+    capture_paths: list[str] = ["/wallet/", "/webhooks/incoming", "/webhooks/player-status"]
+    capture_flush_every: int = 100
+    json_backend: Literal["auto", "orjson", "stdlib"] = "auto"
+    recent_transactions_ttl_seconds: float = 120.0
+    recent_transactions_max_size: int = 100_000
+    transaction_status_ttl_seconds: float = 600.0
+    transaction_status_max_size: int = 100_000
+    transaction_status_max_wait_seconds: float = 30.0
+    transaction_status_poll_seconds: float = 1.0
+    transaction_status_batch_limit: int = 500
+    ledger_snapshot_interval_seconds: float = 30.0
+    ledger_verify_tail: bool = False
 
 settings = Settings()
 
@@ -0,0 +1,78 @@
+"""
+Direct payload mapping between hub, operator and RGS shapes.
+
+Builds the outbound dicts straight from the validated request models, without an
+intermediate pydantic model and dump. Amounts are carried as integer cents:
+
+- hub -> operator: ``cents / 100``. Integer division into a float is correctly
+  rounded, so this is the exact decimal amount whenever one exists.
+- operator -> RGS: operator amounts are parsed from JSON decimals, so
+  ``round(amount * 100)`` is exact for whole cents; anything else (sub-cent
+  amounts, huge values) goes through ``Decimal(repr(amount))`` with
+  banker's rounding.
+
+The output matches ``OperatorWalletRequest`` / ``RgsRequest`` dumps, except that
+amounts are rounded to whole cents instead of inheriting float error.
+"""
+from decimal import ROUND_HALF_EVEN, Decimal
+
+from app.config import operator_hub_action_map
+from app.schemas.app_schemas import WalletRequest, WebhookPayload
+
+_ONE = Decimal(1)
+_HUNDRED = Decimal(100)
+# Below 2**53 / 100 the product amount * 100 is within 1e-6 of the exact value for whole cents.
+_FAST_PATH_LIMIT = 2 ** 53 / 100
+_EVENTS = dict(operator_hub_action_map)
+
+
+def round_cents(amount_cents: float) -> int:
+    """
+    Integer cents for an amount already expressed in cents (hub requests, which
+    ``WalletRequest`` only accepts as whole cents).
+    """
+    return int(amount_cents)
+
+
+def units_to_cents(amount: float) -> int:
+    """
+    Whole cents for an amount in currency units (operator callbacks).
+    """
+    if abs(amount) < _FAST_PATH_LIMIT:
+        scaled = amount * 100
+        cents = round(scaled)
+        if abs(scaled - cents) < 1e-6:
+            return int(cents)
+    return int((Decimal(repr(amount)) * _HUNDRED).quantize(_ONE, rounding=ROUND_HALF_EVEN))
+
+
+def cents_to_units(cents: int) -> float:
+    return cents / 100
+
+
+def operator_wallet_payload(request: WalletRequest, correlation_id: str, amount_cents: int | None = None) -> dict:
+    """
+    Operator wallet call body; equivalent to ``OperatorWalletRequest.from_wallet_request(...).model_dump()``.
+    """
+    cents = amount_cents if amount_cents is not None else round_cents(request.amountCents)
+    return {
+        "amount": cents / 100,
+        "currency": request.currency,
+        "reference": request.refId,
+        "correlationId": correlation_id,
+    }
+
+
+def rgs_payload(payload: WebhookPayload) -> dict:
+    """
+    RGS notification body; equivalent to ``RgsRequest.from_webhook_payload(...).model_dump()``.
+    """
+    return {
+        "playerId": payload.playerId,
+        "amountCents": units_to_cents(payload.amount),
+        "currency": payload.currency,
+        "status": payload.status,
+        "event": _EVENTS[payload.event],
+        "refId": payload.refId,
+        "correlationId": payload.correlationId,
+    }
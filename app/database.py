@@ -1,10 +1,174 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import zlib
+
+from sqlalchemy import create_engine, event, inspect, make_url, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from app.config import settings
 
-engine = create_engine(settings.db_url, connect_args={"check_same_thread": False} if settings.db_url.startswith("sqlite") else {})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+_engine: Engine | None = None
+_shard_engines: dict[int, Engine] = {}
+
+
+def _create_engine(db_url: str) -> Engine:
+    url = make_url(db_url)
+    options = {}
+    # In-memory SQLite uses a SingletonThreadPool, which takes no pool size.
+    if issubclass(url.get_dialect().get_pool_class(url), QueuePool):
+        options = {"pool_size": settings.db_pool_size, "max_overflow": settings.db_max_overflow}
+    engine = create_engine(
+        db_url,
+        connect_args={"check_same_thread": False} if db_url.startswith("sqlite") else {},
+        **options,
+    )
+    if db_url.startswith("sqlite"):
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+
+def get_engine() -> Engine:
+    """
+    Return the process engine, creating it (and its pool) on first use.
+    """
+    global _engine
+    if _engine is None:
+        _engine = _create_engine(settings.db_url)
+        SessionLocal.configure(bind=_engine)
+    return _engine
+
+
+def _apply_sqlite_pragmas(dbapi_connection, _connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+        # NORMAL is durable across application crashes in WAL mode; only an OS crash can drop the last commits.
+        cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+        cursor.execute(f"PRAGMA cache_size=-{int(settings.sqlite_cache_size_kib)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+
+def dispose_engine():
+    """
+    Close pooled connections; the next session builds fresh engines from settings.
+    """
+    global _engine
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
+    for engine in _shard_engines.values():
+        engine.dispose()
+    _shard_engines.clear()
+
+
+class _LazySessionMaker(sessionmaker):
+    def __call__(self, **local_kw):
+        get_engine()
+        return super().__call__(**local_kw)
+
+
+SessionLocal = _LazySessionMaker(autocommit=False, autoflush=False)
+
+
+def __getattr__(name: str):
+    # Keep `database.engine` working without building the engine at import time.
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def shard_count() -> int:
+    return len(settings.shard_db_urls) or 1
+
+
+def shard_for(player_id: str) -> int:
+    """
+    Stable shard index for a player; identical in every process.
+    """
+    count = shard_count()
+    if count == 1:
+        return 0
+    return zlib.crc32(player_id.encode()) % count
+
+
+def get_shard_engine(index: int) -> Engine:
+    """
+    Engine for a player-data shard. Without SHARD_DB_URLS the only shard is the main database.
+    """
+    if not settings.shard_db_urls:
+        return get_engine()
+    engine = _shard_engines.get(index)
+    if engine is None:
+        engine = _create_engine(settings.shard_db_urls[index])
+        _shard_engines[index] = engine
+    return engine
+
+
+def shard_session(index: int, **kw) -> Session:
+    return SessionLocal(bind=get_shard_engine(index), **kw)
+
+
+class ShardSessions:
+    """
+    Per-request provider that opens at most one session per shard.
+    """
+
+    def __init__(self):
+        self._sessions: dict[int, Session] = {}
+
+    def for_shard(self, index: int) -> Session:
+        session = self._sessions.get(index)
+        if session is None:
+            session = shard_session(index)
+            self._sessions[index] = session
+        return session
+
+    def for_player(self, player_id: str) -> Session:
+        return self.for_shard(shard_for(player_id))
+
+    def all(self) -> list[tuple[int, Session]]:
+        return [(index, self.for_shard(index)) for index in range(shard_count())]
+
+    def close(self):
+        for session in self._sessions.values():
+            session.close()
+        self._sessions.clear()
+
+
+def init_db():
+    """
+    Create missing tables. Run once per deployment, not in every worker process.
+    """
+    from app.models import models  # noqa: F401  (registers the tables on Base)
+
+    engines = [get_engine()]
+    if settings.shard_db_urls:
+        engines += [get_shard_engine(index) for index in range(shard_count())]
+    for engine in engines:
+        Base.metadata.create_all(bind=engine)
+        # create_all skips existing tables, so add columns and indexes introduced after they were created.
+        _add_missing_columns(engine)
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+
+def _add_missing_columns(engine: Engine):
+    """
+    Add nullable columns that the models gained after the table was created.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
 
 def get_db():
     db = SessionLocal()
@@ -12,3 +176,10 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_shard_db():
+    sessions = ShardSessions()
+    try:
+        yield sessions
+    finally:
+        sessions.close()
@@ -1,3 +1,4 @@
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 from app.models import models
@@ -12,8 +13,37 @@ def get_or_create_idempotency(db: Session, key: str, body_hash: str):
     return None
 
 
-def store_idempotency(db: Session, key: str, body_hash: str, response_body: dict):
+def add_idempotency(db: Session, key: str, body_hash: str, response_body: dict):
     record = models.IdempotencyKey(key=key, request_hash=body_hash, response_body=response_body)
     db.add(record)
+    return record
+
+
+def store_idempotency(db: Session, key: str, body_hash: str, response_body: dict):
+    add_idempotency(db, key, body_hash, response_body)
     db.commit()
-    return response_body
\ No newline at end of file
+    return response_body
+
+
+def update_idempotency_response(db: Session, key: str, response_body: dict):
+    db.query(models.IdempotencyKey).filter_by(key=key).update({"response_body": response_body})
+
+
+def claim_request(db: Session, kind: str, key: str, player_id: str, request_hash: str | None = None):
+    """
+    Reserve an idempotency key or refId in the shared database. Claims by the same player
+    (and, for idempotency keys, the same body) pass again, so retries still reach their shard.
+    """
+    existing = db.query(models.RequestClaim).filter_by(kind=kind, key=key).first()
+    if existing is None:
+        db.add(models.RequestClaim(kind=kind, key=key, player_id=player_id, request_hash=request_hash))
+        try:
+            db.commit()
+            return
+        except IntegrityError:
+            # Claimed concurrently by another process.
+            db.rollback()
+            existing = db.query(models.RequestClaim).filter_by(kind=kind, key=key).one()
+    if existing.player_id != player_id or existing.request_hash != request_hash:
+        detail = "idempotency conflict" if kind == "idempotency" else "duplicate reference"
+        raise HTTPException(status_code=409, detail=detail)
@@ -0,0 +1,124 @@
+import asyncio
+import time
+from typing import Any, Callable, TypeVar
+
+from sqlalchemy.orm import Session
+
+from app import database
+from app.admission import admission_controller
+from app.config import settings
+from app.logging_config import get_logger
+
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+WriteFn = Callable[[Session], Any]
+
+
+class GroupCommitWriter:
+    """
+    Batches writes from concurrent requests into one transaction per shard.
+
+    Callers submit a function that stages its changes on the given session and
+    are resumed only after the batch containing it has been committed. If the
+    batch fails, its writes are retried one by one so a single bad write (for
+    example a unique-key conflict) only fails its own caller.
+    """
+
+    def __init__(self, interval_ms: float | None = None, max_batch: int | None = None):
+        self.interval_ms = interval_ms if interval_ms is not None else settings.group_commit_interval_ms
+        self.max_batch = max_batch if max_batch is not None else settings.group_commit_max_batch
+        self._pending: dict[int, list[tuple[WriteFn, asyncio.Future]]] = {}
+        self._timers: dict[int, asyncio.TimerHandle] = {}
+        self._flushing: set[int] = set()
+        self.batches = 0
+
+    async def submit(self, write: Callable[[Session], T], shard: int = 0) -> T:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(shard, [])
+        pending.append((write, future))
+        if len(pending) >= self.max_batch:
+            self._schedule_flush(shard)
+        elif shard not in self._timers:
+            self._timers[shard] = loop.call_later(self.interval_ms / 1000, self._schedule_flush, shard)
+        return await future
+
+    def _schedule_flush(self, shard: int):
+        timer = self._timers.pop(shard, None)
+        if timer is not None:
+            timer.cancel()
+        if self._pending.get(shard):
+            asyncio.ensure_future(self.flush(shard))
+
+    async def flush(self, shard: int = 0):
+        if shard in self._flushing:
+            # The running flush drains whatever arrives while it commits.
+            return
+        self._flushing.add(shard)
+        try:
+            while self._pending.get(shard):
+                pending = self._pending[shard]
+                batch, self._pending[shard] = pending[: self.max_batch], pending[self.max_batch :]
+                try:
+                    outcomes = await asyncio.to_thread(self._commit_batch, shard, [write for write, _ in batch])
+                except Exception as exc:  # noqa: BLE001
+                    outcomes = [(False, exc)] * len(batch)
+                self.batches += 1
+                for (_, future), (ok, value) in zip(batch, outcomes):
+                    if future.done():
+                        continue
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+        finally:
+            self._flushing.discard(shard)
+
+    def _commit_batch(self, shard: int, writes: list[WriteFn]) -> list[tuple[bool, Any]]:
+        db = database.shard_session(shard, expire_on_commit=False)
+        try:
+            try:
+                results = [write(db) for write in writes]
+                db.commit()
+                return [(True, result) for result in results]
+            except Exception as exc:  # noqa: BLE001
+                db.rollback()
+                if len(writes) == 1:
+                    return [(False, exc)]
+                logger.warning("Group commit of %s writes failed, retrying individually: error=%s", len(writes), exc)
+            outcomes: list[tuple[bool, Any]] = []
+            for write in writes:
+                try:
+                    result = write(db)
+                    db.commit()
+                    outcomes.append((True, result))
+                except Exception as exc:  # noqa: BLE001
+                    db.rollback()
+                    outcomes.append((False, exc))
+            return outcomes
+        finally:
+            db.close()
+
+
+group_commit_writer = GroupCommitWriter()
+
+
+async def run_write(db: Session, write: Callable[[Session], T], shard: int = 0) -> T:
+    """
+    Apply a write either through the group-commit writer or directly on the shard's request session.
+    """
+    started = time.perf_counter()
+    if settings.group_commit_enabled:
+        result = await group_commit_writer.submit(write, shard)
+    else:
+        try:
+            result = write(db)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    # Feeds the commit-latency signal used for admission control.
+    admission_controller.observe_commit(time.perf_counter() - started)
+    return result
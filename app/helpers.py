@@ -1,10 +1,14 @@
+import base64
 import hashlib
 import json
 import asyncio
 import time
 import httpx
+from datetime import datetime
+from collections.abc import Mapping
 from typing import Union, List
 
+from app import json_codec
 from app.config import settings
 from app.models import models
 from fastapi import HTTPException
@@ -19,9 +23,28 @@ def validate_currency(currency: str):
         raise HTTPException(status_code=422, detail="unsupported currency")
 
 
-def serialize_outbox(record: Union[models.RGSWebhookOutbox, models.OperatorWebhookOutbox]) -> dict:
+OUTBOX_FIELDS = (
+    "id",
+    "eventType",
+    "targetUrl",
+    "status",
+    "attemptCount",
+    "nextAttemptAt",
+    "lastError",
+    "createdAt",
+    "payload",
+    "queue",
+    "shard",
+)
+
+
+def serialize_outbox(
+    record: Union[models.RGSWebhookOutbox, models.OperatorWebhookOutbox],
+    shard: int = 0,
+    fields: set[str] | None = None,
+) -> dict:
     queue = "rgs" if isinstance(record, models.RGSWebhookOutbox) else "operator"
-    return {
+    data = {
         "id": record.id,
         "eventType": record.event_type,
         "targetUrl": record.target_url,
@@ -30,9 +53,56 @@ def serialize_outbox(record: Union[models.RGSWebhookOutbox, models.OperatorWebho
         "nextAttemptAt": record.next_attempt_at.isoformat() if record.next_attempt_at else None,
         "lastError": record.last_error,
         "createdAt": record.created_at.isoformat() if record.created_at else None,
-        "payload": record.payload,
+        # Only touch the payload when asked for, so deferred loads stay deferred.
+        "payload": record.payload if fields is None or "payload" in fields else None,
         "queue": queue,
+        "shard": shard,
     }
+    if fields is None:
+        return data
+    return {key: value for key, value in data.items() if key in fields}
+
+
+def parse_outbox_fields(fields: str | None) -> set[str] | None:
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(OUTBOX_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"unknown fields: {', '.join(sorted(unknown))}")
+    return requested
+
+
+def encode_cursor(created_at: datetime, shard: int, record_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{shard}|{record_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int, int]:
+    try:
+        created_at, shard, record_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(shard), int(record_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise HTTPException(status_code=400, detail="invalid cursor") from exc
+
+
+def serialize_dead_letter(record: models.DeadLetterOutbox, shard: int = 0) -> dict:
+    return {
+        "id": record.id,
+        "queue": record.queue,
+        "originalId": record.original_id,
+        "eventType": record.event_type,
+        "targetUrl": record.target_url,
+        "attemptCount": record.attempt_count,
+        "lastError": record.last_error,
+        "createdAt": record.created_at.isoformat() if record.created_at else None,
+        "deadAt": record.dead_at.isoformat() if record.dead_at else None,
+        "payload": record.payload,
+        "shard": shard,
+    }
+
+
+JSON_HEADERS = {"Content-Type": "application/json"}
 
 
 class IntegrationClient:
@@ -41,13 +111,36 @@ class IntegrationClient:
         rate_limit_per_minute: int | None = None,
         max_retries: int | None = None,
         retry_backoff_seconds: float | None = None,
+        base_url: str | None = None,
+        max_connections: int | None = None,
+        timeout_seconds: float | None = None,
     ):
-        base_url = str(settings.operator_base_url)
-        self.client = httpx.AsyncClient(base_url=base_url, timeout=10.0)
+        self._client: httpx.AsyncClient | None = None
         self._tokens: List[float] = []
         self.rate_limit_per_minute = rate_limit_per_minute if rate_limit_per_minute is not None else settings.rate_limit_per_minute
         self.max_retries = max_retries if max_retries is not None else settings.max_retries
         self.retry_backoff_seconds = retry_backoff_seconds if retry_backoff_seconds is not None else settings.retry_backoff_seconds
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.timeout_seconds = timeout_seconds if timeout_seconds is not None else settings.target_timeout_seconds
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            options = {}
+            if self.max_connections:
+                options["limits"] = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url or str(settings.operator_base_url),
+                timeout=self.timeout_seconds,
+                **options,
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
     async def _respect_rate_limit(self) -> bool:
         now = time.time()
@@ -57,16 +150,20 @@ class IntegrationClient:
         self._tokens.append(time.time())
         return True
 
-    async def _request_with_retry(self, method: str, url: str, json: dict) -> httpx.Response:
+    async def _request_with_retry(self, method: str, url: str, json: Mapping) -> httpx.Response:
+        # Encoded once; stored outbox payloads are sent as the bytes already in the database.
+        content = json_codec.encode(json)
         retries = 0
         backoff = self.retry_backoff_seconds
         while retries <= self.max_retries:
             allowed = await self._respect_rate_limit()
             if not allowed:
-                headers = {"Retry-After": str(backoff)}
+                # The oldest call in the window frees the next slot.
+                oldest = self._tokens[0] if self._tokens else time.time()
+                headers = {"Retry-After": str(max(60 - (time.time() - oldest), 0.0))}
                 return httpx.Response(status_code=429, headers=headers, request=httpx.Request(method, url))
             try:
-                response = await self.client.request(method, url, json=json)
+                response = await self.client.request(method, url, content=content, headers=JSON_HEADERS)
             except httpx.RequestError as exc:
                 # Surface network/DNS errors as a downstream failure.
                 raise HTTPException(status_code=502, detail=f"operator request error: {exc}") from exc
@@ -0,0 +1,169 @@
+import asyncio
+from datetime import datetime
+
+from pydantic import ValidationError
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import database
+from app.config import settings
+from app.logging_config import get_logger
+from app.models import models
+from app.schemas.app_schemas import WebhookPayload
+from app.transaction_status import transaction_statuses
+from app.webhooks import add_outbox_rows, existing_dedup_keys, recent_outbox_keys, rgs_outbox_row
+
+
+logger = get_logger(__name__)
+
+
+def append_inbox(db: Session, payload: WebhookPayload):
+    """
+    Store an operator callback for later processing: one insert, one commit.
+    """
+    record = models.WebhookInbox(payload=payload.model_dump(by_alias=True), status="pending")
+    db.add(record)
+    db.commit()
+    return record
+
+
+def _apply_matches(shard_db: Session, shard_matches: dict, outbox_rows: dict):
+    shard_db.execute(
+        update(models.Transaction)
+        .where(models.Transaction.id.in_(list(shard_matches.values())))
+        .values(status="sent")
+    )
+    seen = existing_dedup_keys(shard_db, models.RGSWebhookOutbox, list(outbox_rows))
+    new_rows = [row for key, row in outbox_rows.items() if key not in seen]
+    if new_rows:
+        add_outbox_rows(shard_db, models.RGSWebhookOutbox, new_rows)
+    shard_db.commit()
+
+
+def process_inbox(db: Session, sessions: database.ShardSessions) -> int:
+    """
+    Apply one batch of pending callbacks and return the number of inbox rows handled.
+    """
+    handled, dedup_keys, correlation_ids = _process_batch(db, sessions)
+    _publish(dedup_keys, correlation_ids)
+    return handled
+
+
+def _publish(dedup_keys: list[str], correlation_ids: list[str]):
+    """
+    Update the in-process caches for a processed batch; runs on the event loop, which owns them.
+    """
+    for key in dedup_keys:
+        recent_outbox_keys.add(key)
+    for correlation_id in correlation_ids:
+        transaction_statuses.mark(correlation_id, "sent")
+
+
+def _process_batch(db: Session, sessions: database.ShardSessions) -> tuple[int, list[str], list[str]]:
+    """
+    Database work of ``process_inbox``; also returns the enqueued dedup keys and the
+    correlationIds marked sent, for ``_publish``.
+
+    Transactions are matched in bulk per shard, updated with one UPDATE and their RGS
+    outbox rows inserted with one executemany (or appended to the outbox log), skipping callbacks already enqueued. Shard writes commit before the inbox
+    rows are marked, so a crash in between replays the batch (at-least-once).
+    """
+    batch = (
+        db.query(models.WebhookInbox)
+        .filter(models.WebhookInbox.status == "pending")
+        .order_by(models.WebhookInbox.id)
+        .limit(settings.webhook_inbox_batch_size)
+        .all()
+    )
+    if not batch:
+        return 0, [], []
+    target_url = str(settings.rgs_webhook_url)
+    now = datetime.utcnow()
+    payloads: dict[int, WebhookPayload] = {}
+    outbox_row_for: dict[int, dict] = {}
+    for item in batch:
+        # Rows written before the schema was tightened (or by older processes) may not map;
+        # they are set aside so one bad callback cannot stall the inbox.
+        try:
+            payloads[item.id] = WebhookPayload(**item.payload)
+            outbox_row_for[item.id] = rgs_outbox_row(payloads[item.id], target_url)
+        except (ValidationError, KeyError, TypeError, ValueError) as exc:
+            payloads.pop(item.id, None)
+            item.status = "failed"
+            item.last_error = str(exc)[:500]
+            item.processed_at = now
+            logger.warning("Invalid webhook in inbox: inbox_id=%s error=%s", item.id, exc)
+    if not payloads:
+        db.commit()
+        return len(batch), [], []
+    wanted = {(p.correlationId, p.refId) for p in payloads.values()}
+    correlation_ids = list({correlation_id for correlation_id, _ in wanted})
+
+    matched: set[tuple[str, str]] = set()
+    dedup_keys: list[str] = []
+    for _, shard_db in sessions.all():
+        rows = (
+            shard_db.query(models.Transaction.id, models.Transaction.correlation_id, models.Transaction.ref_id)
+            .filter(models.Transaction.correlation_id.in_(correlation_ids))
+            .all()
+        )
+        shard_matches = {(r.correlation_id, r.ref_id): r.id for r in rows if (r.correlation_id, r.ref_id) in wanted}
+        if not shard_matches:
+            continue
+        outbox_rows = {}
+        for item_id, p in payloads.items():
+            if (p.correlationId, p.refId) in shard_matches:
+                row = outbox_row_for[item_id]
+                outbox_rows.setdefault(row["dedup_key"], row)
+        try:
+            _apply_matches(shard_db, shard_matches, outbox_rows)
+        except IntegrityError:
+            # The API path enqueued one of these notifications concurrently; the retry skips it.
+            shard_db.rollback()
+            logger.info("Duplicate RGS notification committed concurrently, retrying inbox batch")
+            _apply_matches(shard_db, shard_matches, outbox_rows)
+        dedup_keys.extend(outbox_rows)
+        matched.update(shard_matches)
+
+    for item in batch:
+        payload = payloads.get(item.id)
+        if payload is None:
+            continue
+        if (payload.correlationId, payload.refId) in matched:
+            item.status = "processed"
+        else:
+            item.status = "unmatched"
+            logger.warning(
+                "Unknown webhook in inbox: refId=%s correlationId=%s inbox_id=%s",
+                payload.refId,
+                payload.correlationId,
+                item.id,
+            )
+        item.processed_at = now
+    db.commit()
+    logger.info("Processed %s inbox callbacks, matched=%s", len(batch), len(matched))
+    return len(batch), dedup_keys, [correlation_id for correlation_id, _ in matched]
+
+
+def _inbox_pass() -> tuple[int, list[str], list[str]]:
+    db = database.SessionLocal()
+    sessions = database.ShardSessions()
+    try:
+        return _process_batch(db, sessions)
+    finally:
+        sessions.close()
+        db.close()
+
+
+async def background_inbox_worker():
+    while True:
+        try:
+            # Batches are blocking database work; keep them off the loop that acknowledges callbacks.
+            handled, dedup_keys, correlation_ids = await asyncio.to_thread(_inbox_pass)
+            _publish(dedup_keys, correlation_ids)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Inbox pass failed: error=%s", exc)
+            handled = 0
+        # Keep draining while batches come back full.
+        await asyncio.sleep(settings.webhook_inbox_poll_seconds if handled < settings.webhook_inbox_batch_size else 0)
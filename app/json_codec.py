@@ -0,0 +1,106 @@
+"""
+JSON encoding for API responses, outbox storage and outbound requests.
+
+Uses orjson when it is installed (and ``JSON_BACKEND`` is not ``stdlib``),
+otherwise the standard library with compact separators. Both produce UTF-8
+bytes. Request hashing and HMAC signatures keep using ``json.dumps`` directly,
+because their exact formatting is part of the wire contract.
+"""
+import json
+from collections.abc import Mapping
+from datetime import date, datetime
+from typing import Any, Iterator
+
+from fastapi.responses import JSONResponse
+
+from app.config import settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+class EncodedPayload(Mapping):
+    """
+    Read-only mapping over an encoded JSON object, decoded on first access.
+
+    Outbox payloads are loaded as these, so the dispatcher can send ``raw``
+    without decoding and re-encoding the body.
+    """
+
+    __slots__ = ("raw", "_decoded")
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+        self._decoded: dict | None = None
+
+    def _data(self) -> dict:
+        if self._decoded is None:
+            self._decoded = loads(self.raw)
+        return self._decoded
+
+    def __getitem__(self, key: str) -> Any:
+        return self._data()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data())
+
+    def __len__(self) -> int:
+        return len(self._data())
+
+    def __repr__(self) -> str:
+        return f"EncodedPayload({self.raw!r})"
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, EncodedPayload):
+        return obj._data()
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_default).encode("utf-8")
+
+
+def stdlib_loads(data: bytes | str) -> Any:
+    return json.loads(data)
+
+
+def orjson_dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_default)
+
+
+def _select_backend() -> str:
+    if settings.json_backend == "stdlib" or orjson is None:
+        return "stdlib"
+    return "orjson"
+
+
+backend = _select_backend()
+dumps = orjson_dumps if backend == "orjson" else stdlib_dumps
+loads = orjson.loads if backend == "orjson" else stdlib_loads
+
+
+def encode(payload: Any) -> bytes:
+    """
+    Encoded bytes for a payload, reusing them when it is already encoded.
+    """
+    if isinstance(payload, EncodedPayload):
+        return payload.raw
+    if isinstance(payload, (bytes, bytearray)):
+        return bytes(payload)
+    return dumps(payload)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with the selected backend.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
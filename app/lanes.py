@@ -0,0 +1,172 @@
+from collections import OrderedDict, deque
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from app.config import WalletAction, settings
+
+
+# Highest priority first: credits settle player wins, debits move money, notifications only inform the RGS.
+LANES = ("credit", "debit", "notification")
+
+
+def lane_for(queue: str, event_type: str) -> str:
+    if queue == "rgs":
+        return "notification"
+    return "credit" if event_type == WalletAction.CREDIT else "debit"
+
+
+def host_of(url: str) -> str:
+    return urlsplit(str(url)).netloc
+
+
+def due_since(record) -> datetime:
+    """
+    When the record became deliverable: its creation, or the end of its last backoff.
+    """
+    due = record.created_at
+    if record.next_attempt_at is not None and (due is None or record.next_attempt_at > due):
+        due = record.next_attempt_at
+    return (due or datetime.utcnow()).replace(tzinfo=None)
+
+
+class LaneQueue:
+    """
+    Records of one lane, FIFO per target host, with hosts taking turns.
+    """
+
+    def __init__(self):
+        self._hosts: OrderedDict[str, deque] = OrderedDict()
+        self._size = 0
+
+    def push(self, host: str, record):
+        self._hosts.setdefault(host, deque()).append(record)
+        self._size += 1
+
+    def __len__(self) -> int:
+        return self._size
+
+    def heads(self, usable) -> list[tuple[str, object]]:
+        """
+        ``(host, record)`` for the next record of every host that ``usable(host)`` accepts, in turn order.
+        """
+        return [(host, queued[0]) for host, queued in self._hosts.items() if usable(host)]
+
+    def remaining(self) -> dict[str, int]:
+        return {host: len(queued) for host, queued in self._hosts.items()}
+
+    def pop(self, host: str):
+        queued = self._hosts[host]
+        record = queued.popleft()
+        self._size -= 1
+        if queued:
+            self._hosts.move_to_end(host)
+        else:
+            del self._hosts[host]
+        return record
+
+
+def plan_lanes(records: list[tuple[str, object]]) -> dict[str, LaneQueue]:
+    """
+    Split ``(queue, record)`` pairs into lanes, oldest first per target host.
+    """
+    planned = {lane: LaneQueue() for lane in LANES}
+    for queue, record in sorted(records, key=lambda item: (due_since(item[1]), item[1].id)):
+        planned[lane_for(queue, record.event_type)].push(host_of(record.target_url), record)
+    return planned
+
+
+class WeightedRoundRobin:
+    """
+    Smooth weighted round robin: over any window each lane gets turns in proportion to
+    its weight, interleaved instead of in bursts.
+    """
+
+    def __init__(self, weights: dict[str, int]):
+        self.weights = weights
+        self._current = {lane: 0 for lane in weights}
+
+    def pick(self, lanes: list[str]) -> str:
+        total = 0
+        for lane in lanes:
+            weight = max(self.weights.get(lane, 1), 1)
+            self._current[lane] = self._current.get(lane, 0) + weight
+            total += weight
+        chosen = max(lanes, key=lambda lane: self._current[lane])
+        self._current[chosen] -= total
+        return chosen
+
+
+class LaneMetrics:
+    """
+    Per-lane delivery counters and recent latencies for this process.
+
+    Queue wait is the time from a record becoming due to its delivery starting;
+    delivery time is the duration of the outbound call.
+    """
+
+    def __init__(self, window: int | None = None):
+        self.window = window if window is not None else settings.outbox_lane_metrics_window
+        self._lanes = {lane: self._empty() for lane in LANES}
+
+    def _empty(self) -> dict:
+        return {
+            "pending": 0,
+            "inflight": 0,
+            "dispatched": 0,
+            "sent": 0,
+            "failed": 0,
+            "promoted": 0,
+            "queue_wait_ms": deque(maxlen=self.window),
+            "delivery_ms": deque(maxlen=self.window),
+        }
+
+    def set_pending(self, lane: str, count: int):
+        self._lanes[lane]["pending"] = count
+
+    def started(self, lane: str, queue_wait_seconds: float, promoted: bool = False):
+        data = self._lanes[lane]
+        data["pending"] = max(data["pending"] - 1, 0)
+        data["inflight"] += 1
+        data["dispatched"] += 1
+        data["promoted"] += int(promoted)
+        data["queue_wait_ms"].append(max(queue_wait_seconds, 0.0) * 1000)
+
+    def finished(self, lane: str, delivery_seconds: float, ok: bool):
+        data = self._lanes[lane]
+        data["inflight"] -= 1
+        data["sent" if ok else "failed"] += 1
+        data["delivery_ms"].append(delivery_seconds * 1000)
+
+    @staticmethod
+    def _summary(samples: deque) -> dict:
+        ordered = sorted(samples)
+        if not ordered:
+            return {"p50": 0.0, "p95": 0.0, "max": 0.0}
+
+        def percentile(p: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3)
+
+        return {"p50": percentile(0.50), "p95": percentile(0.95), "max": round(ordered[-1], 3)}
+
+    def state(self) -> dict:
+        return {
+            lane: {
+                "weight": settings.outbox_lane_weights.get(lane, 1),
+                "concurrency": settings.outbox_lane_concurrency.get(lane, 1),
+                "pending": data["pending"],
+                "inflight": data["inflight"],
+                "dispatched": data["dispatched"],
+                "sent": data["sent"],
+                "failed": data["failed"],
+                "promoted": data["promoted"],
+                "queueWaitMs": self._summary(data["queue_wait_ms"]),
+                "deliveryMs": self._summary(data["delivery_ms"]),
+            }
+            for lane, data in self._lanes.items()
+        }
+
+    def clear(self):
+        self.__init__()
+
+
+lane_metrics = LaneMetrics()
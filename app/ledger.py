@@ -0,0 +1,158 @@
+import asyncio
+from collections import defaultdict
+from weakref import WeakValueDictionary
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app.config import WalletAction, settings
+from app.database import ShardSessions, shard_for
+from app.logging_config import get_logger
+from app.models import models
+
+
+logger = get_logger(__name__)
+
+
+def signed_amount(direction: str, amount_cents: int) -> int:
+    return -amount_cents if direction == WalletAction.DEBIT else amount_cents
+
+
+class BalanceLedger:
+    """
+    Running per-player balances kept in memory.
+
+    The transaction log is the source of truth: a cold player is recovered from its
+    latest snapshot plus the transactions written after it, and dirty balances are
+    snapshotted periodically so recovery only replays a short tail.
+    """
+
+    def __init__(self, starting_balance_cents: int | None = None, verify_tail: bool | None = None):
+        self.starting_balance_cents = (
+            starting_balance_cents if starting_balance_cents is not None else settings.starting_balance_cents
+        )
+        self.verify_tail = verify_tail if verify_tail is not None else settings.ledger_verify_tail
+        # player_id -> (balance_cents, last_transaction_id)
+        self._balances: dict[str, tuple[int, int]] = {}
+        self._dirty: set[str] = set()
+        self._locks: WeakValueDictionary[str, asyncio.Lock] = WeakValueDictionary()
+
+    def lock(self, player_id: str) -> asyncio.Lock:
+        """
+        Per-player lock; hold it across read, write and commit to avoid lost updates.
+        """
+        lock = self._locks.get(player_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[player_id] = lock
+        return lock
+
+    def balance(self, db: Session, player_id: str, before_transaction_id: int | None = None) -> int:
+        """
+        Current balance, excluding transactions from before_transaction_id onwards.
+
+        With verify_tail enabled, rows committed by other processes since the cached
+        entry are folded in. Call it after flushing the new transaction row so the
+        database write lock already serializes writers across processes.
+        """
+        cached = self._balances.get(player_id)
+        if cached is None:
+            cached = self._recover(db, player_id, before_transaction_id)
+        elif self.verify_tail:
+            cached = self._apply_tail(db, player_id, *cached, before_transaction_id)
+        self._balances[player_id] = cached
+        return cached[0]
+
+    def record(self, player_id: str, balance_cents: int, transaction_id: int):
+        """
+        Store the balance produced by a committed transaction.
+        """
+        self._balances[player_id] = (balance_cents, transaction_id)
+        self._dirty.add(player_id)
+
+    def reverse(self, player_id: str, transaction_id: int, delta_cents: int):
+        """
+        Apply ``delta_cents`` to a cached balance that already counts a transaction rejected afterwards.
+        """
+        cached = self._balances.get(player_id)
+        if cached is not None and cached[1] >= transaction_id:
+            self._balances[player_id] = (cached[0] + delta_cents, cached[1])
+            self._dirty.add(player_id)
+
+    def _recover(self, db: Session, player_id: str, before_transaction_id: int | None) -> tuple[int, int]:
+        snapshot = db.query(models.BalanceSnapshot).filter(models.BalanceSnapshot.player_id == player_id).first()
+        balance = snapshot.balance_cents if snapshot else self.starting_balance_cents
+        last_id = snapshot.last_transaction_id if snapshot else 0
+        return self._apply_tail(db, player_id, balance, last_id, before_transaction_id)
+
+    def _apply_tail(
+        self, db: Session, player_id: str, balance: int, last_id: int, before_transaction_id: int | None
+    ) -> tuple[int, int]:
+        txn = models.Transaction
+        delta = case((txn.direction == WalletAction.DEBIT.value, -txn.amount_cents), else_=txn.amount_cents)
+        query = (
+            db.query(func.coalesce(func.sum(delta), 0), func.max(txn.id))
+            .filter(txn.player_id == player_id)
+            .filter(txn.id > last_id)
+            .filter(txn.status != "rejected")
+        )
+        if before_transaction_id is not None:
+            query = query.filter(txn.id < before_transaction_id)
+        tail_sum, tail_last_id = query.one()
+        return int(balance + tail_sum), tail_last_id or last_id
+
+    def snapshot(self, sessions: ShardSessions) -> int:
+        """
+        Persist balances changed since the previous snapshot; returns the number written.
+        """
+        dirty, self._dirty = self._dirty, set()
+        by_shard: dict[int, list[str]] = defaultdict(list)
+        for player_id in dirty:
+            by_shard[shard_for(player_id)].append(player_id)
+        written = 0
+        error: Exception | None = None
+        for shard, player_ids in by_shard.items():
+            db = sessions.for_shard(shard)
+            existing = {
+                s.player_id: s
+                for s in db.query(models.BalanceSnapshot).filter(models.BalanceSnapshot.player_id.in_(player_ids))
+            }
+            for player_id in player_ids:
+                balance, last_id = self._balances[player_id]
+                snapshot = existing.get(player_id)
+                if snapshot is None:
+                    db.add(models.BalanceSnapshot(player_id=player_id, balance_cents=balance, last_transaction_id=last_id))
+                else:
+                    snapshot.balance_cents = balance
+                    snapshot.last_transaction_id = last_id
+            try:
+                db.commit()
+                written += len(player_ids)
+            except Exception as exc:  # noqa: BLE001
+                db.rollback()
+                self._dirty.update(player_ids)
+                error = exc
+        if error is not None:
+            raise error
+        return written
+
+    def clear(self):
+        self._balances.clear()
+        self._dirty.clear()
+
+
+balance_ledger = BalanceLedger()
+
+
+async def background_snapshot_worker():
+    while True:
+        await asyncio.sleep(settings.ledger_snapshot_interval_seconds)
+        sessions = ShardSessions()
+        try:
+            count = balance_ledger.snapshot(sessions)
+            if count:
+                logger.info("Snapshotted %s player balances", count)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Balance snapshot failed: error=%s", exc)
+        finally:
+            sessions.close()
@@ -1,107 +1,469 @@
 import asyncio
 import json
 import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
 from typing import Literal
 
 from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response
 from fastapi.openapi.docs import get_swagger_ui_html
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, defer
 
+from app.account_status import account_status_cache, background_status_refresh_worker
+from app.admission import admission_controller, background_admission_worker, background_loop_lag_monitor
+from app.capture import TrafficCaptureMiddleware, capture_writer
+from app.clients.operator_client import operator_client
+from app.clients.rgs_client import rgs_client
 from app.config import WalletAction, hub_operator_action_map, operator_hub_action_map, settings
-from app.database import SessionLocal, engine, get_db
-from app.db import get_or_create_idempotency, store_idempotency
-from app.helpers import hash_request, serialize_outbox, validate_currency
+from app.contracts.mapping import round_cents
+from app.database import (
+    SessionLocal,
+    ShardSessions,
+    dispose_engine,
+    get_db,
+    get_shard_db,
+    init_db,
+    shard_count,
+    shard_for,
+)
+from app.db import add_idempotency, claim_request, get_or_create_idempotency, update_idempotency_response
+from app.group_commit import run_write
+from app.helpers import (
+    decode_cursor,
+    encode_cursor,
+    hash_request,
+    parse_outbox_fields,
+    serialize_dead_letter,
+    serialize_outbox,
+    validate_currency,
+)
+from app.inbox import append_inbox, background_inbox_worker
+from app.json_codec import FastJSONResponse
+from app.lanes import lane_metrics
+from app.ledger import background_snapshot_worker, balance_ledger, signed_amount
 from app.logging_config import get_logger
 from app.models import models
-from app.reconciliation import generate_reconciliation_csv
-from app.schemas.app_schemas import WalletRequest, WalletResponse, WebhookPayload
+from app.outbox_log import outbox_log
+from app.player_mappings import player_mapping_service
+from app.recent_transactions import recent_transactions
+from app.reconciliation import compute_digest, generate_reconciliation_csv, reconciliation_window
+from app.schemas.app_schemas import (
+    BulkReplayRequest,
+    DeadLetterReplayRequest,
+    PlayerStatusPayload,
+    TransactionStatusQuery,
+    WalletRequest,
+    WalletResponse,
+    WebhookPayload,
+)
 from app.security import require_bearer_token, validate_signature
-from app.webhooks import background_outbox_worker, enqueue_operator_item, enqueue_rgs_item
+from app.transaction_status import FINAL_STATUSES, public_status, transaction_status, transaction_statuses
+from app.webhooks import (
+    add_operator_item,
+    OUTBOX_MODELS,
+    add_rgs_item,
+    background_outbox_worker,
+    bulk_replay,
+    call_operator_with_deadline,
+    delivery_targets,
+    integration_client,
+    mark_outbox_sent,
+    operator_rejection_reason,
+    recent_outbox_keys,
+    replay_dead_letters,
+    rgs_dedup_key,
+)
 
 
 logger = get_logger(__name__)
 
-models.Base.metadata.create_all(bind=engine)
-app = FastAPI(title="Integration Hub")
 
-STARTING_BALANCE_CENTS = 0
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """
+    Build process-wide resources on startup and release them on shutdown.
+
+    The engine and HTTP clients are created lazily on first use, so importing
+    the app stays cheap and tests only pay for what they touch.
+    """
+    if settings.create_schema_on_startup:
+        init_db()
+    with SessionLocal() as db:
+        player_mapping_service.preload(db)
+    tasks: list[asyncio.Task] = []
+    if settings.run_background_tasks:
+        if settings.run_outbox_worker:
+            logger.info("Starting Integration Hub background outbox worker")
+            tasks.append(asyncio.create_task(background_outbox_worker()))
+            if settings.webhook_inbox_enabled:
+                tasks.append(asyncio.create_task(background_inbox_worker()))
+        tasks.append(asyncio.create_task(background_snapshot_worker()))
+        tasks.append(asyncio.create_task(background_status_refresh_worker()))
+        if settings.admission_enabled:
+            tasks.append(asyncio.create_task(background_admission_worker()))
+            tasks.append(asyncio.create_task(background_loop_lag_monitor()))
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        sessions = ShardSessions()
+        try:
+            balance_ledger.snapshot(sessions)
+        finally:
+            sessions.close()
+        await integration_client.aclose()
+        await delivery_targets.aclose()
+        await operator_client.aclose()
+        await rgs_client.aclose()
+        capture_writer.close()
+        outbox_log.close()
+        dispose_engine()
 
-def _resolve_external_player_id(player_id: str) -> str:
-    # In a real implementation, this would query a mapping service or database
-    return f'{player_id}_ext'  # For mock purposes, return as is
+app = FastAPI(title="Integration Hub", lifespan=lifespan, default_response_class=FastJSONResponse)
+app.add_middleware(TrafficCaptureMiddleware)
 
-@app.on_event("startup")
-async def startup_event():
-    logger.info("Starting Integration Hub background outbox worker")
-    loop = asyncio.get_event_loop()
-    loop.create_task(background_outbox_worker(SessionLocal))
+async def _resolve_external_player_id(player_id: str) -> str | None:
+    external_player_id = await player_mapping_service.resolve(player_id)
+    if external_player_id is None and settings.player_mapping_fallback_suffix:
+        # Players without a stored mapping fall back to the derived id used by the mock operator.
+        return f"{player_id}{settings.player_mapping_fallback_suffix}"
+    return external_player_id
 
 @app.post("/wallet/{wallet_action}", response_model=WalletResponse)
 async def wallet_action_route(
     wallet_action: Literal[WalletAction.DEBIT, WalletAction.CREDIT],
     request: WalletRequest,
     _auth=Depends(require_bearer_token),
-    db: Session = Depends(get_db),
+    shards: ShardSessions = Depends(get_shard_db),
+    shared_db: Session = Depends(get_db),
     idempotency_key: str | None = Header(None),
     x_signature: str | None = Header(None),
     x_timestamp: str | None = Header(None),
+    x_operator_brand: str | None = Header(None),
 ):
     body = request.model_dump(by_alias=True)
     # Validate signature if headers are provided - for testing purposes those can be optional
     if x_signature and x_timestamp:
         validate_signature(body, x_signature, x_timestamp)
     validate_currency(request.currency)
+    operator_base_url = _operator_base_url(x_operator_brand)
     body_hash = hash_request(body)
+    shard = shard_for(request.playerId)
+    db = shards.for_shard(shard)
     if idempotency_key:
         existing = get_or_create_idempotency(db, idempotency_key, body_hash)
         if existing:
-            return existing
-    if request.playerId.endswith("_bad"):
-        return {
-            'status': 'REJECTED',
-            'reason': "User Account Is Blocked",
-        }
-    external_player_id = _resolve_external_player_id(request.playerId)
+            return FastJSONResponse(existing)
+    if shard_count() > 1:
+        # Each shard only sees its own players; keys reused by another player are caught here.
+        if idempotency_key:
+            claim_request(shared_db, "idempotency", idempotency_key, request.playerId, body_hash)
+        claim_request(shared_db, f"ref_{wallet_action}", request.refId, request.playerId)
+    # Replays above are always answered; new money movement is subject to admission.
+    admission_controller.check(wallet_action)
+    async with admission_controller.player_slot(request.playerId):
+        # The route builds complete WalletResponse dicts, so skip re-validating them on the way out.
+        return FastJSONResponse(await _apply_wallet_action(wallet_action, request, shard, db, idempotency_key, body_hash, operator_base_url))
+
+def _operator_base_url(brand: str | None) -> str:
+    """
+    Operator base URL (with a trailing slash) for a brand in DELIVERY_TARGETS, or the default operator.
+    """
+    if brand is None:
+        return str(settings.operator_base_url)
+    target = settings.delivery_targets.get(brand)
+    if target is None:
+        raise HTTPException(status_code=400, detail="unknown operator brand")
+    return str(target.base_url).rstrip("/") + "/"
+
+def _rejected(reason: str) -> dict:
+    return {
+        'status': 'REJECTED',
+        'balanceCents': None,
+        'reason': reason,
+        'refId': None,
+        'correlationId': None,
+    }
+
+async def _apply_wallet_action(
+    wallet_action: str,
+    request: WalletRequest,
+    shard: int,
+    db: Session,
+    idempotency_key: str | None,
+    body_hash: str,
+    operator_base_url: str,
+):
+    external_player_id = await _resolve_external_player_id(request.playerId)
+    if external_player_id is None:
+        return _rejected("Unknown Player")
+    if account_status_cache.is_blocked(external_player_id):
+        return _rejected("User Account Is Blocked")
     operator_action = hub_operator_action_map[wallet_action]
-    operator_url = str(settings.operator_base_url) + f"v2/players/{external_player_id}/{operator_action}"
+    operator_url = operator_base_url + f"v2/players/{external_player_id}/{operator_action}"
     initial_status = "initiated"
     correlation_id = str(uuid.uuid4())
-    await enqueue_operator_item(db, wallet_action, request, correlation_id, operator_url)
+    amount_cents = round_cents(request.amountCents)
     transaction_data = {
         "ref_id": request.refId,
         "player_id": request.playerId,
-        "amount_cents": request.amountCents,
+        "amount_cents": amount_cents,
         "currency": request.currency,
         "direction": wallet_action,
         "status": initial_status,
         "correlation_id": correlation_id,
     }
-    wallet_transaction = models.Transaction(**transaction_data)
-    db.add(wallet_transaction)
-    db.commit()
+
+    sync_call = settings.operator_call_mode == "sync"
+    deadline_seconds = settings.operator_sync_deadline_ms / 1000
+
+    def write(session: Session):
+        # Outbox record, transaction and idempotency key are committed together.
+        outbox_record = add_operator_item(session, wallet_action, request, correlation_id, operator_url, amount_cents)
+        if sync_call:
+            # Keep the dispatcher off the record while the inline call is in progress.
+            outbox_record.next_attempt_at = datetime.utcnow() + timedelta(seconds=deadline_seconds + 1)
+        wallet_transaction = models.Transaction(**transaction_data)
+        session.add(wallet_transaction)
+        session.flush()
+        balance = balance_ledger.balance(session, request.playerId, wallet_transaction.id) + signed_amount(wallet_action, amount_cents)
+        wallet_transaction.balance_cents = balance
+        response = {
+            'status': initial_status,
+            'refId': request.refId,
+            'correlationId': correlation_id,
+            'balanceCents': balance,
+            'reason': None
+        }
+        if idempotency_key:
+            add_idempotency(session, idempotency_key, body_hash, response)
+        return wallet_transaction.id, outbox_record.id, outbox_record.payload, response
+
+    async with balance_ledger.lock(request.playerId):
+        transaction_id, outbox_id, operator_payload, response = await run_write(db, write, shard)
+        balance_ledger.record(request.playerId, response['balanceCents'], transaction_id)
+        if sync_call:
+            # Inside the player lock, so a rejection can be reversed before the next call reads the balance.
+            response = await _confirm_with_operator(
+                db, shard, request.playerId, wallet_action, amount_cents, transaction_id, outbox_id,
+                operator_url, operator_payload, deadline_seconds, idempotency_key, response,
+            )
+    recent_transactions.add(correlation_id, transaction_id, request.refId, shard)
+    transaction_statuses.put({
+        'refId': request.refId,
+        'correlationId': correlation_id,
+        'playerId': request.playerId,
+        'direction': wallet_action,
+        'status': 'rejected' if response['status'] == 'REJECTED' else response['status'],
+        'amountCents': amount_cents,
+        'currency': request.currency,
+        'balanceCents': response['balanceCents'],
+        'reason': response['reason'],
+        'transactionId': transaction_id,
+        'shard': shard,
+    })
     logger.info(
         "Stored wallet transaction action=%s refId=%s correlationId=%s status=%s",
         wallet_action,
         request.refId,
         correlation_id,
-        initial_status,
+        response['status'],
     )
-    # dummy balance calculation
-    balance = STARTING_BALANCE_CENTS - request.amountCents if wallet_action == WalletAction.DEBIT else STARTING_BALANCE_CENTS + request.amountCents
+    return response
 
-    response = {
-        'status': initial_status,
-        'refId': request.refId,
-        'correlationId': correlation_id,
-        'balanceCents': balance,
-        'reason': None
+async def _confirm_with_operator(
+    db: Session,
+    shard: int,
+    player_id: str,
+    wallet_action: str,
+    amount_cents: int,
+    transaction_id: int,
+    outbox_id: int,
+    operator_url: str,
+    operator_payload: dict,
+    deadline_seconds: float,
+    idempotency_key: str | None,
+    response: dict,
+) -> dict:
+    """
+    Call the operator inline. Returns the final response when it answered within the
+    deadline, or the committed `initiated` response, leaving delivery to the outbox.
+    """
+    resp = await call_operator_with_deadline(operator_url, operator_payload, deadline_seconds)
+    if resp is None or resp.status_code >= 500 or resp.status_code == 429:
+        return response
+    rejected = resp.status_code >= 400
+    if rejected:
+        final = {
+            **response,
+            'status': 'REJECTED',
+            'reason': operator_rejection_reason(resp),
+            'balanceCents': response['balanceCents'] - signed_amount(wallet_action, amount_cents),
+        }
+    else:
+        final = {**response, 'status': 'confirmed'}
+
+    def finalize(session: Session):
+        mark_outbox_sent(session, models.OperatorWebhookOutbox, outbox_id, f"rejected {resp.status_code}" if rejected else None)
+        wallet_transaction = session.get(models.Transaction, transaction_id)
+        wallet_transaction.status = "rejected" if rejected else "confirmed"
+        wallet_transaction.reason = final['reason']
+        wallet_transaction.balance_cents = final['balanceCents']
+        if idempotency_key:
+            update_idempotency_response(session, idempotency_key, final)
+
+    await run_write(db, finalize, shard)
+    if rejected:
+        # Rejected rows are left out of balance recovery, so undo this one in memory too.
+        balance_ledger.record(player_id, final['balanceCents'], transaction_id)
+    return final
+
+def _locate_transaction_shard(shards: ShardSessions, ref_id: str, correlation_id: str) -> int | None:
+    # Operator callbacks carry the external player id, so sharded lookups fan out by correlation id.
+    if shard_count() == 1:
+        return 0
+    for shard, db in shards.all():
+        found = (
+            db.query(models.Transaction.id)
+            .filter(models.Transaction.ref_id == ref_id)
+            .filter(models.Transaction.correlation_id == correlation_id)
+            .first()
+        )
+        if found:
+            return shard
+    return None
+
+def _load_statuses(shards: ShardSessions, ref_ids: list[str], correlation_ids: list[str]) -> list[dict]:
+    entries = []
+    if not ref_ids and not correlation_ids:
+        return entries
+    for shard, db in shards.all():
+        query = db.query(models.Transaction).filter(
+            or_(models.Transaction.ref_id.in_(ref_ids), models.Transaction.correlation_id.in_(correlation_ids))
+        )
+        for transaction in query:
+            entry = transaction_status(transaction, shard)
+            if entry['correlationId']:
+                transaction_statuses.put(entry)
+                entries.append(entry)
+    for ref_id in ref_ids:
+        transaction_statuses.mark_loaded(ref_id)
+    return entries
+
+def _refresh_statuses(shards: ShardSessions, entries: list[dict]) -> list[dict]:
+    """
+    Cached entries, with those not yet final re-read by primary key: another process may have moved them on.
+    """
+    stale: dict[int, list[int]] = {}
+    for entry in entries:
+        if entry['status'] not in FINAL_STATUSES:
+            stale.setdefault(entry['shard'], []).append(entry['transactionId'])
+    fresh = {}
+    for shard, ids in stale.items():
+        for transaction in shards.for_shard(shard).query(models.Transaction).filter(models.Transaction.id.in_(ids)):
+            entry = fresh[transaction.correlation_id] = transaction_status(transaction, shard)
+            transaction_statuses.put(entry)
+    return [fresh.get(entry['correlationId'], entry) for entry in entries]
+
+def _statuses_for_ref(shards: ShardSessions, ref_id: str, direction: str | None = None) -> list[dict]:
+    cached = [entry for entry in transaction_statuses.for_ref(ref_id) if direction in (None, entry['direction'])]
+    # A refId has at most one debit and one credit; with fewer cached, one may exist only in the
+    # database unless the refId was already read from it.
+    if len(cached) < (1 if direction else 2) and not transaction_statuses.loaded(ref_id):
+        cached = [entry for entry in _load_statuses(shards, [ref_id], []) if direction in (None, entry['direction'])]
+    else:
+        cached = _refresh_statuses(shards, cached)
+    return sorted(cached, key=lambda entry: entry['direction'])
+
+@app.get("/wallet/transactions/{ref_id}")
+async def get_transaction_status(
+    ref_id: str,
+    _auth=Depends(require_bearer_token),
+    shards: ShardSessions = Depends(get_shard_db),
+    direction: Literal[WalletAction.DEBIT, WalletAction.CREDIT] | None = None,
+    wait: float = Query(0, ge=0),
+    status: str | None = None,
+):
+    """
+    Status of the wallet transactions for a refId.
+
+    With ``wait`` (seconds, capped at TRANSACTION_STATUS_MAX_WAIT_SECONDS) the call long-polls:
+    it returns as soon as a transaction leaves ``status`` (by default, the status it had when
+    the call started) or when the wait runs out.
+    """
+    entries = _statuses_for_ref(shards, ref_id, direction)
+    if not entries:
+        raise HTTPException(status_code=404, detail="unknown reference")
+    if wait:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + min(wait, settings.transaction_status_max_wait_seconds)
+        seen = {entry['correlationId']: status or entry['status'] for entry in entries}
+        while all(seen.get(entry['correlationId']) == entry['status'] for entry in entries):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            # Return the connections while waiting; the next lookup opens new sessions, which
+            # also see other processes' commits.
+            shards.close()
+            # Changes made by this process wake the wait; others are picked up on the next poll.
+            await transaction_statuses.wait_for_change(list(seen), min(remaining, settings.transaction_status_poll_seconds))
+            entries = _statuses_for_ref(shards, ref_id, direction)
+    return {'refId': ref_id, 'transactions': [public_status(entry) for entry in entries]}
+
+@app.post("/wallet/transactions/query")
+async def query_transaction_statuses(
+    query: TransactionStatusQuery,
+    _auth=Depends(require_bearer_token),
+    shards: ShardSessions = Depends(get_shard_db),
+):
+    """
+    Statuses for a batch of refIds and correlationIds; the ones not found are listed under ``missing``.
+    """
+    if len(query.refIds) + len(query.correlationIds) > settings.transaction_status_batch_limit:
+        raise HTTPException(status_code=400, detail=f"at most {settings.transaction_status_batch_limit} ids per query")
+    found: dict[str, dict] = {}
+    uncached_refs = []
+    for ref_id in dict.fromkeys(query.refIds):
+        cached = transaction_statuses.for_ref(ref_id)
+        if len(cached) < 2 and not transaction_statuses.loaded(ref_id):
+            uncached_refs.append(ref_id)
+        for entry in cached:
+            found[entry['correlationId']] = entry
+    uncached_correlations = []
+    for correlation_id in dict.fromkeys(query.correlationIds):
+        entry = transaction_statuses.get(correlation_id)
+        if entry is None:
+            uncached_correlations.append(correlation_id)
+        else:
+            found[correlation_id] = entry
+    found.update((entry['correlationId'], entry) for entry in _refresh_statuses(shards, list(found.values())))
+    # One query per shard for everything the cache could not answer.
+    found.update((entry['correlationId'], entry) for entry in _load_statuses(shards, uncached_refs, uncached_correlations))
+    wanted_refs = set(query.refIds)
+    wanted_correlations = set(query.correlationIds)
+    entries = [
+        entry for entry in found.values()
+        if entry['refId'] in wanted_refs or entry['correlationId'] in wanted_correlations
+    ]
+    found_refs = {entry['refId'] for entry in entries}
+    return {
+        'transactions': [public_status(entry) for entry in sorted(entries, key=lambda entry: (entry['refId'], entry['direction']))],
+        'missing': {
+            'refIds': [ref_id for ref_id in dict.fromkeys(query.refIds) if ref_id not in found_refs],
+            'correlationIds': [correlation_id for correlation_id in dict.fromkeys(query.correlationIds) if correlation_id not in found],
+        },
     }
-    if idempotency_key:
-        store_idempotency(db, idempotency_key, body_hash, response)
-    return response
 
 @app.post("/webhooks/incoming")
-async def receive_webhook(payload: WebhookPayload, db: Session = Depends(get_db)):
+async def receive_webhook(
+    payload: WebhookPayload,
+    shards: ShardSessions = Depends(get_shard_db),
+    db: Session = Depends(get_db),
+):
     logger.info(
         "Received webhook event=%s refId=%s correlationId=%s status=%s",
         payload.event,
@@ -109,15 +471,38 @@ async def receive_webhook(payload: WebhookPayload, db: Session = Depends(get_db)
         payload.correlationId,
         payload.status,
     )
+    if settings.webhook_inbox_enabled:
+        # Acknowledge after a single insert; the inbox worker matches and forwards in batches.
+        append_inbox(db, payload)
+        return {"status": "accepted"}
     ref_id = payload.refId
     correlation_id = payload.correlationId
-    existing = (
-        db.query(models.Transaction)
-        .filter(models.Transaction.ref_id == ref_id)
-        .filter(models.Transaction.correlation_id == correlation_id)
-        .first()
-    )
-    if not existing:
+    recent = recent_transactions.get(correlation_id, ref_id)
+
+    def write(session: Session) -> bool:
+        existing = session.get(models.Transaction, recent.transaction_id) if recent else None
+        if existing is None or existing.correlation_id != correlation_id:
+            existing = (
+                session.query(models.Transaction)
+                .filter(models.Transaction.ref_id == ref_id)
+                .filter(models.Transaction.correlation_id == correlation_id)
+                .first()
+            )
+        if not existing:
+            return False
+        existing.status = "sent" # type: ignore
+        add_rgs_item(session, payload, str(settings.rgs_webhook_url))
+        return True
+
+    shard = recent.shard if recent else _locate_transaction_shard(shards, ref_id, correlation_id)
+    if shard is not None:
+        try:
+            matched = await run_write(shards.for_shard(shard), write, shard)
+        except IntegrityError:
+            # A concurrent duplicate inserted the same dedup_key first; the retry sees it and skips.
+            logger.info("Duplicate RGS notification committed concurrently, retrying: correlationId=%s", correlation_id)
+            matched = await run_write(shards.for_shard(shard), write, shard)
+    if shard is None or not matched:
         logger.warning(
             "Unknown webhook received: refId=%s correlationId=%s payload=%s",
             ref_id,
@@ -125,36 +510,111 @@ async def receive_webhook(payload: WebhookPayload, db: Session = Depends(get_db)
             payload.model_dump(by_alias=True),
         )
         raise HTTPException(status_code=404, detail="unknown reference/correlation")
-    existing.status = "sent" # type: ignore
-    db.add(existing)
-    db.commit()
+    recent_outbox_keys.add(rgs_dedup_key(payload))
+    transaction_statuses.mark(correlation_id, "sent")
     logger.info(
         "Updated transaction status to sent: refId=%s correlationId=%s event=%s",
         ref_id,
         correlation_id,
         payload.event,
     )
-    await enqueue_rgs_item(db, payload, str(settings.rgs_webhook_url))
+    return {"status": "accepted"}
+
+@app.post("/webhooks/player-status")
+async def receive_player_status(
+    payload: PlayerStatusPayload,
+    x_signature: str | None = Header(None),
+    x_timestamp: str | None = Header(None),
+):
+    """
+    Account status pushed by the operator. Unlike wallet calls the signature is required,
+    since the call can block or unblock any player.
+    """
+    if not x_signature or not x_timestamp:
+        raise HTTPException(status_code=401, detail="missing signature")
+    validate_signature(payload.model_dump(), x_signature, x_timestamp)
+    logger.info("Received player status update playerId=%s status=%s", payload.playerId, payload.status)
+    account_status_cache.update(payload.playerId, payload.status)
     return {"status": "accepted"}
 
 @app.get("/webhooks/outbox")
 async def list_outbox(
+    response: Response,
     status: str | None = None,
     queue: Literal["rgs", "operator"] = "rgs",
     limit: int = Query(100, ge=1, le=500),
+    cursor: str | None = None,
+    fields: str | None = None,
     _auth=Depends(require_bearer_token),
-    db: Session = Depends(get_db),
+    shards: ShardSessions = Depends(get_shard_db),
 ):
-    model = models.RGSWebhookOutbox if queue == "rgs" else models.OperatorWebhookOutbox
-    query = db.query(model)
-    if status:
-        query = query.filter(model.status == status)
-    records = query.order_by(model.created_at.desc()).limit(limit).all()
-    return [serialize_outbox(r) for r in records]
+    """
+    Newest records first. Pass the X-Next-Cursor response header back as `cursor` for
+    the next page, and `fields=id,status,...` to leave out the payload.
+    """
+    model = OUTBOX_MODELS[queue]
+    selected = parse_outbox_fields(fields)
+    after = decode_cursor(cursor) if cursor else None
+    records = []
+    for shard, db in shards.all():
+        query = db.query(model)
+        if selected is not None and "payload" not in selected:
+            query = query.options(defer(model.payload))
+        if status:
+            query = query.filter(model.status == status)
+        if after:
+            created_at, cursor_shard, record_id = after
+            # Pages are ordered by (created_at, shard, id) descending.
+            if shard > cursor_shard:
+                query = query.filter(model.created_at < created_at)
+            elif shard == cursor_shard:
+                query = query.filter(
+                    or_(model.created_at < created_at, and_(model.created_at == created_at, model.id < record_id))
+                )
+            else:
+                query = query.filter(model.created_at <= created_at)
+        page = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+        records.extend((r, shard) for r in page)
+    if shard_count() > 1:
+        records.sort(key=lambda item: (item[0].created_at, item[1], item[0].id), reverse=True)
+    if len(records) > limit:
+        last, last_shard = records[limit - 1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.created_at, last_shard, last.id)
+    return [serialize_outbox(r, shard, selected) for r, shard in records[:limit]]
+
+@app.get("/webhooks/outbox/counts")
+async def outbox_counts(
+    _auth=Depends(require_bearer_token),
+    shards: ShardSessions = Depends(get_shard_db),
+):
+    """
+    Record counts per queue and status, summed over shards.
+    """
+    counts: dict[str, dict[str, int]] = {queue: {} for queue in OUTBOX_MODELS}
+    for _, db in shards.all():
+        for queue, model in OUTBOX_MODELS.items():
+            for status, count in db.query(model.status, func.count(model.id)).group_by(model.status):
+                counts[queue][status] = counts[queue].get(status, 0) + count
+        for queue, count in db.query(models.DeadLetterOutbox.queue, func.count(models.DeadLetterOutbox.id)).group_by(models.DeadLetterOutbox.queue):
+            counts[queue]["dead"] = counts[queue].get("dead", 0) + count
+    if settings.outbox_backend == "log":
+        # Delivered log records are compacted away, so only undelivered ones are counted.
+        for queue, statuses in outbox_log.counts().items():
+            for status, count in statuses.items():
+                counts[queue][status] = counts[queue].get(status, 0) + count
+    return counts
 
 @app.get("/reconciliation_data")
-async def download_reconciliation_csv(_auth=Depends(require_bearer_token)):
-    csv_text, mismatch_count = await generate_reconciliation_csv()
+async def download_reconciliation_csv(
+    _auth=Depends(require_bearer_token),
+    mode: Literal["full", "digest"] | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+):
+    """
+    Mismatch CSV. ``mode`` overrides RECONCILIATION_MODE; ``start`` / ``end`` bound the digest window.
+    """
+    csv_text, mismatch_count = await generate_reconciliation_csv(start, end, mode)
     return Response(
         content=csv_text,
         media_type="text/csv",
@@ -165,29 +625,111 @@ async def download_reconciliation_csv(_auth=Depends(require_bearer_token)):
     )
 
 
+@app.get("/reconciliation/digest")
+async def reconciliation_digest(
+    _auth=Depends(require_bearer_token),
+    shards: ShardSessions = Depends(get_shard_db),
+    granularity: Literal["day", "hour", "minute"] = "hour",
+    start: datetime | None = None,
+    end: datetime | None = None,
+):
+    """
+    Digest of the hub's own transactions, in the same format as the operator and RGS digests.
+
+    Accepted transactions hash with status ``OK`` (the operator's status), rejected ones with ``REJECTED``.
+    """
+    start, end = reconciliation_window(start, end)
+    rows = []
+    for _, db in shards.all():
+        # Timestamps without fractional seconds compare unevenly in SQLite, so the query is
+        # widened by a second and the exact bounds are applied below.
+        query = db.query(
+            models.Transaction.created_at,
+            models.Transaction.correlation_id,
+            models.Transaction.amount_cents,
+            models.Transaction.status,
+        ).filter(
+            models.Transaction.correlation_id.isnot(None),
+            models.Transaction.created_at >= start - timedelta(seconds=1),
+            models.Transaction.created_at < end + timedelta(seconds=1),
+        )
+        rows.extend(
+            (created_at, correlation_id, amount_cents, "REJECTED" if status == "rejected" else "OK")
+            for created_at, correlation_id, amount_cents, status in query
+            if start <= created_at.replace(tzinfo=None) < end
+        )
+    return compute_digest(rows, granularity)
+
+
 @app.post("/admin/clear-db")
-async def clear_db(_auth=Depends(require_bearer_token), db: Session = Depends(get_db)):
+async def clear_db(
+    _auth=Depends(require_bearer_token),
+    shards: ShardSessions = Depends(get_shard_db),
+    db: Session = Depends(get_db),
+):
     """
-    Dangerous: clears transactions, idempotency, and webhook outbox tables.
+    Dangerous: clears transactions, idempotency, webhook outbox and balance snapshot tables on every shard.
     """
     logger.warning("Clearing hub database tables via admin endpoint")
-    db.query(models.Transaction).delete()
-    db.query(models.IdempotencyKey).delete()
-    db.query(models.RGSWebhookOutbox).delete()
-    db.query(models.OperatorWebhookOutbox).delete()
+    db.query(models.RequestClaim).delete()
     db.commit()
+    for _, shard_db in shards.all():
+        shard_db.query(models.Transaction).delete()
+        shard_db.query(models.IdempotencyKey).delete()
+        shard_db.query(models.RGSWebhookOutbox).delete()
+        shard_db.query(models.OperatorWebhookOutbox).delete()
+        shard_db.query(models.BalanceSnapshot).delete()
+        shard_db.query(models.DeadLetterOutbox).delete()
+        shard_db.commit()
+    balance_ledger.clear()
+    recent_outbox_keys.clear()
+    recent_transactions.clear()
+    transaction_statuses.clear()
+    outbox_log.clear()
     return {"status": "cleared"}
 
+@app.post("/admin/replay/{queue}")
+async def force_bulk_replay(
+    queue: Literal["rgs", "operator"],
+    request: BulkReplayRequest,
+    _auth=Depends(require_bearer_token),
+    shards: ShardSessions = Depends(get_shard_db),
+):
+    """
+    Reset every outbox record matching the filters to pending, releasing them at a limited rate.
+    """
+    model = OUTBOX_MODELS[queue]
+    count = 0
+    for _, db in shards.all():
+        count += bulk_replay(
+            db,
+            model,
+            request.status,
+            created_from=request.createdFrom,
+            created_to=request.createdTo,
+            event_type=request.eventType,
+            target_url=request.targetUrl,
+            dry_run=request.dryRun,
+            release_per_second=request.releasePerSecond,
+            released_before=count,
+        )
+    logger.info("Bulk replay for %s outbox: count=%s dry_run=%s filters=%s", queue, count, request.dryRun, request.model_dump())
+    return {"status": "dry-run" if request.dryRun else "replayed", "count": count}
+
 @app.post("/admin/replay/{queue}/{record_id}")
 async def force_replay(
     queue: Literal["rgs", "operator"],
     record_id: int,
+    shard: int = Query(0, ge=0),
     _auth=Depends(require_bearer_token),
-    db: Session = Depends(get_db),
+    shards: ShardSessions = Depends(get_shard_db),
 ):
     """
     Force a single outbox record back to pending and clear the last_error.
     """
+    if shard >= shard_count():
+        raise HTTPException(status_code=404, detail="unknown shard")
+    db = shards.for_shard(shard)
     model = models.RGSWebhookOutbox if queue == "rgs" else models.OperatorWebhookOutbox
     record = db.query(model).filter(model.id == record_id).first()
     if not record:
@@ -198,8 +740,83 @@ async def force_replay(
     db.add(record)
     db.commit()
     db.refresh(record)
-    logger.info("Forced replay for %s outbox record_id=%s", queue, record_id)
-    return serialize_outbox(record)
+    logger.info("Forced replay for %s outbox record_id=%s shard=%s", queue, record_id, shard)
+    return serialize_outbox(record, shard)
+
+@app.get("/admin/dead-letter")
+async def list_dead_letters(
+    queue: Literal["rgs", "operator"] | None = None,
+    limit: int = Query(100, ge=1, le=500),
+    _auth=Depends(require_bearer_token),
+    shards: ShardSessions = Depends(get_shard_db),
+):
+    model = models.DeadLetterOutbox
+    records = []
+    for shard, db in shards.all():
+        query = db.query(model)
+        if queue:
+            query = query.filter(model.queue == queue)
+        records.extend((r, shard) for r in query.order_by(model.dead_at.desc()).limit(limit))
+    if shard_count() > 1:
+        records.sort(key=lambda item: item[0].dead_at, reverse=True)
+    return [serialize_dead_letter(r, shard) for r, shard in records[:limit]]
+
+@app.post("/admin/dead-letter/replay")
+async def replay_dead_letter(
+    request: DeadLetterReplayRequest,
+    shard: int | None = Query(None, ge=0),
+    _auth=Depends(require_bearer_token),
+    shards: ShardSessions = Depends(get_shard_db),
+):
+    """
+    Move dead-letter records back to their outbox as pending. Ids are per shard, so with
+    several shards they need a shard parameter; queue/limit replays search every shard.
+    """
+    if shard is not None and shard >= shard_count():
+        raise HTTPException(status_code=404, detail="unknown shard")
+    if request.ids and shard is None and shard_count() > 1:
+        raise HTTPException(status_code=400, detail="shard is required when replaying ids")
+    targets = [shard] if shard is not None else range(shard_count())
+    count = 0
+    for index in targets:
+        count += replay_dead_letters(shards.for_shard(index), request.ids, request.queue, request.limit - count)
+        if count >= request.limit:
+            break
+    logger.info("Replayed %s dead-letter records queue=%s shard=%s", count, request.queue, shard)
+    return {"status": "replayed", "count": count}
+
+@app.get("/admin/admission")
+async def admission_state(_auth=Depends(require_bearer_token)):
+    """
+    Current load-shedding signals, thresholds and decision for this process.
+    """
+    return admission_controller.state()
+
+@app.get("/admin/outbox/lanes")
+async def outbox_lanes(_auth=Depends(require_bearer_token)):
+    """
+    Outbox priority lanes with their limits, counters and recent queue-wait and delivery latencies.
+    """
+    return lane_metrics.state()
+
+@app.get("/admin/targets")
+async def target_state(_auth=Depends(require_bearer_token)):
+    """
+    Delivery targets seen by this process, keyed by host, with their budgets and circuit breakers.
+    """
+    return delivery_targets.state()
+
+@app.post("/admin/player-mappings/invalidate")
+async def invalidate_player_mappings(
+    player_id: str | None = None,
+    _auth=Depends(require_bearer_token),
+):
+    """
+    Drop cached player mappings (all of them when no player_id is given).
+    """
+    count = player_mapping_service.invalidate(player_id)
+    logger.info("Invalidated %s cached player mappings player_id=%s", count, player_id)
+    return {"status": "invalidated", "count": count}
 
 @app.get("/swagger", include_in_schema=False)
 async def swagger_ui():
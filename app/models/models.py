@@ -1,6 +1,29 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, UniqueConstraint, Float
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime, JSON, UniqueConstraint, Float, Index, LargeBinary
+from sqlalchemy.orm import declared_attr
 from sqlalchemy.sql import func
+from sqlalchemy.types import TypeDecorator
 from app.database import Base
+from app.json_codec import EncodedPayload, encode
+
+
+class EncodedJSON(TypeDecorator):
+    """
+    JSON object stored as encoded bytes and loaded as a lazily decoded EncodedPayload.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else encode(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        # Rows written by the former JSON column come back as text.
+        return EncodedPayload(value.encode("utf-8") if isinstance(value, str) else bytes(value))
+
 
 class IdempotencyKey(Base):
     __tablename__ = "idempotency_keys"
@@ -10,6 +33,22 @@ class IdempotencyKey(Base):
     response_body = Column(JSON, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+class RequestClaim(Base):
+    """
+    Idempotency keys and refIds reserved in the shared database when player data is sharded,
+    so they stay unique across shards.
+    """
+    __tablename__ = "request_claims"
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)  # idempotency|ref_debit|ref_credit
+    key = Column(String, nullable=False)
+    player_id = Column(String, nullable=False)
+    request_hash = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    __table_args__ = (
+        UniqueConstraint('kind', 'key', name='uq_claim_kind_key'),
+    )
+
 class Transaction(Base):
     __tablename__ = "transactions"
     id = Column(Integer, primary_key=True)
@@ -23,19 +62,57 @@ class Transaction(Base):
     balance_cents = Column(Integer, nullable=True)
     correlation_id = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    __table_args__ = (UniqueConstraint('ref_id', 'direction', name='uq_ref_direction'),)
+    __table_args__ = (
+        UniqueConstraint('ref_id', 'direction', name='uq_ref_direction'),
+        Index('ix_transactions_correlation_ref', 'correlation_id', 'ref_id'),
+    )
+
+class PlayerMapping(Base):
+    __tablename__ = "player_mappings"
+    id = Column(Integer, primary_key=True)
+    player_id = Column(String, unique=True, index=True, nullable=False)
+    external_player_id = Column(String, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class BalanceSnapshot(Base):
+    __tablename__ = "balance_snapshots"
+    id = Column(Integer, primary_key=True)
+    player_id = Column(String, unique=True, index=True, nullable=False)
+    balance_cents = Column(Integer, nullable=False)
+    last_transaction_id = Column(Integer, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class WebhookInbox(Base):
+    __tablename__ = "webhook_inbox"
+    id = Column(Integer, primary_key=True)
+    payload = Column(JSON, nullable=False)
+    status = Column(String, nullable=False, default="pending", index=True)  # pending|processed|unmatched|failed
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(String, nullable=True)
 
 class WebhookOutboxBase:
     __abstract__ = True
     id = Column(Integer, primary_key=True)
     event_type = Column(String, nullable=False)
     target_url = Column(String, nullable=False)
-    payload = Column(JSON, nullable=False)
+    payload = Column(EncodedJSON, nullable=False)
     status = Column(String, nullable=False, default="pending")
     attempt_count = Column(Integer, default=0)
     next_attempt_at = Column(DateTime(timezone=True), server_default=func.now())
     last_error = Column(String, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Set client-side as well so keyset cursors compare against identically formatted values.
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow, server_default=func.now())
+    # Unique through an index, not the column, so init_db can add both to existing tables.
+    dedup_key = Column(String, nullable=True)
+
+    @declared_attr
+    def __table_args__(cls):
+        return (
+            Index(f"uq_{cls.__tablename__}_dedup_key", "dedup_key", unique=True),
+            Index(f"ix_{cls.__tablename__}_created_id", "created_at", "id"),
+            Index(f"ix_{cls.__tablename__}_status_created_id", "status", "created_at", "id"),
+        )
 
 
 class RGSWebhookOutbox(WebhookOutboxBase, Base):
@@ -44,3 +121,18 @@ class RGSWebhookOutbox(WebhookOutboxBase, Base):
 
 class OperatorWebhookOutbox(WebhookOutboxBase, Base):
     __tablename__ = "operator_webhook_outbox"
+
+
+class DeadLetterOutbox(Base):
+    __tablename__ = "dead_letter_outbox"
+    id = Column(Integer, primary_key=True)
+    queue = Column(String, nullable=False, index=True)  # rgs|operator
+    original_id = Column(Integer, nullable=False)
+    event_type = Column(String, nullable=False)
+    target_url = Column(String, nullable=False)
+    payload = Column(EncodedJSON, nullable=False)
+    attempt_count = Column(Integer, nullable=False)
+    last_error = Column(String, nullable=True)
+    dedup_key = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=True)
+    dead_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,427 @@
+"""
+Append-only, segmented outbox log on local disk (``OUTBOX_BACKEND=log``).
+
+Records are never updated in place. An enqueue frame holds a record's metadata and
+its encoded payload; every later change (attempt, sent, superseded, dead) is a
+small state frame carrying the record id. The live records are indexed in
+memory with the segment and offset of their payload, which is read back through
+a memory map only when it is sent.
+
+Frames are staged on the SQLAlchemy session and written after it commits, so a
+rolled-back wallet call never enqueues anything. The price is that a crash between
+the database commit and the log write loses that record. The DB backend keeps the
+record in the same transaction and stays the default.
+
+Segments roll over at ``OUTBOX_LOG_SEGMENT_BYTES``. Starting from the oldest, sealed
+segments where at most ``OUTBOX_LOG_COMPACT_LIVE_RATIO`` of the records are still
+live have those records copied to the active segment (with their current state)
+and are deleted.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.json_codec import EncodedPayload, encode
+from app.logging_config import get_logger
+
+
+logger = get_logger(__name__)
+
+FRAME = struct.Struct(">IIB")  # body length, crc32 of type + body, type
+HEADER_LENGTH = struct.Struct(">I")
+ENQUEUE = 1
+STATE = 2
+TERMINAL_STATUSES = {"sent", "superseded", "dead"}
+SESSION_KEY = "outbox_log_ops"
+
+
+class LogRecord:
+    """
+    A live outbox record of the log backend, with the attributes the dispatcher uses
+    on ``RGSWebhookOutbox`` / ``OperatorWebhookOutbox`` rows.
+    """
+
+    __slots__ = (
+        "id", "queue", "event_type", "target_url", "dedup_key", "created_at", "status",
+        "attempt_count", "next_attempt_at", "last_error", "segment", "offset", "length", "_raw", "_log",
+    )
+
+    def __init__(self, record_id: int, queue: str, event_type: str, target_url: str, raw: bytes, dedup_key: str | None = None):
+        self.id = record_id
+        self.queue = queue
+        self.event_type = event_type
+        self.target_url = target_url
+        self.dedup_key = dedup_key
+        self.created_at = datetime.utcnow()
+        self.status = "pending"
+        self.attempt_count = 0
+        self.next_attempt_at: datetime | None = None
+        self.last_error: str | None = None
+        self.segment: int | None = None
+        self.offset = 0
+        self.length = 0
+        self._raw: bytes | None = raw
+        self._log: "OutboxLog | None" = None
+
+    @property
+    def payload(self) -> EncodedPayload:
+        raw = self._raw if self._raw is not None else self._log.read_payload(self)
+        return EncodedPayload(raw)
+
+    def state(self) -> dict:
+        return {
+            "id": self.id,
+            "s": self.status,
+            "a": self.attempt_count,
+            "n": self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            "l": self.last_error,
+        }
+
+    def apply_state(self, state: dict):
+        self.status = state["s"]
+        self.attempt_count = state["a"]
+        self.next_attempt_at = datetime.fromisoformat(state["n"]) if state["n"] else None
+        self.last_error = state["l"]
+
+    def header(self) -> dict:
+        return {
+            **self.state(),
+            "q": self.queue,
+            "e": self.event_type,
+            "u": self.target_url,
+            "k": self.dedup_key,
+            "c": self.created_at.isoformat(),
+        }
+
+
+class OutboxLog:
+    def __init__(self, directory: str | None = None, segment_bytes: int | None = None):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self._lock = threading.RLock()
+        self._opened = False
+        self._records: dict[int, LogRecord] = {}
+        self._dedup: dict[str, int] = {}
+        self._live: dict[int, int] = {}  # segment -> live records whose enqueue frame it holds
+        self._total: dict[int, int] = {}  # segment -> enqueue frames written to it
+        self._maps: dict[int, mmap.mmap] = {}
+        self._active: int | None = None
+        self._file = None
+        self._size = 0
+        self._next_id = 1
+
+    # -- files -------------------------------------------------------------
+
+    def _dir(self) -> str:
+        return self.directory if self.directory is not None else settings.outbox_log_dir
+
+    def _limit(self) -> int:
+        return self.segment_bytes if self.segment_bytes is not None else settings.outbox_log_segment_bytes
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self._dir(), f"{segment:010d}.seg")
+
+    def _segments(self) -> list[int]:
+        return sorted(int(name[:-4]) for name in os.listdir(self._dir()) if name.endswith(".seg"))
+
+    def _open(self):
+        if self._opened:
+            return
+        os.makedirs(self._dir(), exist_ok=True)
+        segments = self._segments()
+        max_id = 0
+        for segment in segments:
+            max_id = max(max_id, self._recover(segment, last=segment == segments[-1]))
+        # Records whose segments were all compacted away leave no trace, so never reuse a
+        # past id: start above both the ids seen and the clock.
+        self._next_id = max(max_id + 1, time.time_ns() // 1_000_000)
+        self._opened = True
+        self._roll(segments[-1] if segments else 0)
+        if self._records:
+            logger.info("Recovered outbox log: live_records=%s segments=%s", len(self._records), len(segments))
+
+    def _recover(self, segment: int, last: bool) -> int:
+        """
+        Replay one segment into the index; returns the highest record id seen.
+        """
+        max_id = 0
+        data = self._map(segment)
+        position = 0
+        size = len(data) if data is not None else 0
+        while position + FRAME.size <= size:
+            length, checksum, kind = FRAME.unpack_from(data, position)
+            start = position + FRAME.size
+            body = data[start:start + length]
+            if len(body) < length or zlib.crc32(bytes([kind]) + body) != checksum:
+                break
+            if kind == ENQUEUE:
+                header_length = HEADER_LENGTH.unpack_from(body)[0]
+                header = json.loads(body[HEADER_LENGTH.size:HEADER_LENGTH.size + header_length])
+                record = LogRecord(header["id"], header["q"], header["e"], header["u"], None, header["k"])
+                record._log = self
+                record.created_at = datetime.fromisoformat(header["c"])
+                record.apply_state(header)
+                record.segment = segment
+                record.offset = start + HEADER_LENGTH.size + header_length
+                record.length = length - HEADER_LENGTH.size - header_length
+                self._total[segment] = self._total.get(segment, 0) + 1
+                self._forget(record.id)
+                self._index(record)
+                max_id = max(max_id, record.id)
+            elif kind == STATE:
+                state = json.loads(body)
+                record = self._records.get(state["id"])
+                if record is not None:
+                    record.apply_state(state)
+                    if record.status in TERMINAL_STATUSES:
+                        self._forget(record.id)
+                max_id = max(max_id, state["id"])
+            position = start + length
+        if position < size:
+            if last:
+                logger.warning("Truncating torn outbox log tail: segment=%s offset=%s", segment, position)
+                self._unmap(segment)
+                with open(self._path(segment), "r+b") as handle:
+                    handle.truncate(position)
+            else:
+                logger.error("Corrupt outbox log segment, ignoring the rest: segment=%s offset=%s", segment, position)
+        self._total.setdefault(segment, 0)
+        return max_id
+
+    def _map(self, segment: int) -> mmap.mmap | None:
+        data = self._maps.get(segment)
+        if data is None:
+            with open(self._path(segment), "rb") as handle:
+                if os.fstat(handle.fileno()).st_size == 0:
+                    return None
+                data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = data
+        return data
+
+    def _unmap(self, segment: int):
+        data = self._maps.pop(segment, None)
+        if data is not None:
+            data.close()
+
+    def _roll(self, segment: int):
+        if self._file is not None:
+            self._file.close()
+        self._active = segment
+        self._file = open(self._path(self._active), "ab")
+        self._size = self._file.tell()
+        self._total.setdefault(self._active, 0)
+
+    # -- index ---------------------------------------------------------------
+
+    def _index(self, record: LogRecord):
+        self._records[record.id] = record
+        if record.dedup_key:
+            self._dedup[record.dedup_key] = record.id
+        self._live[record.segment] = self._live.get(record.segment, 0) + 1
+
+    def _forget(self, record_id: int):
+        record = self._records.pop(record_id, None)
+        if record is None:
+            return
+        if record.dedup_key and self._dedup.get(record.dedup_key) == record_id:
+            del self._dedup[record.dedup_key]
+        self._live[record.segment] -= 1
+
+    # -- writes ----------------------------------------------------------------
+
+    def _write(self, kind: int, body: bytes) -> int:
+        """
+        Append one frame to the active segment; returns the offset of its body.
+        """
+        frame = FRAME.pack(len(body), zlib.crc32(bytes([kind]) + body), kind)
+        self._file.write(frame + body)
+        offset = self._size + FRAME.size
+        self._size += len(frame) + len(body)
+        return offset
+
+    def _write_enqueue(self, record: LogRecord, raw: bytes):
+        header = json.dumps(record.header(), separators=(",", ":")).encode()
+        offset = self._write(ENQUEUE, HEADER_LENGTH.pack(len(header)) + header + raw)
+        record.segment = self._active
+        record.offset = offset + HEADER_LENGTH.size + len(header)
+        record.length = len(raw)
+        self._total[self._active] += 1
+
+    def _sync(self):
+        self._file.flush()
+        if settings.outbox_log_fsync:
+            os.fsync(self._file.fileno())
+
+    def new_record(self, queue: str, event_type: str, target_url: str, payload, dedup_key: str | None = None) -> LogRecord:
+        with self._lock:
+            self._open()
+            record_id = self._next_id
+            self._next_id += 1
+        record = LogRecord(record_id, queue, event_type, str(target_url), encode(payload), dedup_key)
+        record._log = self
+        return record
+
+    def apply(self, ops: list[tuple[int, LogRecord]]):
+        """
+        Write staged enqueue and state frames and update the index.
+        """
+        with self._lock:
+            self._open()
+            for kind, record in ops:
+                if kind == ENQUEUE:
+                    raw, record._raw = record._raw, None
+                    self._write_enqueue(record, raw)
+                    if record.status not in TERMINAL_STATUSES:
+                        self._index(record)
+                elif record.id in self._records:
+                    self._write(STATE, json.dumps(record.state(), separators=(",", ":")).encode())
+                    if record.status in TERMINAL_STATUSES:
+                        self._forget(record.id)
+            self._sync()
+            if self._size >= self._limit():
+                self._roll(self._active + 1)
+                self._compact_locked()
+
+    def update(self, record: LogRecord):
+        self.apply([(STATE, record)])
+
+    # -- reads -------------------------------------------------------------------
+
+    def read_payload(self, record: LogRecord) -> bytes:
+        with self._lock:
+            data = self._map(record.segment)
+            if data is None or len(data) < record.offset + record.length:
+                # The active segment has grown since it was mapped.
+                self._unmap(record.segment)
+                data = self._map(record.segment)
+            return bytes(data[record.offset:record.offset + record.length])
+
+    def get(self, record_id: int) -> LogRecord | None:
+        with self._lock:
+            self._open()
+            return self._records.get(record_id)
+
+    def due(self, queue: str, now: datetime | None = None) -> list[LogRecord]:
+        now = now or datetime.utcnow()
+        with self._lock:
+            self._open()
+            return [
+                record for record in self._records.values()
+                if record.queue == queue
+                and record.status in ("pending", "failed")
+                and (record.next_attempt_at is None or record.next_attempt_at <= now)
+            ]
+
+    def dedup_keys(self, keys: list[str]) -> set[str]:
+        with self._lock:
+            self._open()
+            return {key for key in keys if key in self._dedup}
+
+    def backlog(self, queue: str) -> tuple[int, datetime | None]:
+        """
+        Number of undelivered records in a queue and the creation time of the oldest.
+        """
+        with self._lock:
+            self._open()
+            pending = [r.created_at for r in self._records.values() if r.queue == queue]
+        return len(pending), min(pending, default=None)
+
+    def counts(self) -> dict[str, dict[str, int]]:
+        counts: dict[str, dict[str, int]] = {}
+        with self._lock:
+            self._open()
+            for record in self._records.values():
+                statuses = counts.setdefault(record.queue, {})
+                statuses[record.status] = statuses.get(record.status, 0) + 1
+        return counts
+
+    # -- compaction ------------------------------------------------------------
+
+    def compact(self) -> int:
+        """
+        Drop or rewrite sealed segments; returns the number of segments removed.
+        """
+        with self._lock:
+            self._open()
+            return self._compact_locked()
+
+    def _compact_locked(self) -> int:
+        # Only the oldest segments go: a state frame always follows its enqueue frame,
+        # so removing a prefix never drops state that an older, kept segment depends on.
+        removed = 0
+        for segment in sorted(self._total):
+            if segment == self._active:
+                break
+            live = self._live.get(segment, 0)
+            if live and live / max(self._total[segment], 1) > settings.outbox_log_compact_live_ratio:
+                break
+            moving = [record for record in self._records.values() if record.segment == segment]
+            for record in moving:
+                raw = self.read_payload(record)
+                self._live[segment] -= 1
+                self._write_enqueue(record, raw)
+                self._live[self._active] = self._live.get(self._active, 0) + 1
+            self._sync()
+            self._unmap(segment)
+            os.remove(self._path(segment))
+            self._total.pop(segment)
+            self._live.pop(segment, None)
+            removed += 1
+            logger.info("Compacted outbox log segment: segment=%s moved=%s", segment, len(moving))
+        return removed
+
+    # -- lifecycle ---------------------------------------------------------------
+
+    def close(self):
+        with self._lock:
+            for segment in list(self._maps):
+                self._unmap(segment)
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self.__init__(self.directory, self.segment_bytes)
+
+    def clear(self):
+        """
+        Close the log and delete its segments.
+        """
+        with self._lock:
+            self.close()
+            if os.path.isdir(self._dir()):
+                for segment in self._segments():
+                    os.remove(self._path(segment))
+
+
+outbox_log = OutboxLog()
+
+
+def stage(session: Session, record: LogRecord, kind: int = ENQUEUE):
+    """
+    Write a log record (or its new state) once the session commits; dropped on rollback.
+    """
+    session.info.setdefault(SESSION_KEY, []).append((kind, record))
+
+
+def staged(session: Session) -> list[LogRecord]:
+    return [record for kind, record in session.info.get(SESSION_KEY, ()) if kind == ENQUEUE]
+
+
+@event.listens_for(Session, "after_commit")
+def _write_staged(session: Session):
+    ops = session.info.pop(SESSION_KEY, None)
+    if ops:
+        outbox_log.apply(ops)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_staged(session: Session, previous_transaction):
+    session.info.pop(SESSION_KEY, None)
@@ -0,0 +1,115 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app import database
+from app.config import settings
+from app.logging_config import get_logger
+from app.models import models
+
+
+logger = get_logger(__name__)
+
+_MISS = object()
+
+
+class PlayerMappingService:
+    """
+    Resolves hub player ids to operator external ids through an in-process LRU cache.
+
+    Misses are cached too (for a shorter TTL) and concurrent lookups for the same
+    player share a single store query.
+    """
+
+    def __init__(
+        self,
+        max_size: int | None = None,
+        ttl_seconds: float | None = None,
+        negative_ttl_seconds: float | None = None,
+    ):
+        self.max_size = max_size if max_size is not None else settings.player_mapping_cache_size
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.player_mapping_ttl_seconds
+        self.negative_ttl_seconds = (
+            negative_ttl_seconds if negative_ttl_seconds is not None else settings.player_mapping_negative_ttl_seconds
+        )
+        self._entries: OrderedDict[str, tuple[Optional[str], float]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._generation = 0
+        self.loads = 0
+
+    def _get_cached(self, player_id: str):
+        entry = self._entries.get(player_id)
+        if entry is None:
+            return _MISS
+        external_player_id, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[player_id]
+            return _MISS
+        self._entries.move_to_end(player_id)
+        return external_player_id
+
+    def _put(self, player_id: str, external_player_id: Optional[str]):
+        ttl = self.ttl_seconds if external_player_id is not None else self.negative_ttl_seconds
+        self._entries[player_id] = (external_player_id, time.monotonic() + ttl)
+        self._entries.move_to_end(player_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _load_sync(self, player_id: str) -> Optional[str]:
+        db = database.SessionLocal()
+        try:
+            mapping = db.query(models.PlayerMapping).filter(models.PlayerMapping.player_id == player_id).first()
+            return mapping.external_player_id if mapping else None
+        finally:
+            db.close()
+
+    async def _load(self, player_id: str) -> Optional[str]:
+        generation = self._generation
+        self.loads += 1
+        external_player_id = await asyncio.to_thread(self._load_sync, player_id)
+        # Skip caching if an invalidation happened while the lookup was in flight.
+        if generation == self._generation:
+            self._put(player_id, external_player_id)
+        return external_player_id
+
+    async def resolve(self, player_id: str) -> Optional[str]:
+        cached = self._get_cached(player_id)
+        if cached is not _MISS:
+            return cached
+        task = self._inflight.get(player_id)
+        if task is None:
+            task = asyncio.ensure_future(self._load(player_id))
+            self._inflight[player_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(player_id, None))
+        return await asyncio.shield(task)
+
+    def preload(self, db: Session) -> int:
+        """
+        Warm the cache with the most recently updated mappings.
+        """
+        limit = min(settings.player_mapping_preload_limit, self.max_size)
+        rows = (
+            db.query(models.PlayerMapping.player_id, models.PlayerMapping.external_player_id)
+            .order_by(models.PlayerMapping.updated_at.desc())
+            .limit(limit)
+            .all()
+        )
+        # Insert oldest first so the freshest mappings end up most recently used.
+        for player_id, external_player_id in reversed(rows):
+            self._put(player_id, external_player_id)
+        logger.info("Preloaded %s player mappings", len(rows))
+        return len(rows)
+
+    def invalidate(self, player_id: str | None = None) -> int:
+        self._generation += 1
+        if player_id is None:
+            count = len(self._entries)
+            self._entries.clear()
+            return count
+        return 1 if self._entries.pop(player_id, None) is not None else 0
+
+
+player_mapping_service = PlayerMappingService()
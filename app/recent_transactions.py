@@ -0,0 +1,56 @@
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from app.config import settings
+
+
+class RecentTransaction(NamedTuple):
+    transaction_id: int
+    ref_id: str
+    shard: int
+
+
+class RecentTransactions:
+    """
+    Short-lived map of correlationId -> transaction for wallet calls made by this process.
+
+    Operator callbacks usually arrive within seconds of the wallet call, so most of
+    them can be matched by primary key without searching the transactions table.
+    Entries share one TTL, so insertion order is also expiry order.
+    """
+
+    def __init__(self, ttl_seconds: float | None = None, max_size: int | None = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.recent_transactions_ttl_seconds
+        self.max_size = max_size if max_size is not None else settings.recent_transactions_max_size
+        self._entries: OrderedDict[str, tuple[RecentTransaction, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, correlation_id: str, transaction_id: int, ref_id: str, shard: int = 0):
+        self._entries[correlation_id] = (RecentTransaction(transaction_id, ref_id, shard), time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(correlation_id)
+        self._evict()
+
+    def get(self, correlation_id: str, ref_id: str) -> RecentTransaction | None:
+        self._evict()
+        entry = self._entries.get(correlation_id)
+        if entry is None or entry[0].ref_id != ref_id:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._entries:
+            key, (_, expires_at) = next(iter(self._entries.items()))
+            if expires_at >= now and len(self._entries) <= self.max_size:
+                break
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+
+recent_transactions = RecentTransactions()
@@ -1,24 +1,151 @@
 import csv
+import hashlib
+from datetime import datetime, timedelta
 from io import StringIO
-from typing import List, Tuple
+from typing import Iterable, List, Tuple
 
 from app.clients.operator_client import operator_client
 from app.clients.rgs_client import rgs_client
-from app.config import operator_hub_action_map
+from app.config import operator_hub_action_map, settings
 from app.logging_config import get_logger
 
 
 logger = get_logger(__name__)
 
+# Digest protocol shared with the mock operator and RGS: rows are grouped into UTC
+# buckets, and each bucket reports its row count and the XOR of a 64-bit hash per row
+# over correlationId, amount in cents and status. XOR makes the digest independent of
+# row order; the count catches rows that would cancel out.
+BUCKET_SIZES = {
+    "day": timedelta(days=1),
+    "hour": timedelta(hours=1),
+    "minute": timedelta(minutes=1),
+}
+
+
+def bucket_start(created_at: datetime, granularity: str) -> datetime:
+    created_at = created_at.replace(tzinfo=None)
+    if granularity == "day":
+        return created_at.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "hour":
+        return created_at.replace(minute=0, second=0, microsecond=0)
+    return created_at.replace(second=0, microsecond=0)
+
+
+def item_hash(correlation_id: str, amount_cents: int, status: str) -> int:
+    digest = hashlib.blake2b(f"{correlation_id}|{amount_cents}|{status}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def compute_digest(rows: Iterable[tuple[datetime, str, int, str]], granularity: str) -> list[dict]:
+    """
+    Digest of ``(created_at, correlationId, amountCents, status)`` rows, one entry per non-empty bucket.
+    """
+    buckets: dict[datetime, list[int]] = {}
+    for created_at, correlation_id, amount_cents, status in rows:
+        entry = buckets.setdefault(bucket_start(created_at, granularity), [0, 0])
+        entry[0] += 1
+        entry[1] ^= item_hash(correlation_id, amount_cents, status)
+    return [
+        {"bucket": bucket.isoformat(), "count": count, "hash": f"{value:016x}"}
+        for bucket, (count, value) in sorted(buckets.items())
+    ]
+
+
+def _differing_buckets(local: list[dict], remote: list[dict]) -> list[datetime]:
+    local_map = {item["bucket"]: (item["count"], item["hash"]) for item in local}
+    remote_map = {item["bucket"]: (item["count"], item["hash"]) for item in remote}
+    return sorted(
+        datetime.fromisoformat(bucket)
+        for bucket in local_map.keys() | remote_map.keys()
+        if local_map.get(bucket) != remote_map.get(bucket)
+    )
+
+
+def _merge_ranges(ranges: list[tuple[datetime, datetime]]) -> list[tuple[datetime, datetime]]:
+    merged: list[tuple[datetime, datetime]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+async def _differing_ranges(start: datetime, end: datetime, levels: list[str]) -> tuple[list[tuple[datetime, datetime]], int]:
+    """
+    Time ranges whose digests differ at the finest level, and the number of digest buckets transferred.
+    """
+    ranges = [(start, end)]
+    transferred = 0
+    for granularity in levels:
+        size = BUCKET_SIZES[granularity]
+        narrowed = []
+        for range_start, range_end in ranges:
+            local = await rgs_client.digest(granularity, range_start, range_end)
+            remote = await operator_client.digest(granularity, range_start, range_end)
+            transferred += len(local) + len(remote)
+            narrowed.extend(
+                (max(bucket, range_start), min(bucket + size, range_end))
+                for bucket in _differing_buckets(local, remote)
+            )
+        ranges = _merge_ranges(narrowed)
+        if not ranges:
+            break
+    return ranges, transferred
+
+
+async def _digest_rows(start: datetime, end: datetime) -> tuple[List[dict], List[dict]]:
+    ranges, buckets = await _differing_ranges(start, end, settings.reconciliation_digest_levels)
+    local_data: List[dict] = []
+    remote_data: List[dict] = []
+    # Rows are compared over the union of all differing ranges, so a row stored a few
+    # seconds apart on each side (and so in neighbouring buckets) still matches up.
+    for range_start, range_end in ranges:
+        local_data.extend(await rgs_client.list_webhooks(range_start, range_end))
+        remote_data.extend(await operator_client.list_transactions(range_start, range_end))
+    logger.info(
+        "Digest reconciliation: window=%s..%s digest_buckets=%s differing_ranges=%s rows=%s",
+        start.isoformat(),
+        end.isoformat(),
+        buckets,
+        len(ranges),
+        len(local_data) + len(remote_data),
+    )
+    return local_data, remote_data
+
+
+def reconciliation_window(start: datetime | None = None, end: datetime | None = None) -> tuple[datetime, datetime]:
+    """
+    Window for digest mode: the given bounds, defaulting to the last RECONCILIATION_WINDOW_HOURS
+    up to the end of the current minute.
+    """
+    if end is None:
+        end = bucket_start(datetime.utcnow(), "minute") + BUCKET_SIZES["minute"]
+    if start is None:
+        start = end - timedelta(hours=settings.reconciliation_window_hours)
+    return start.replace(tzinfo=None), end.replace(tzinfo=None)
+
+
 def _item_data(items: List[dict]) -> dict:
     return {f'{txn.get("correlationId")}': txn for txn in items if txn.get("correlationId")}
 
-async def generate_reconciliation_csv() -> Tuple[str, int]:
+async def generate_reconciliation_csv(
+    start: datetime | None = None,
+    end: datetime | None = None,
+    mode: str | None = None,
+) -> Tuple[str, int]:
     """
     Compare RGS-received transactions to operator transactions and return CSV text plus mismatch count.
+
+    ``full`` mode transfers every record from both sides; ``digest`` mode compares
+    bucket digests over the window first and transfers only the rows of differing buckets.
     """
-    local_data: List[dict] = await rgs_client.list_webhooks()
-    remote_data: List[dict] = await operator_client.list_transactions()
+    if (mode or settings.reconciliation_mode) == "digest":
+        local_data, remote_data = await _digest_rows(*reconciliation_window(start, end))
+    else:
+        local_data = await rgs_client.list_webhooks()
+        remote_data = await operator_client.list_transactions()
 
     local_items = _item_data(local_data)
     remote_items = _item_data(remote_data)
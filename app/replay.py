@@ -0,0 +1,139 @@
+"""
+Replay captured hub traffic (see CAPTURE_FILE) against a running hub.
+
+    python -m app.replay capture.jsonl --base-url http://localhost:8000 --speed 1
+    python -m app.replay capture.jsonl --speed 10 --suffix -run2
+    python -m app.replay capture.jsonl --speed max --concurrency 200
+
+Requests keep their original spacing divided by --speed, or go out as fast as
+--concurrency allows with --speed max. Signed requests are re-signed with the
+local HMAC_SECRET and the local BEARER_TOKEN is sent. Operator callbacks are
+skipped unless --include-callbacks is given, because the replayed wallet calls
+get new correlation ids and the mock operator sends fresh callbacks.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from collections import Counter
+
+import httpx
+
+from app.config import settings
+from app.security import compute_signature
+
+
+CALLBACK_PATH = "/webhooks/incoming"
+
+
+def load_capture(path: str, include_callbacks: bool = False) -> list[dict]:
+    with open(path, encoding="utf-8") as handle:
+        records = [json.loads(line) for line in handle if line.strip()]
+    if not include_callbacks:
+        records = [r for r in records if not r["p"].startswith(CALLBACK_PATH)]
+    return sorted(records, key=lambda r: r["ts"])
+
+
+def prepare_request(record: dict, suffix: str = "") -> tuple[str, str, dict, object]:
+    """
+    Method, URL, headers and body for one captured request, signed for sending now.
+    """
+    headers = dict(record["h"])
+    body = record["b"]
+    if suffix and isinstance(body, dict):
+        body = {**body, "refId": f"{body['refId']}{suffix}"} if "refId" in body else body
+        if "idempotency-key" in headers:
+            headers["idempotency-key"] = f"{headers['idempotency-key']}{suffix}"
+    if settings.bearer_token:
+        headers["authorization"] = f"Bearer {settings.bearer_token}"
+    if record.get("signed") and isinstance(body, dict):
+        timestamp = str(int(time.time()))
+        headers["x-timestamp"] = timestamp
+        headers["x-signature"] = compute_signature(body, timestamp)
+    url = record["p"] + (f"?{record['q']}" if record.get("q") else "")
+    return record["m"], url, headers, body
+
+
+async def replay(
+    records: list[dict],
+    client: httpx.AsyncClient,
+    speed: float | None = 1.0,
+    concurrency: int = 50,
+    suffix: str = "",
+) -> dict:
+    """
+    Send the records and return a summary. ``speed=None`` means as fast as possible.
+    """
+    slots = asyncio.Semaphore(concurrency)
+    statuses: Counter = Counter()
+    latencies: list[float] = []
+
+    async def send(record: dict):
+        try:
+            method, url, headers, body = prepare_request(record, suffix)
+            sent = time.perf_counter()
+            try:
+                resp = await client.request(method, url, headers=headers, json=body)
+                statuses[resp.status_code] += 1
+            except httpx.HTTPError as exc:
+                statuses[type(exc).__name__] += 1
+            latencies.append((time.perf_counter() - sent) * 1000)
+        finally:
+            slots.release()
+
+    tasks = []
+    started = time.perf_counter()
+    first_ts = records[0]["ts"] if records else 0.0
+    for record in records:
+        if speed is not None:
+            delay = (record["ts"] - first_ts) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await slots.acquire()
+        tasks.append(asyncio.create_task(send(record)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    ordered = sorted(latencies)
+
+    def percentile(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3) if ordered else 0.0
+
+    return {
+        "requests": len(records),
+        "seconds": round(elapsed, 3),
+        "rps": round(len(records) / elapsed, 1) if elapsed else 0.0,
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=lambda item: str(item[0]))},
+        "latencyMs": {
+            "mean": round(statistics.fmean(ordered), 3) if ordered else 0.0,
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+        },
+    }
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Replay captured Integration Hub traffic.")
+    parser.add_argument("capture_file")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--speed", default="1", help="playback speed multiplier, or 'max'")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--suffix", default="", help="appended to refIds and idempotency keys so runs do not collide")
+    parser.add_argument("--include-callbacks", action="store_true")
+    args = parser.parse_args(argv)
+    speed = None if args.speed == "max" else float(args.speed)
+    if speed is not None and speed <= 0:
+        parser.error("--speed must be positive or 'max'")
+
+    records = load_capture(args.capture_file, args.include_callbacks)
+
+    async def run() -> dict:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=30.0) as client:
+            return await replay(records, client, speed, args.concurrency, args.suffix)
+
+    print(json.dumps(asyncio.run(run()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
-from pydantic import BaseModel
-from typing import Optional, Any
+from datetime import datetime
+
+from pydantic import BaseModel, Field, field_validator
+from typing import Literal, Optional, Any
 
 class WalletRequest(BaseModel):
     playerId: str
@@ -7,6 +9,14 @@ class WalletRequest(BaseModel):
     currency: str
     refId: str
 
+    @field_validator("amountCents")
+    @classmethod
+    def whole_cents(cls, value: float) -> float:
+        # Kept a float so signed bodies like 500.0 still hash the same, but never rounded.
+        if not value.is_integer():
+            raise ValueError("amountCents must be a whole number of cents")
+        return value
+
 class WalletResponse(BaseModel):
     status: str
     balanceCents: Optional[int] = None
@@ -19,10 +29,32 @@ class WebhookPayload(BaseModel):
     amount: float
     currency: str
     status: str
-    event: str
+    event: Literal["withdraw", "deposit"]
     refId: str
     correlationId: str
-    
+
+class TransactionStatusQuery(BaseModel):
+    refIds: list[str] = []
+    correlationIds: list[str] = []
+
+class PlayerStatusPayload(BaseModel):
+    playerId: str
+    status: str
+
+class DeadLetterReplayRequest(BaseModel):
+    ids: Optional[list[int]] = None
+    queue: Optional[Literal["rgs", "operator"]] = None
+    limit: int = Field(500, ge=1, le=5000)
+
+class BulkReplayRequest(BaseModel):
+    status: list[str] = ["failed"]
+    createdFrom: Optional[datetime] = None
+    createdTo: Optional[datetime] = None
+    eventType: Optional[str] = None
+    targetUrl: Optional[str] = None
+    dryRun: bool = False
+    releasePerSecond: Optional[float] = Field(None, gt=0)
+
 class ReconciliationResult(BaseModel):
     refId: str
     correlationId: str
@@ -14,7 +14,11 @@ def compute_signature(body: dict, timestamp: str) -> str:
 def validate_signature(body: dict, signature: str, timestamp: str):
     expected = compute_signature(body, timestamp)
     now = int(time.time())
-    if abs(now - int(timestamp)) > settings.timestamp_skew_seconds:
+    try:
+        sent_at = int(timestamp)
+    except ValueError:
+        raise HTTPException(status_code=401, detail="invalid timestamp")
+    if abs(now - sent_at) > settings.timestamp_skew_seconds:
         raise HTTPException(status_code=401, detail="timestamp skew")
     if not hmac.compare_digest(expected, signature):
         raise HTTPException(status_code=401, detail="invalid signature")
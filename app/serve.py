@@ -0,0 +1,97 @@
+"""
+Process launcher for multi-core deployments.
+
+    python -m app.serve --api-workers 8 --dispatchers 2
+
+Creates the schema once, then starts N uvicorn API workers that only serve HTTP
+and M dedicated outbox dispatcher processes that split the outbox by record id.
+Every process builds its own engine and connection pool after it starts.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+
+import uvicorn
+
+from app.config import Settings, settings
+from app.logging_config import get_logger
+
+
+logger = get_logger(__name__)
+
+
+def worker_env(api_workers: int, dispatchers: int) -> dict[str, str]:
+    """
+    Environment shared by every child process.
+    """
+    return {
+        "CREATE_SCHEMA_ON_STARTUP": "false",
+        # A single API process may keep the embedded worker when no dispatcher runs.
+        "RUN_OUTBOX_WORKER": "true" if dispatchers == 0 and api_workers == 1 else "false",
+        "DISPATCHER_COUNT": str(max(dispatchers, 1)),
+        # Balances cached in one API process must pick up rows written by the others.
+        "LEDGER_VERIFY_TAIL": "true" if api_workers > 1 else str(settings.ledger_verify_tail).lower(),
+    }
+
+
+def run_dispatcher(index: int):
+    # Settings are already loaded by the time the child imports this module.
+    settings.dispatcher_index = index
+    # Imported in the child so the engine and pool belong to this process.
+    from app.inbox import background_inbox_worker
+    from app.webhooks import background_outbox_worker
+
+    logger.info("Starting outbox dispatcher %s/%s", index + 1, settings.dispatcher_count)
+    workers = [background_outbox_worker()]
+    if settings.webhook_inbox_enabled and index == 0:
+        # A single inbox consumer keeps callback processing in arrival order.
+        workers.append(background_inbox_worker())
+    asyncio.run(_run_all(workers))
+
+
+async def _run_all(workers):
+    await asyncio.gather(*workers)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Run the Integration Hub API workers and outbox dispatchers.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--api-workers", type=int, default=settings.api_workers)
+    parser.add_argument("--dispatchers", type=int, default=settings.dispatcher_processes)
+    args = parser.parse_args(argv)
+    if args.api_workers > 1 and args.dispatchers < 1:
+        parser.error("--dispatchers must be at least 1 when running more than one API worker")
+    if settings.outbox_backend == "log" and (args.api_workers > 1 or args.dispatchers > 0):
+        parser.error("OUTBOX_BACKEND=log keeps the outbox in one process; use one API worker and no dispatchers")
+
+    from app.database import dispose_engine, init_db
+
+    init_db()
+    dispose_engine()
+    env = worker_env(args.api_workers, args.dispatchers)
+    os.environ.update(env)
+    # A single API worker runs in this process, whose settings were loaded before the update.
+    reloaded = Settings()
+    for name in env:
+        setattr(settings, name.lower(), getattr(reloaded, name.lower()))
+
+    ctx = multiprocessing.get_context("spawn")
+    dispatchers = [
+        ctx.Process(target=run_dispatcher, args=(index,), name=f"outbox-dispatcher-{index}", daemon=True)
+        for index in range(args.dispatchers)
+    ]
+    for process in dispatchers:
+        process.start()
+    try:
+        uvicorn.run("app.main:app", host=args.host, port=args.port, workers=args.api_workers)
+    finally:
+        for process in dispatchers:
+            process.terminate()
+        for process in dispatchers:
+            process.join(timeout=5)
+
+
+if __name__ == "__main__":
+    main()
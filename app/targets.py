@@ -0,0 +1,177 @@
+import time
+
+from app.config import DeliveryTarget, settings
+from app.helpers import IntegrationClient
+from app.lanes import host_of
+from app.logging_config import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker for one delivery target.
+
+    After ``failure_threshold`` failed deliveries in a row the breaker opens and the
+    target is skipped; after ``reset_seconds`` one trial delivery is let through
+    (half-open), which closes the breaker on success or reopens it on failure.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.opened = 0
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def available(self) -> bool:
+        state = self.state
+        return state == "closed" or (state == "half-open" and not self._trial)
+
+    def acquire(self):
+        if self.state == "half-open":
+            self._trial = True
+
+    def release(self):
+        """
+        End a call that was rate limited before it reached the target; the state is unchanged.
+        """
+        self._trial = False
+
+    def record(self, ok: bool):
+        self._trial = False
+        if ok:
+            self.failures = 0
+            self.opened_at = None
+            return
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                self.opened += 1
+            self.opened_at = time.monotonic()
+
+
+class Target:
+    """
+    Delivery bulkhead for one host: its own client (rate limit, pool, retries),
+    in-flight budget and circuit breaker.
+    """
+
+    def __init__(self, host: str, client: IntegrationClient, name: str | None = None, config: DeliveryTarget | None = None):
+        self.host = host
+        self.name = name
+        self.client = client
+        self.concurrency = _option(config, "concurrency", settings.target_concurrency)
+        self.breaker = CircuitBreaker(
+            _option(config, "breaker_failure_threshold", settings.breaker_failure_threshold),
+            _option(config, "breaker_reset_seconds", settings.breaker_reset_seconds),
+        )
+        self.inflight = 0
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+        self.throttled = 0
+
+    def available(self) -> bool:
+        return self.inflight < max(self.concurrency, 1) and self.breaker.available()
+
+    def start(self):
+        self.breaker.acquire()
+        self.inflight += 1
+
+    def finish(self, ok: bool | None):
+        """
+        End a call: ``ok`` is None when it was rate limited, which the breaker does not count.
+        """
+        self.inflight -= 1
+        if ok is None:
+            self.throttled += 1
+            self.breaker.release()
+            return
+        if ok:
+            self.sent += 1
+        else:
+            self.failed += 1
+        was_open = self.breaker.opened_at is not None
+        self.breaker.record(ok)
+        if not was_open and self.breaker.opened_at is not None:
+            logger.warning("Circuit opened for delivery target: host=%s failures=%s", self.host, self.breaker.failures)
+        elif was_open and self.breaker.opened_at is None:
+            logger.info("Circuit closed for delivery target: host=%s", self.host)
+
+    def state(self) -> dict:
+        return {
+            "name": self.name,
+            "concurrency": self.concurrency,
+            "inflight": self.inflight,
+            "rateLimitPerMinute": self.client.rate_limit_per_minute,
+            "maxRetries": self.client.max_retries,
+            "breaker": self.breaker.state,
+            "consecutiveFailures": self.breaker.failures,
+            "opened": self.breaker.opened,
+            "sent": self.sent,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "throttled": self.throttled,
+        }
+
+
+def _option(config: DeliveryTarget | None, field: str, default):
+    value = getattr(config, field) if config is not None else None
+    return value if value is not None else default
+
+
+class TargetRegistry:
+    """
+    Targets keyed by ``target_url`` host.
+
+    Hosts listed in ``DELIVERY_TARGETS`` get a dedicated client built from their
+    configuration; any other host shares ``default_client`` but still gets its own
+    in-flight budget and breaker.
+    """
+
+    def __init__(self, default_client: IntegrationClient):
+        self.default_client = default_client
+        self._targets: dict[str, Target] = {}
+
+    def for_url(self, url: str) -> Target:
+        return self.for_host(host_of(url))
+
+    def for_host(self, host: str) -> Target:
+        target = self._targets.get(host)
+        if target is None:
+            target = self._targets[host] = self._build(host)
+        return target
+
+    def _build(self, host: str) -> Target:
+        for name, config in settings.delivery_targets.items():
+            if host_of(config.base_url) == host:
+                client = IntegrationClient(
+                    rate_limit_per_minute=config.rate_limit_per_minute,
+                    max_retries=config.max_retries,
+                    retry_backoff_seconds=config.retry_backoff_seconds,
+                    base_url=str(config.base_url),
+                    max_connections=_option(config, "max_connections", settings.target_max_connections),
+                    timeout_seconds=_option(config, "timeout_seconds", settings.target_timeout_seconds),
+                )
+                return Target(host, client, name, config)
+        return Target(host, self.default_client)
+
+    def state(self) -> dict:
+        return {host: target.state() for host, target in sorted(self._targets.items())}
+
+    async def aclose(self):
+        for target in self._targets.values():
+            if target.client is not self.default_client:
+                await target.client.aclose()
+
+    def clear(self):
+        self._targets.clear()
@@ -0,0 +1,152 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+from app.config import settings
+
+
+# Statuses a transaction does not leave; cached entries in any other status are re-read
+# from the database, since another process may have moved them on.
+FINAL_STATUSES = frozenset({"sent", "confirmed", "rejected"})
+
+
+def transaction_status(transaction, shard: int = 0) -> dict:
+    """
+    Status entry for a ``Transaction`` row.
+    """
+    return {
+        'refId': transaction.ref_id,
+        'correlationId': transaction.correlation_id,
+        'playerId': transaction.player_id,
+        'direction': transaction.direction,
+        'status': transaction.status,
+        'amountCents': transaction.amount_cents,
+        'currency': transaction.currency,
+        'balanceCents': transaction.balance_cents,
+        'reason': transaction.reason,
+        'transactionId': transaction.id,
+        'shard': shard,
+    }
+
+
+def public_status(entry: dict) -> dict:
+    return {key: value for key, value in entry.items() if key not in ("transactionId", "shard")}
+
+
+class TransactionStatusCache:
+    """
+    Recent transaction statuses by correlationId, with a refId index and change notifications.
+
+    Wallet calls and operator callbacks handled by this process update it; status
+    queries read it first and fall back to the database. Long-poll waiters are woken
+    when an entry's status changes. Entries share one TTL, so insertion order is also
+    expiry order. A refId read from the database is marked loaded until one of its
+    entries is evicted, so a refId with a single direction is not looked up again.
+    """
+
+    def __init__(self, ttl_seconds: float | None = None, max_size: int | None = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.transaction_status_ttl_seconds
+        self.max_size = max_size if max_size is not None else settings.transaction_status_max_size
+        self._entries: OrderedDict[str, tuple[dict, float]] = OrderedDict()
+        self._by_ref: dict[str, set[str]] = {}
+        self._loaded_refs: set[str] = set()
+        self._changed: dict[str, asyncio.Event] = {}
+        self._waiting: dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, entry: dict):
+        correlation_id = entry['correlationId']
+        previous = self._entries.pop(correlation_id, None)
+        self._entries[correlation_id] = (entry, time.monotonic() + self.ttl_seconds)
+        self._by_ref.setdefault(entry['refId'], set()).add(correlation_id)
+        if previous is not None and previous[0]['status'] != entry['status']:
+            self._notify(correlation_id)
+        self._evict()
+
+    def mark(self, correlation_id: str, status: str, **fields):
+        """
+        Set the status (and other ``fields``) of a cached entry; entries not cached are left to the database.
+        """
+        cached = self._entries.get(correlation_id)
+        if cached is not None and (cached[0]['status'] != status or fields):
+            self.put({**cached[0], **fields, 'status': status})
+
+    def get(self, correlation_id: str) -> dict | None:
+        self._evict()
+        cached = self._entries.get(correlation_id)
+        if cached is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return cached[0]
+
+    def for_ref(self, ref_id: str) -> list[dict]:
+        self._evict()
+        return [self._entries[correlation_id][0] for correlation_id in self._by_ref.get(ref_id, ())]
+
+    def mark_loaded(self, ref_id: str):
+        """
+        Record that every entry of ``ref_id`` in the database is cached.
+        """
+        if ref_id in self._by_ref:
+            self._loaded_refs.add(ref_id)
+
+    def loaded(self, ref_id: str) -> bool:
+        self._evict()
+        return ref_id in self._loaded_refs
+
+    async def wait_for_change(self, correlation_ids: list[str], timeout: float) -> bool:
+        """
+        Wait until one of the entries changes status in this process, for at most ``timeout`` seconds.
+        """
+        if not correlation_ids or timeout <= 0:
+            return False
+        events = []
+        for correlation_id in correlation_ids:
+            event = self._changed.setdefault(correlation_id, asyncio.Event())
+            self._waiting[correlation_id] = self._waiting.get(correlation_id, 0) + 1
+            events.append(event)
+        waiters = [asyncio.ensure_future(event.wait()) for event in events]
+        try:
+            done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+            for correlation_id in correlation_ids:
+                remaining = self._waiting.pop(correlation_id, 1) - 1
+                if remaining:
+                    self._waiting[correlation_id] = remaining
+                else:
+                    # Last waiter gone: drop the event so unchanged entries do not pile up.
+                    self._changed.pop(correlation_id, None)
+        return bool(done)
+
+    def _notify(self, correlation_id: str):
+        event = self._changed.pop(correlation_id, None)
+        if event is not None:
+            event.set()
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._entries:
+            correlation_id, (entry, expires_at) = next(iter(self._entries.items()))
+            if expires_at >= now and len(self._entries) <= self.max_size:
+                break
+            del self._entries[correlation_id]
+            self._loaded_refs.discard(entry['refId'])
+            ref_ids = self._by_ref.get(entry['refId'])
+            if ref_ids is not None:
+                ref_ids.discard(correlation_id)
+                if not ref_ids:
+                    del self._by_ref[entry['refId']]
+
+    def clear(self):
+        self._entries.clear()
+        self._by_ref.clear()
+        self._loaded_refs.clear()
+        self._changed.clear()
+        self._waiting.clear()
+
+
+transaction_statuses = TransactionStatusCache()
@@ -1,28 +1,151 @@
 import asyncio
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from typing import Callable
+import httpx
+from fastapi import HTTPException
+from sqlalchemy import func, insert, or_, update
 from sqlalchemy.orm import Session
 
 from app.config import settings
+from app.database import shard_count, shard_session
 from app.helpers import IntegrationClient
+from app.lanes import LaneQueue, WeightedRoundRobin, due_since, lane_metrics, plan_lanes
+from app.ledger import balance_ledger, signed_amount
+from app.outbox_log import STATE, LogRecord, outbox_log, stage, staged
 from app.logging_config import get_logger
 from app.models import models
-from app.contracts.contracts import OperatorWalletRequest, RgsRequest
+from app.contracts.mapping import operator_wallet_payload, rgs_payload
 from app.schemas.app_schemas import WalletRequest, WebhookPayload
+from app.targets import Target, TargetRegistry
+from app.transaction_status import transaction_statuses
 
 logger = get_logger(__name__)
 
+class RecentKeys:
+    """
+    Bounded set of recently enqueued dedup keys, so replayed callbacks skip the database check.
+    """
+
+    def __init__(self, max_size: int | None = None):
+        self.max_size = max_size if max_size is not None else settings.outbox_dedup_cache_size
+        self._keys: OrderedDict[str, None] = OrderedDict()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._keys
+
+    def add(self, key: str):
+        self._keys[key] = None
+        self._keys.move_to_end(key)
+        while len(self._keys) > self.max_size:
+            self._keys.popitem(last=False)
+
+    def clear(self):
+        self._keys.clear()
+
+
+recent_outbox_keys = RecentKeys()
+
+
+def rgs_dedup_key(payload: WebhookPayload) -> str:
+    return f"{payload.correlationId}:{payload.event}:{payload.status}"
+
+
+def rgs_outbox_row(payload: WebhookPayload, target_url: str) -> dict:
+    """
+    Column values for an RGS outbox record, usable for ORM objects and bulk inserts alike.
+    """
+    rgs_payload_dict = rgs_payload(payload)
+    return {
+        "event_type": rgs_payload_dict['event'],
+        "payload": rgs_payload_dict,
+        "target_url": str(target_url),
+        "status": "pending",
+        "dedup_key": rgs_dedup_key(payload),
+    }
+
+
+def existing_dedup_keys(db: Session, model, keys: list[str]) -> set[str]:
+    unknown = [key for key in keys if key not in recent_outbox_keys]
+    found = set(keys) - set(unknown)
+    if unknown and settings.outbox_backend == "log":
+        found.update(outbox_log.dedup_keys(unknown))
+        unknown = [key for key in unknown if key not in found]
+    if unknown:
+        found.update(k for (k,) in db.query(model.dedup_key).filter(model.dedup_key.in_(unknown)))
+    return found
+
+
+def _queue_of(model) -> str:
+    return "rgs" if model is models.RGSWebhookOutbox else "operator"
+
+
+def add_outbox_rows(db: Session, model, rows: list[dict]):
+    """
+    Stage outbox rows (dicts of column values) with one executemany, or on the log backend.
+    """
+    if settings.outbox_backend == "log":
+        for row in rows:
+            stage(db, outbox_log.new_record(_queue_of(model), row["event_type"], row["target_url"], row["payload"], row.get("dedup_key")))
+    else:
+        db.execute(insert(model), rows)
+
+
+def add_rgs_item(db: Session, payload: WebhookPayload, target_url: str):
+    """
+    Stage an RGS notification unless one with the same (correlationId, event, status) exists.
+
+    Returns None for duplicates. Concurrent duplicates are stopped by the unique index;
+    callers treat the resulting IntegrityError as a duplicate and retry the write once.
+    """
+    key = rgs_dedup_key(payload)
+    pending = [*db.new, *staged(db)]
+    duplicate = any(isinstance(obj, (models.RGSWebhookOutbox, LogRecord)) and obj.dedup_key == key for obj in pending)
+    if duplicate or existing_dedup_keys(db, models.RGSWebhookOutbox, [key]):
+        recent_outbox_keys.add(key)
+        logger.info("Skipping duplicate RGS notification dedup_key=%s", key)
+        return None
+    row = rgs_outbox_row(payload, target_url)
+    if settings.outbox_backend == "log":
+        record = outbox_log.new_record("rgs", row["event_type"], row["target_url"], row["payload"], row["dedup_key"])
+        stage(db, record)
+        return record
+    record = models.RGSWebhookOutbox(**row)
+    db.add(record)
+    return record
+
+def add_operator_item(
+    db: Session,
+    event_type: str,
+    request: WalletRequest,
+    correlation_id: str,
+    target_url: str,
+    amount_cents: int | None = None,
+):
+    operator_payload = operator_wallet_payload(request, correlation_id, amount_cents)
+    return _add_item(db, models.OperatorWebhookOutbox, event_type, operator_payload, target_url)
+
 async def enqueue_rgs_item(db: Session, payload: WebhookPayload, target_url: str):
-    rgs_request = RgsRequest.from_webhook_payload(payload)
-    rgs_payload_dict = rgs_request.model_dump(by_alias=True)
-    return await _enqueue_item(db, models.RGSWebhookOutbox, rgs_payload_dict['event'], rgs_payload_dict, target_url)
+    record = add_rgs_item(db, payload, target_url)
+    if record is None:
+        return None
+    _commit_item(db, record)
+    recent_outbox_keys.add(record.dedup_key)
+    return record
 
 async def enqueue_operator_item(db: Session, event_type: str, request: WalletRequest, correlation_id: str, target_url: str):
-    operator_wallet_request = OperatorWalletRequest.from_wallet_request(request, correlation_id)
-    operator_payload = operator_wallet_request.model_dump(by_alias=True)
-    return await _enqueue_item(db, models.OperatorWebhookOutbox, event_type, operator_payload, target_url)
+    return _commit_item(db, add_operator_item(db, event_type, request, correlation_id, target_url))
 
 
-async def _enqueue_item(db: Session, model, event_type: str, payload: dict, target_url: str):
+def _add_item(db: Session, model, event_type: str, payload: dict, target_url: str):
+    """
+    Stage an outbox record on the session; the caller owns the commit.
+    """
+    if settings.outbox_backend == "log":
+        record = outbox_log.new_record(_queue_of(model), event_type, target_url, payload)
+        stage(db, record)
+        return record
     record = model(
         event_type=event_type,
         payload=payload,
@@ -30,46 +153,379 @@ async def _enqueue_item(db: Session, model, event_type: str, payload: dict, targ
         status="pending",
     )
     db.add(record)
+    return record
+
+
+def _commit_item(db: Session, record):
     db.commit()
-    db.refresh(record)
+    if not isinstance(record, LogRecord):
+        db.refresh(record)
     return record
 
 
-async def process_outbox(db: Session):
-    await _process_outbox(db, models.RGSWebhookOutbox)
-    await _process_outbox(db, models.OperatorWebhookOutbox)
+async def _enqueue_item(db: Session, model, event_type: str, payload: dict, target_url: str):
+    return _commit_item(db, _add_item(db, model, event_type, payload, target_url))
+
+
+async def call_operator_with_deadline(target_url: str, payload: dict, deadline_seconds: float) -> httpx.Response | None:
+    """
+    Deliver an operator request inline; None when it did not complete in time or failed in transit.
+    """
+    target = delivery_targets.for_url(target_url)
+    if not target.available():
+        logger.info("Inline operator call fell back to outbox: url=%s breaker=%s inflight=%s", target_url, target.breaker.state, target.inflight)
+        return None
+    target.start()
+    ok: bool | None = False
+    try:
+        resp = await asyncio.wait_for(
+            target.client._request_with_retry("POST", target_url, json=payload),
+            timeout=deadline_seconds,
+        )
+        ok = None if resp.status_code == 429 else resp.status_code < 500
+        return resp
+    except (asyncio.TimeoutError, HTTPException) as exc:
+        logger.info("Inline operator call fell back to outbox: url=%s error=%r", target_url, exc)
+        return None
+    finally:
+        target.finish(ok)
+
+
+async def process_outbox(db: Session, include_log: bool = True):
+    """
+    Deliver every due record of both queues, scheduled across priority lanes.
+
+    Database rows are always drained, so records replayed by the admin tools are
+    delivered on the log backend too. ``include_log`` lets sharded workers read
+    the process-wide log on one shard only.
+    """
+    use_log = include_log and settings.outbox_backend == "log"
+    due = {queue: _due_records(db, model) for queue, model in OUTBOX_MODELS.items()}
+    if use_log:
+        for queue in due:
+            due[queue] += outbox_log.due(queue)
+    due["rgs"] = collapse_pending(db, due["rgs"])
+    await _dispatch(db, [(queue, record) for queue, records in due.items() for record in records])
+    if use_log:
+        outbox_log.compact()
+
+
+def mark_outbox_sent(db: Session, model, record_id: int, last_error: str | None = None):
+    """
+    Record a delivery made outside the dispatcher; the caller commits.
+    """
+    record = outbox_log.get(record_id) if settings.outbox_backend == "log" else db.get(model, record_id)
+    if record is None:
+        return
+    record.status = "sent"
+    record.attempt_count += 1
+    record.last_error = last_error
+    if isinstance(record, LogRecord):
+        stage(db, record, STATE)
 
 integration_client = IntegrationClient()
+delivery_targets = TargetRegistry(integration_client)
+
+def collapse_pending(db: Session, records: list) -> list:
+    """
+    Keep only the newest undelivered RGS notification per (correlationId, event).
 
-async def _process_outbox(db: Session, model):
-    pending = db.query(model).filter(model.status != "sent").all()
-    for record in pending:
-        if record.next_attempt_at and record.next_attempt_at > datetime.utcnow():
+    Older ones are marked ``superseded`` so RGS receives the latest status once.
+    """
+    latest: dict[tuple, object] = {}
+    superseded = []
+    for record in sorted(records, key=lambda r: r.id, reverse=True):
+        correlation_id = (record.payload or {}).get("correlationId")
+        if correlation_id is None:
             continue
+        key = (correlation_id, record.event_type)
+        if key in latest:
+            record.status = "superseded"
+            record.last_error = f"superseded by {latest[key].id}"
+            if isinstance(record, LogRecord):
+                stage(db, record, STATE)
+            superseded.append(record)
+        else:
+            latest[key] = record
+    if superseded:
+        db.commit()
+        logger.info("Collapsed %s redundant RGS outbox records", len(superseded))
+    return [record for record in records if record.status != "superseded"]
+
+
+OUTBOX_MODELS = {"rgs": models.RGSWebhookOutbox, "operator": models.OperatorWebhookOutbox}
+
+
+def retry_delay_seconds(attempt_count: int) -> float:
+    # Cap the exponent as well so a large attempt count never builds a huge int.
+    return min(2 ** min(attempt_count, 32), settings.outbox_max_backoff_seconds)
+
+
+def move_to_dead_letter(db: Session, record):
+    """
+    Replace an exhausted outbox record with a dead-letter row; the caller commits.
+    """
+    if isinstance(record, LogRecord):
+        queue = record.queue
+    else:
+        queue = "rgs" if isinstance(record, models.RGSWebhookOutbox) else "operator"
+    db.add(models.DeadLetterOutbox(
+        queue=queue,
+        original_id=record.id,
+        event_type=record.event_type,
+        target_url=record.target_url,
+        payload=record.payload,
+        attempt_count=record.attempt_count,
+        last_error=record.last_error,
+        dedup_key=record.dedup_key,
+        created_at=record.created_at,
+    ))
+    if isinstance(record, LogRecord):
+        record.status = "dead"
+        stage(db, record, STATE)
+    else:
+        db.delete(record)
+
+
+def replay_dead_letters(db: Session, ids: list[int] | None = None, queue: str | None = None, limit: int = 500) -> int:
+    """
+    Move dead-letter rows back to their outbox as fresh pending records.
+    """
+    query = db.query(models.DeadLetterOutbox)
+    if ids:
+        query = query.filter(models.DeadLetterOutbox.id.in_(ids))
+    if queue:
+        query = query.filter(models.DeadLetterOutbox.queue == queue)
+    letters = query.order_by(models.DeadLetterOutbox.id).limit(limit).all()
+    for queue_name in {letter.queue for letter in letters}:
+        model = OUTBOX_MODELS[queue_name]
+        keys = [letter.dedup_key for letter in letters if letter.queue == queue_name and letter.dedup_key]
+        # A newer record may have taken the dedup key since this one died.
+        taken = existing_dedup_keys(db, model, keys) if keys else set()
+        for letter in letters:
+            if letter.queue != queue_name:
+                continue
+            db.add(model(
+                event_type=letter.event_type,
+                target_url=letter.target_url,
+                payload=letter.payload,
+                status="pending",
+                attempt_count=0,
+                next_attempt_at=None,
+                dedup_key=None if letter.dedup_key in taken else letter.dedup_key,
+            ))
+            db.delete(letter)
+    db.commit()
+    return len(letters)
+
+
+def bulk_replay(
+    db: Session,
+    model,
+    statuses: list[str],
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    event_type: str | None = None,
+    target_url: str | None = None,
+    dry_run: bool = False,
+    release_per_second: float | None = None,
+    released_before: int = 0,
+) -> int:
+    """
+    Reset every matching outbox record to pending and return how many matched.
+
+    Records are updated in id-ordered chunks of set-based UPDATEs, one commit per
+    chunk. Their next_attempt_at is staggered so the dispatcher releases at most
+    ``release_per_second`` of them per second; ``released_before`` continues the
+    schedule across shards.
+    """
+    conditions = [model.status.in_(statuses)]
+    if created_from is not None:
+        conditions.append(model.created_at >= created_from)
+    if created_to is not None:
+        conditions.append(model.created_at < created_to)
+    if event_type:
+        conditions.append(model.event_type == event_type)
+    if target_url:
+        conditions.append(model.target_url == target_url)
+    if dry_run:
+        return db.query(func.count(model.id)).filter(*conditions).scalar()
+
+    rate = release_per_second or settings.bulk_replay_release_per_second
+    group_size = max(1, int(rate))
+    start = datetime.utcnow()
+    released = 0
+    last_id = 0
+    while True:
+        ids = [
+            row.id
+            for row in db.query(model.id)
+            .filter(*conditions, model.id > last_id)
+            .order_by(model.id)
+            .limit(settings.bulk_replay_chunk_size)
+        ]
+        if not ids:
+            break
+        for offset in range(0, len(ids), group_size):
+            group = ids[offset : offset + group_size]
+            release_at = start + timedelta(seconds=(released_before + released) / rate)
+            db.execute(
+                update(model)
+                .where(model.id.in_(group))
+                .values(status="pending", last_error=None, attempt_count=0, next_attempt_at=release_at)
+            )
+            released += len(group)
+        db.commit()
+        last_id = ids[-1]
+    return released
+
+
+def _due_records(db: Session, model) -> list:
+    query = (
+        db.query(model)
+        .filter(model.status.in_(("pending", "failed")))
+        .filter(or_(model.next_attempt_at.is_(None), model.next_attempt_at <= datetime.utcnow()))
+    )
+    if settings.dispatcher_count > 1:
+        # Dedicated dispatcher processes split the outbox by record id.
+        query = query.filter(model.id % settings.dispatcher_count == settings.dispatcher_index)
+    return query.all()
+
+
+def _next_lane(
+    lanes: dict[str, LaneQueue],
+    inflight: dict[str, int],
+    usable: Callable[[str], bool],
+    scheduler: WeightedRoundRobin,
+    now: datetime,
+) -> tuple[str, str, bool] | None:
+    """
+    Lane and target host to start next and whether it was promoted, or None while
+    every lane with work is at its limit or only has busy or open-circuit targets.
+    """
+    candidates = {}
+    for lane, queued in lanes.items():
+        if queued and inflight[lane] < max(settings.outbox_lane_concurrency.get(lane, 1), 1):
+            heads = queued.heads(usable)
+            if heads:
+                candidates[lane] = heads
+    if not candidates:
+        return None
+    # A record waiting past the starvation limit goes next, whatever its lane's weight.
+    starved = [
+        (due_since(record), lane, host)
+        for lane, heads in candidates.items()
+        for host, record in heads
+        if (now - due_since(record)).total_seconds() > settings.outbox_starvation_seconds
+    ]
+    if starved:
+        _, lane, host = min(starved)
+        return lane, host, True
+    lane = scheduler.pick(list(candidates))
+    return lane, candidates[lane][0][0], False
+
+
+async def _dispatch(db: Session, records: list[tuple[str, object]]):
+    lanes = plan_lanes(records)
+    for lane, queued in lanes.items():
+        lane_metrics.set_pending(lane, len(queued))
+    scheduler = WeightedRoundRobin(settings.outbox_lane_weights)
+    inflight = {lane: 0 for lane in lanes}
+    running: set[asyncio.Task] = set()
+
+    def usable(host: str) -> bool:
+        return delivery_targets.for_host(host).available()
+
+    async def run(lane: str, target: Target, record):
+        record_id = record.id
+        started = time.monotonic()
+        ok: bool | None = False
         try:
-            logger.info(
-                "Processing outbox record: record_id=%s event_type=%s attempt_count=%s",
-                record.id,
-                record.event_type,
-                record.attempt_count,
+            ok = await _deliver(db, record, target.client)
+        except Exception as exc:  # noqa: BLE001
+            db.rollback()
+            logger.warning("Outbox delivery could not be recorded: record_id=%s error=%s", record_id, exc)
+        finally:
+            inflight[lane] -= 1
+            target.finish(ok)
+        lane_metrics.finished(lane, time.monotonic() - started, bool(ok))
+
+    while any(lanes.values()) or running:
+        now = datetime.utcnow()
+        picked = _next_lane(lanes, inflight, usable, scheduler, now) if len(running) < max(settings.outbox_max_inflight, 1) else None
+        if picked is None:
+            if not running:
+                # Only targets with an open circuit are left; their records wait for a later pass.
+                break
+            _, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            continue
+        lane, host, promoted = picked
+        record = lanes[lane].pop(host)
+        target = delivery_targets.for_host(host)
+        target.start()
+        inflight[lane] += 1
+        lane_metrics.started(lane, (now - due_since(record)).total_seconds(), promoted)
+        running.add(asyncio.create_task(run(lane, target, record)))
+    for queued in lanes.values():
+        for host, count in queued.remaining().items():
+            delivery_targets.for_host(host).skipped += count
+
+
+async def _deliver(db: Session, record, client: IntegrationClient | None = None) -> bool:
+    """
+    One delivery attempt; updates and commits the record. True when it was sent, None
+    when it was rate limited and left for later without counting an attempt.
+    """
+    client = client or integration_client
+    throttled = False
+    rejected: tuple[models.Transaction, str] | None = None
+    try:
+        logger.info(
+            "Processing outbox record: record_id=%s event_type=%s attempt_count=%s",
+            record.id,
+            record.event_type,
+            record.attempt_count,
+        )
+        resp = await client._request_with_retry("POST", record.target_url, json=record.payload)
+        logger.info(
+            "Outbox delivery response: record_id=%s status=%s attempts=%s",
+            record.id,
+            resp.status_code,
+            record.attempt_count + 1,
+        )
+        if resp.status_code == 429:
+            # Refused by the local limiter or the target: nothing was delivered, so keep the
+            # record's status and attempt count and wait as long as asked.
+            throttled = True
+            record.last_error = "rate limited"
+            record.next_attempt_at = datetime.utcnow() + timedelta(
+                seconds=_retry_after_seconds(resp, retry_delay_seconds(max(record.attempt_count, 1)))
             )
-            resp = await integration_client._request_with_retry("POST", record.target_url, json=record.payload)
+        elif resp.status_code >= 500:
+            raise Exception(f"remote error {resp.status_code}")
+        else:
+            # Failed attempts are counted once, in the handler below.
             record.attempt_count += 1
-            logger.info(
-                "Outbox delivery response: record_id=%s status=%s attempts=%s",
+            record.status = "sent"
+            record.last_error = None
+            if resp.status_code >= 400 and _is_operator_record(record):
+                record.last_error = f"rejected {resp.status_code}"
+                transaction = _operator_transaction(db, record)
+                if transaction is not None and transaction.status == "initiated":
+                    rejected = transaction, operator_rejection_reason(resp)
+    except Exception as exc:  # noqa: BLE001
+        record.status = "failed"
+        record.last_error = str(exc)
+        record.attempt_count += 1
+        if record.attempt_count >= settings.outbox_max_attempts:
+            logger.error(
+                "Outbox record exhausted, moving to dead letter: record_id=%s error=%s attempt_count=%s",
                 record.id,
-                resp.status_code,
+                exc,
                 record.attempt_count,
             )
-            if resp.status_code >= 500:
-                raise Exception(f"remote error {resp.status_code}")
-            record.status = "sent"
-            record.last_error = None
-        except Exception as exc:  # noqa: BLE001
-            record.status = "failed"
-            record.last_error = str(exc)
-            record.attempt_count += 1
-            record.next_attempt_at = datetime.utcnow() + timedelta(seconds=2 ** record.attempt_count)
+        else:
+            record.next_attempt_at = datetime.utcnow() + timedelta(seconds=retry_delay_seconds(record.attempt_count))
             logger.warning(
                 "Outbox delivery failed: record_id=%s error=%s next_attempt_at=%s attempt_count=%s",
                 record.id,
@@ -77,15 +533,80 @@ async def _process_outbox(db: Session, model):
                 record.next_attempt_at,
                 record.attempt_count,
             )
-        finally:
+    finally:
+        sent = record.status == "sent"
+        if record.status == "failed" and record.attempt_count >= settings.outbox_max_attempts:
+            move_to_dead_letter(db, record)
+        elif isinstance(record, LogRecord):
+            stage(db, record, STATE)
+        else:
             db.add(record)
+        if rejected is not None:
+            await _reject_transaction(db, *rejected)
+        else:
             db.commit()
+    return None if throttled else sent
+
+
+def _is_operator_record(record) -> bool:
+    return record.queue == "operator" if isinstance(record, LogRecord) else isinstance(record, models.OperatorWebhookOutbox)
+
+
+def _operator_transaction(db: Session, record) -> models.Transaction | None:
+    correlation_id = (record.payload or {}).get("correlationId")
+    if correlation_id is None:
+        return None
+    return db.query(models.Transaction).filter(models.Transaction.correlation_id == correlation_id).first()
 
-async def background_outbox_worker(db_factory):
+
+def operator_rejection_reason(resp: httpx.Response) -> str:
+    try:
+        reason = resp.json().get("detail") or f"operator error {resp.status_code}"
+    except ValueError:
+        reason = f"operator error {resp.status_code}"
+    return str(reason)
+
+
+async def _reject_transaction(db: Session, transaction: models.Transaction, reason: str):
+    """
+    Mark a wallet transaction the operator refused as rejected and take it out of the
+    balance, together with the staged outbox update.
+
+    Its debit or credit was counted when the call was accepted; a snapshot taken since
+    then includes it as well, so that is corrected in the same commit.
+    """
+    reversal = -signed_amount(transaction.direction, transaction.amount_cents)
+    async with balance_ledger.lock(transaction.player_id):
+        transaction.status = "rejected"
+        transaction.reason = reason
+        transaction.balance_cents = (transaction.balance_cents or 0) + reversal
+        snapshot = db.query(models.BalanceSnapshot).filter(models.BalanceSnapshot.player_id == transaction.player_id).first()
+        if snapshot is not None and snapshot.last_transaction_id >= transaction.id:
+            snapshot.balance_cents += reversal
+        db.commit()
+        balance_ledger.reverse(transaction.player_id, transaction.id, reversal)
+    transaction_statuses.mark(
+        transaction.correlation_id, "rejected", reason=reason, balanceCents=transaction.balance_cents
+    )
+    logger.info(
+        "Operator rejected outbox wallet call: correlationId=%s reason=%s", transaction.correlation_id, reason
+    )
+
+
+def _retry_after_seconds(resp: httpx.Response, default: float) -> float:
+    try:
+        return max(float(resp.headers["Retry-After"]), 0.0)
+    except (KeyError, ValueError):
+        return default
+
+async def background_outbox_worker():
     while True:
-        db = db_factory()
-        try:
-            await process_outbox(db)
-        finally:
-            db.close()
+        for shard in range(shard_count()):
+            db = shard_session(shard)
+            try:
+                await process_outbox(db, include_log=shard == 0)
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("Outbox pass failed: shard=%s error=%s", shard, exc)
+            finally:
+                db.close()
         await asyncio.sleep(2)
@@ -0,0 +1,132 @@
+"""
+Minimal benchmark harness for the hub's per-request functions.
+
+    pytest benchmarks                      # compare against baselines.json
+    pytest benchmarks --update-baselines   # re-record baselines on this machine
+
+Each benchmark reports the best per-call time over several timeit repeats, and
+the peak memory and number of allocations traced while a single call runs. Next to each benchmark a fixed
+reference workload is timed, and the check compares the ratio of the two, so a
+faster, slower or busier machine scales both sides. A benchmark fails when its
+ratio exceeds the stored one by more than --bench-threshold (default 2x, or
+BENCH_THRESHOLD).
+"""
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+BASELINES = Path(__file__).with_name("baselines.json")
+
+
+def _best_ns(fn, repeat: int = 3) -> float:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e9
+
+
+def _reference_workload():
+    # Plain interpreter work of the same kind as the hot paths: dict building, formatting, JSON.
+    data = {f"key-{i}": {"amount": i * 1.5, "ref": f"ref-{i}"} for i in range(20)}
+    return json.dumps(data, sort_keys=True)
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    # Leave out the snapshots' own allocations.
+    return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+
+def pytest_addoption(parser):
+    parser.addoption("--update-baselines", action="store_true", help="write measured results to baselines.json")
+    parser.addoption(
+        "--bench-threshold",
+        type=float,
+        default=float(os.getenv("BENCH_THRESHOLD", "2.0")),
+        help="fail when a benchmark is slower than baseline times this factor, relative to the reference workload",
+    )
+
+
+class Bench:
+    def __init__(self, baselines: dict, results: dict, threshold: float, update: bool):
+        self.baselines = baselines
+        self.results = results
+        self.threshold = threshold
+        self.update = update
+
+    def __call__(self, name: str, fn, *args, **kwargs) -> dict:
+        # Benchmark and reference are timed in alternating rounds so both see the same machine
+        # conditions; the best round is kept, which filters out rounds slowed by other load.
+        rounds = []
+        for _ in range(3):
+            best = _best_ns(lambda: fn(*args, **kwargs))
+            rounds.append((best / _best_ns(_reference_workload), best))
+        ratio, best = min(rounds)
+
+        tracemalloc.start()
+        try:
+            before = _snapshot()
+            start, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            value = fn(*args, **kwargs)
+            _, peak = tracemalloc.get_traced_memory()
+            # Blocks still allocated after the call, the returned value included.
+            allocations = sum(max(stat.count_diff, 0) for stat in _snapshot().compare_to(before, "lineno"))
+            del value
+        finally:
+            tracemalloc.stop()
+
+        result = {
+            "ns_per_call": round(best, 1),
+            "relative": round(ratio, 4),
+            "peak_bytes": max(peak - start, 0),
+            "allocations": allocations,
+        }
+        self.results[name] = result
+        baseline = self.baselines.get(name)
+        if baseline and "relative" in baseline and not self.update:
+            limit = baseline["relative"] * self.threshold
+            assert result["relative"] <= limit, (
+                f"{name}: {result['relative']}x the reference workload exceeds {limit:.4f} "
+                f"({self.threshold}x baseline {baseline['relative']}; {result['ns_per_call']} ns/call)"
+            )
+        return result
+
+
+_results: dict = {}
+
+
+@pytest.fixture(scope="session")
+def bench(request) -> Bench:
+    baselines = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+    return Bench(
+        baselines,
+        _results,
+        request.config.getoption("--bench-threshold"),
+        request.config.getoption("--update-baselines"),
+    )
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if _results and session.config.getoption("--update-baselines"):
+        existing = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+        existing.update(_results)
+        BASELINES.write_text(json.dumps(dict(sorted(existing.items())), indent=2) + "\n")
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _results:
+        return
+    terminalreporter.section("benchmarks")
+    for name, result in sorted(_results.items()):
+        terminalreporter.write_line(
+            f"{name:<40} {result['ns_per_call']:>12.1f} ns/call {result['peak_bytes']:>10} B peak "
+            f"{result['allocations']:>6} allocations"
+        )
@@ -0,0 +1,58 @@
+"""
+Measure how long a fresh hub process takes to import the app and become ready.
+
+    python benchmarks/startup_time.py --runs 10
+
+Each run starts a new interpreter, imports app.main and drives the lifespan
+startup against a throwaway SQLite database with background tasks disabled.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+PROBE = """
+import asyncio, json, time
+t0 = time.perf_counter()
+import app.main as main
+t1 = time.perf_counter()
+
+async def startup():
+    async with main.app.router.lifespan_context(main.app):
+        return time.perf_counter()
+
+t2 = asyncio.run(startup())
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "ready_ms": (t2 - t0) * 1000}))
+"""
+
+
+def run_once(db_url: str) -> dict:
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(ROOT),
+        "DB_URL": db_url,
+        "RUN_BACKGROUND_TASKS": "false",
+    }
+    result = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        samples = [run_once(f"sqlite:///{tmp}/startup.db") for _ in range(args.runs)]
+    for key in ("import_ms", "ready_ms"):
+        values = [s[key] for s in samples]
+        print(f"{key}: median={statistics.median(values):.1f} min={min(values):.1f} max={max(values):.1f}")
+
+
+if __name__ == "__main__":
+    main()
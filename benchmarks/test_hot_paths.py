@@ -0,0 +1,105 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from app.config import settings
+from app.contracts.contracts import OperatorWalletRequest, RgsRequest
+from app.contracts.mapping import operator_wallet_payload, rgs_payload, units_to_cents
+from app.helpers import IntegrationClient, hash_request, serialize_outbox, validate_currency
+from app.models import models
+from app.reconciliation import _item_data
+from app.schemas.app_schemas import WalletRequest, WebhookPayload
+from app.security import compute_signature, validate_signature
+
+WALLET_BODY = {"playerId": "player-1", "amountCents": 1250.0, "currency": "USD", "refId": "ref-123456"}
+WEBHOOK = WebhookPayload(
+    playerId="player-1_ext",
+    amount=12.5,
+    currency="USD",
+    status="OK",
+    event="withdraw",
+    refId="ref-123456",
+    correlationId="0b7c3f56-7a43-4bde-9a67-1f0b5e1c2d3a",
+)
+
+
+def _drive(coro):
+    # Run a coroutine that never suspends without paying for an event loop.
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise RuntimeError("coroutine suspended")
+
+
+def test_hash_request(bench):
+    bench("hash_request", hash_request, WALLET_BODY)
+
+
+def test_compute_signature(bench):
+    bench("compute_signature", compute_signature, WALLET_BODY, "1700000000")
+
+
+def test_validate_signature(bench, monkeypatch):
+    timestamp = str(int(time.time()))
+    signature = compute_signature(WALLET_BODY, timestamp)
+    monkeypatch.setattr(settings, "timestamp_skew_seconds", 3600)
+    bench("validate_signature", validate_signature, WALLET_BODY, signature, timestamp)
+
+
+def test_validate_currency(bench):
+    bench("validate_currency", validate_currency, "EUR")
+
+
+def test_serialize_outbox(bench):
+    record = models.RGSWebhookOutbox(
+        id=1,
+        event_type="debit",
+        target_url="http://mock-rgs:8002/webhooks",
+        payload=RgsRequest.from_webhook_payload(WEBHOOK).model_dump(by_alias=True),
+        status="pending",
+        attempt_count=0,
+        next_attempt_at=datetime(2024, 1, 1, 12, 0, 0),
+        created_at=datetime(2024, 1, 1, 12, 0, 0),
+    )
+    bench("serialize_outbox", serialize_outbox, record)
+
+
+def test_operator_wallet_request_from_wallet_request(bench):
+    bench(
+        "OperatorWalletRequest.from_wallet_request",
+        OperatorWalletRequest.from_wallet_request,
+        WalletRequest(**WALLET_BODY),
+        WEBHOOK.correlationId,
+    )
+
+
+def test_rgs_request_from_webhook_payload(bench):
+    bench("RgsRequest.from_webhook_payload", RgsRequest.from_webhook_payload, WEBHOOK)
+
+
+def test_operator_wallet_payload(bench):
+    bench("mapping.operator_wallet_payload", operator_wallet_payload, WalletRequest(**WALLET_BODY), WEBHOOK.correlationId)
+
+
+def test_rgs_payload(bench):
+    bench("mapping.rgs_payload", rgs_payload, WEBHOOK)
+
+
+def test_units_to_cents_decimal_fallback(bench):
+    bench("mapping.units_to_cents[sub-cent]", units_to_cents, 1.015)
+
+
+@pytest.mark.parametrize("size", [1_000])
+def test_item_data(bench, size):
+    items = [{"correlationId": f"corr-{i}", "refId": f"ref-{i}", "amountCents": i} for i in range(size)]
+    bench(f"_item_data[{size}]", _item_data, items)
+
+
+def test_respect_rate_limit_at_limit(bench):
+    client = IntegrationClient(rate_limit_per_minute=60)
+    for _ in range(60):
+        _drive(client._respect_rate_limit())
+    # Steady state under load: the window is full and every call is refused.
+    bench("IntegrationClient._respect_rate_limit", lambda: _drive(client._respect_rate_limit()))
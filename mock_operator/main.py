@@ -1,13 +1,20 @@
 import asyncio
+from datetime import datetime, timedelta
 from enum import Enum
+import hashlib
+import hmac
+import json
 import logging
 import os
-from typing import List, Literal
+import random
+import time
+from typing import List, Literal, Optional
 
 import httpx
-from fastapi import Depends, FastAPI, HTTPException
-from pydantic import BaseModel
-from sqlalchemy import Column, Integer, String, Float, DateTime, create_engine
+from fastapi import Depends, FastAPI, HTTPException, Query, Response
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index, create_engine, event, insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
 from sqlalchemy.sql import func
 
@@ -18,8 +25,17 @@ logging.basicConfig(
 logger = logging.getLogger("mock-operator")
 
 
-DB_URL = "sqlite:////data/operator.db"
+DB_URL = os.getenv("DB_URL", "sqlite:////data/operator.db")
 engine = create_engine(DB_URL, connect_args={"check_same_thread": False})
+
+
+@event.listens_for(engine, "connect")
+def _sqlite_pragmas(dbapi_connection, _connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -27,6 +43,10 @@ app = FastAPI(title="Mock Operator")
 
 SUPPPORTED_CURRENCIES = ["USD", "EUR"]
 INTEGRATION_WEBHOOK_URL = os.getenv("INTEGRATION_WEBHOOK_URL")
+INTEGRATION_STATUS_WEBHOOK_URL = os.getenv("INTEGRATION_STATUS_WEBHOOK_URL")
+# Shared with the hub, which requires signed status callbacks.
+HMAC_SECRET = os.getenv("HMAC_SECRET", "change_secret")
+BLOCKED_STATUSES = {"blocked", "suspended", "closed"}
 
 class OperatorAction(str, Enum):
     DEPOSIT = "deposit"
@@ -50,9 +70,160 @@ class Transaction(Base):
     status = Column(String, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     correlation_id = Column(String, nullable=True)
+    __table_args__ = (Index("uq_transactions_reference_direction", "reference", "direction", unique=True),)
+
+
+class PlayerStatus(Base):
+    __tablename__ = "player_statuses"
+    player = Column(String, primary_key=True)
+    status = Column(String, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class StatusUpdate(BaseModel):
+    status: str
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+class FaultConfig(BaseModel):
+    """
+    Simulated downstream behaviour; set through MOCK_* env vars or PUT /admin/faults.
+    """
+    latencyMs: float = Field(_env_float("MOCK_LATENCY_MS", 0), ge=0)
+    latencyJitterMs: float = Field(_env_float("MOCK_LATENCY_JITTER_MS", 0), ge=0)
+    latencyDistribution: Literal["fixed", "uniform", "exponential"] = os.getenv("MOCK_LATENCY_DISTRIBUTION", "fixed")
+    errorRate: float = Field(_env_float("MOCK_ERROR_RATE", 0), ge=0, le=1)
+    rateLimitRate: float = Field(_env_float("MOCK_RATE_LIMIT_RATE", 0), ge=0, le=1)
+    retryAfterSeconds: float = Field(_env_float("MOCK_RETRY_AFTER_SECONDS", 1), ge=0)
+    maxRps: float = Field(_env_float("MOCK_MAX_RPS", 0), ge=0)
+    callbackDelayMs: float = Field(_env_float("MOCK_CALLBACK_DELAY_MS", 0), ge=0)
+    callbackDuplicateRate: float = Field(_env_float("MOCK_CALLBACK_DUPLICATE_RATE", 0), ge=0, le=1)
+    callbackConcurrency: int = Field(int(_env_float("MOCK_CALLBACK_CONCURRENCY", 50)), ge=1)
+
+
+class ThroughputCap:
+    """
+    Token bucket refilled at `rate` requests per second.
+    """
+
+    def __init__(self):
+        self.tokens: Optional[float] = None
+        self.updated = time.monotonic()
+
+    def allow(self, rate: float) -> bool:
+        now = time.monotonic()
+        if self.tokens is None:
+            self.tokens = rate
+        self.tokens = min(rate, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+faults = FaultConfig()
+throughput_cap = ThroughputCap()
+
+
+def _sample_latency() -> float:
+    if faults.latencyDistribution == "uniform":
+        millis = random.uniform(faults.latencyMs - faults.latencyJitterMs, faults.latencyMs + faults.latencyJitterMs)
+    elif faults.latencyDistribution == "exponential":
+        millis = random.expovariate(1 / faults.latencyMs) if faults.latencyMs else 0
+    else:
+        millis = faults.latencyMs
+    return max(millis, 0) / 1000
+
+
+async def _simulate_faults():
+    retry_after = {"Retry-After": str(faults.retryAfterSeconds)}
+    if faults.maxRps and not throughput_cap.allow(faults.maxRps):
+        raise HTTPException(status_code=429, detail="throughput cap", headers=retry_after)
+    delay = _sample_latency()
+    if delay:
+        await asyncio.sleep(delay)
+    roll = random.random()
+    if roll < faults.rateLimitRate:
+        raise HTTPException(status_code=429, detail="simulated rate limit", headers=retry_after)
+    if roll < faults.rateLimitRate + faults.errorRate:
+        raise HTTPException(status_code=503, detail="simulated failure")
+
+
+class BatchWriter:
+    """
+    Collects rows from concurrent requests and inserts them with one executemany per flush.
+    """
+
+    def __init__(self, model, max_batch: int = 500, interval_seconds: float = 0.005):
+        self.model = model
+        self.max_batch = max_batch
+        self.interval_seconds = interval_seconds
+        self._rows: list = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def add(self, row: dict):
+        future = asyncio.get_running_loop().create_future()
+        self._rows.append((row, future))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_soon())
+        await future
+
+    async def _flush_soon(self):
+        await asyncio.sleep(self.interval_seconds)
+        while self._rows:
+            batch, self._rows = self._rows[: self.max_batch], self._rows[self.max_batch :]
+            try:
+                await asyncio.to_thread(self._insert, [row for row, _ in batch])
+                error = None
+            except Exception as exc:  # noqa: BLE001
+                error = exc
+            for _, future in batch:
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+
+    def _insert(self, rows: list[dict]):
+        with SessionLocal() as db:
+            try:
+                db.execute(insert(self.model), rows)
+                db.commit()
+                return
+            except IntegrityError:
+                db.rollback()
+            # A row in the batch is already stored: insert one by one and skip the duplicates.
+            for row in rows:
+                try:
+                    db.execute(insert(self.model), [row])
+                    db.commit()
+                except IntegrityError:
+                    db.rollback()
+                    logger.info("Skipping duplicate transaction refId=%s direction=%s", row.get("reference"), row.get("direction"))
 
 
 Base.metadata.create_all(bind=engine)
+for _index in Transaction.__table__.indexes:
+    # Databases created before the unique index existed get it here.
+    _index.create(bind=engine, checkfirst=True)
+transaction_writer = BatchWriter(Transaction)
+# (reference, direction) pairs being stored by this process; checked before awaiting the writer
+# so a concurrent duplicate cannot pass the existence check too.
+_pending_references: set[tuple[str, str]] = set()
+_callback_client: Optional[httpx.AsyncClient] = None
+_callback_slots = asyncio.Semaphore(faults.callbackConcurrency)
+
+
+def _get_callback_client() -> httpx.AsyncClient:
+    global _callback_client
+    if _callback_client is None:
+        _callback_client = httpx.AsyncClient(timeout=5.0)
+    return _callback_client
 
 
 def get_db():
@@ -103,12 +274,16 @@ async def _send_callback(event: OperatorAction, player_id: str, amount: float, c
         "event": event.value,
         "refId": reference,
         "correlationId": correlation_id,
-    }    
+    }
+    if faults.callbackDelayMs:
+        await asyncio.sleep(faults.callbackDelayMs / 1000)
+    deliveries = 2 if random.random() < faults.callbackDuplicateRate else 1
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
+        async with _callback_slots:
             # No retry logic here for simplicity
             # We should also add authentication headers here, not added for mock simplicity
-            await client.post(INTEGRATION_WEBHOOK_URL, json=payload)
+            for _ in range(deliveries):
+                await _get_callback_client().post(INTEGRATION_WEBHOOK_URL, json=payload)
     except Exception:
         # Ignore callback delivery errors to keep the mock simple.
         logger.warning(
@@ -119,6 +294,44 @@ async def _send_callback(event: OperatorAction, player_id: str, amount: float, c
         return
 
 
+async def _send_status_callback(player_id: str, status: str):
+    if not INTEGRATION_STATUS_WEBHOOK_URL:
+        return
+    logger.info("Sending status callback player=%s status=%s", player_id, status)
+    body = {"playerId": player_id, "status": status}
+    timestamp = str(int(time.time()))
+    message = f"{timestamp}:{json.dumps(body, sort_keys=True)}".encode()
+    headers = {"X-Signature": hmac.new(HMAC_SECRET.encode(), message, hashlib.sha256).hexdigest(), "X-Timestamp": timestamp}
+    try:
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            await client.post(INTEGRATION_STATUS_WEBHOOK_URL, json=body, headers=headers)
+    except Exception:
+        logger.warning("Failed to send status callback for player=%s", player_id)
+
+
+@app.get("/v2/players/statuses")
+async def list_player_statuses(db: Session = Depends(get_db)):
+    statuses: List[PlayerStatus] = db.query(PlayerStatus).all()
+    logger.info("Listing %s player statuses", len(statuses))
+    return [{"playerId": s.player, "status": s.status} for s in statuses]
+
+
+@app.put("/admin/players/{player_external_id}/status")
+async def set_player_status(player_external_id: str, body: StatusUpdate, db: Session = Depends(get_db)):
+    """
+    Set a player's account status and push it to the integration hub.
+    """
+    record = db.get(PlayerStatus, player_external_id)
+    if record is None:
+        record = PlayerStatus(player=player_external_id, status=body.status)
+        db.add(record)
+    else:
+        record.status = body.status
+    db.commit()
+    asyncio.create_task(_send_status_callback(player_external_id, body.status))
+    return {"playerId": player_external_id, "status": body.status}
+
+
 @app.post("/v2/players/{player_external_id}/{wallet_action}")
 async def wallet_action(
     player_external_id: str,
@@ -126,6 +339,7 @@ async def wallet_action(
     body: Operation,
     db: Session = Depends(get_db),
 ):
+    await _simulate_faults()
     logger.info(
         "Received wallet action=%s player=%s refId=%s amount=%s currency=%s correlationId=%s",
         wallet_action,
@@ -139,21 +353,29 @@ async def wallet_action(
         logger.warning("Unsupported currency=%s for refId=%s", body.currency, body.reference)
         raise HTTPException(status_code=422, detail="unsupported currency")
 
+    player_status = db.get(PlayerStatus, player_external_id)
+    if player_status and player_status.status in BLOCKED_STATUSES:
+        logger.warning("Rejected wallet action for blocked player=%s", player_external_id)
+        raise HTTPException(status_code=403, detail="account blocked")
+
     direction = OperatorAction(wallet_action)
 
-    existing = _existing_transaction(db, body.reference, direction)
+    pending_key = (body.reference, direction.value)
+    existing = pending_key in _pending_references or _existing_transaction(db, body.reference, direction)
     if not existing:
-        wallet_action_transaction = Transaction(
-            player=player_external_id,
-            amount=body.amount,
-            currency=body.currency,
-            reference=body.reference,
-            direction=direction,
-            status="OK",
-            correlation_id=body.correlationId,
-        )
-        db.add(wallet_action_transaction)
-        db.commit()
+        _pending_references.add(pending_key)
+        try:
+            await transaction_writer.add({
+                "player": player_external_id,
+                "amount": body.amount,
+                "currency": body.currency,
+                "reference": body.reference,
+                "direction": direction.value,
+                "status": "OK",
+                "correlation_id": body.correlationId,
+            })
+        finally:
+            _pending_references.discard(pending_key)
         logger.info(
             "Stored operator transaction action=%s refId=%s",
             direction,
@@ -179,13 +401,104 @@ async def wallet_action(
     return {"status": "OK", "correlationId": body.correlationId}
 
 
+def _naive(value: Optional[datetime]) -> Optional[datetime]:
+    return value.replace(tzinfo=None) if value is not None else None
+
+
+def _in_range(query, created_from: Optional[datetime], created_to: Optional[datetime]):
+    # SQLite stores server_default timestamps without fractional seconds, which compare
+    # inconsistently against bound datetimes; widen by a second here and filter exactly in Python.
+    if created_from is not None:
+        query = query.filter(Transaction.created_at >= created_from - timedelta(seconds=1))
+    if created_to is not None:
+        query = query.filter(Transaction.created_at < created_to + timedelta(seconds=1))
+    return query
+
+
+def _within(created_at: Optional[datetime], created_from: Optional[datetime], created_to: Optional[datetime]) -> bool:
+    created_at = _naive(created_at)
+    if created_at is None:
+        return created_from is None and created_to is None
+    return (created_from is None or created_at >= created_from) and (created_to is None or created_at < created_to)
+
+
 @app.get("/v2/transactions")
-async def list_transactions(db: Session = Depends(get_db)):
-    txns: List[Transaction] = db.query(Transaction).order_by(Transaction.created_at).all()
+async def list_transactions(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=10_000),
+    afterId: int = 0,
+    createdFrom: Optional[datetime] = None,
+    createdTo: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Transactions in id order. With `limit`, a full page sets X-Next-After-Id for the next request.
+    `createdFrom` / `createdTo` restrict the list to a half-open creation time range.
+    """
+    created_from, created_to = _naive(createdFrom), _naive(createdTo)
+    query = db.query(Transaction).filter(Transaction.id > afterId).order_by(Transaction.id)
+    query = _in_range(query, created_from, created_to)
+    if limit:
+        query = query.limit(limit)
+    txns: List[Transaction] = query.all()
+    if limit and len(txns) == limit:
+        response.headers["X-Next-After-Id"] = str(txns[-1].id)
+    txns = [t for t in txns if _within(t.created_at, created_from, created_to)]
     logger.info("Listing %s operator transactions", len(txns))
     return [_serialize_transaction(t) for t in txns]
 
 
+BUCKET_FORMATS = {"day": "%Y-%m-%dT00:00:00", "hour": "%Y-%m-%dT%H:00:00", "minute": "%Y-%m-%dT%H:%M:00"}
+
+
+@app.get("/v2/transactions/digest")
+async def transactions_digest(
+    granularity: Literal["day", "hour", "minute"] = "hour",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Per-bucket count and XOR of blake2b-64 hashes over correlationId|amount in cents|status.
+    """
+    created_from, created_to = _naive(start), _naive(end)
+    query = db.query(Transaction.created_at, Transaction.correlation_id, Transaction.amount, Transaction.status)
+    buckets: dict[str, list[int]] = {}
+    for created_at, correlation_id, amount, status in _in_range(query, created_from, created_to):
+        if not correlation_id or not _within(created_at, created_from, created_to):
+            continue
+        key = f"{correlation_id}|{int(round(amount * 100))}|{status}".encode()
+        entry = buckets.setdefault(created_at.strftime(BUCKET_FORMATS[granularity]), [0, 0])
+        entry[0] += 1
+        entry[1] ^= int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "big")
+    return [
+        {"bucket": bucket, "count": count, "hash": f"{value:016x}"}
+        for bucket, (count, value) in sorted(buckets.items())
+    ]
+
+
+@app.get("/admin/faults")
+async def get_faults():
+    return faults
+
+
+@app.put("/admin/faults")
+async def set_faults(update: dict):
+    """
+    Change simulated latency, errors, throughput and callback behaviour; omitted fields keep their value.
+    """
+    global faults, _callback_slots
+    try:
+        new_faults = FaultConfig.model_validate({**faults.model_dump(), **update})
+    except ValidationError as exc:
+        raise HTTPException(status_code=422, detail=exc.errors(include_url=False, include_context=False))
+    if new_faults.callbackConcurrency != faults.callbackConcurrency:
+        _callback_slots = asyncio.Semaphore(new_faults.callbackConcurrency)
+    faults = new_faults
+    logger.warning("Updated mock operator faults: %s", faults.model_dump())
+    return faults
+
+
 @app.post("/admin/clear-db")
 async def clear_db(db: Session = Depends(get_db)):
     """
@@ -1,9 +1,15 @@
+import asyncio
+import hashlib
 import logging
-from typing import List
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List, Literal, Optional
 
-from fastapi import Depends, FastAPI
-from pydantic import BaseModel, StrictInt
-from sqlalchemy import JSON, Column, DateTime, Integer, String, create_engine
+from fastapi import Depends, FastAPI, HTTPException, Query, Response
+from pydantic import BaseModel, Field, StrictInt, ValidationError
+from sqlalchemy import JSON, Column, DateTime, Integer, String, create_engine, event, insert
 from sqlalchemy.orm import Session, declarative_base, sessionmaker
 from sqlalchemy.sql import func
 
@@ -13,8 +19,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger("mock-rgs")
 
-DB_URL = "sqlite:////data/rgs.db"
+DB_URL = os.getenv("DB_URL", "sqlite:////data/rgs.db")
 engine = create_engine(DB_URL, connect_args={"check_same_thread": False})
+
+
+@event.listens_for(engine, "connect")
+def _sqlite_pragmas(dbapi_connection, _connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -46,6 +61,119 @@ class ReceivedWebhook(Base):
 Base.metadata.create_all(bind=engine)
 
 
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+class FaultConfig(BaseModel):
+    """
+    Simulated RGS behaviour; set through MOCK_* env vars or PUT /admin/faults.
+    """
+    latencyMs: float = Field(_env_float("MOCK_LATENCY_MS", 0), ge=0)
+    latencyJitterMs: float = Field(_env_float("MOCK_LATENCY_JITTER_MS", 0), ge=0)
+    latencyDistribution: Literal["fixed", "uniform", "exponential"] = os.getenv("MOCK_LATENCY_DISTRIBUTION", "fixed")
+    errorRate: float = Field(_env_float("MOCK_ERROR_RATE", 0), ge=0, le=1)
+    rateLimitRate: float = Field(_env_float("MOCK_RATE_LIMIT_RATE", 0), ge=0, le=1)
+    retryAfterSeconds: float = Field(_env_float("MOCK_RETRY_AFTER_SECONDS", 1), ge=0)
+    maxRps: float = Field(_env_float("MOCK_MAX_RPS", 0), ge=0)
+
+
+class ThroughputCap:
+    """
+    Token bucket refilled at `rate` requests per second.
+    """
+
+    def __init__(self):
+        self.tokens: Optional[float] = None
+        self.updated = time.monotonic()
+
+    def allow(self, rate: float) -> bool:
+        now = time.monotonic()
+        if self.tokens is None:
+            self.tokens = rate
+        self.tokens = min(rate, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+faults = FaultConfig()
+throughput_cap = ThroughputCap()
+
+
+def _sample_latency() -> float:
+    if faults.latencyDistribution == "uniform":
+        millis = random.uniform(faults.latencyMs - faults.latencyJitterMs, faults.latencyMs + faults.latencyJitterMs)
+    elif faults.latencyDistribution == "exponential":
+        millis = random.expovariate(1 / faults.latencyMs) if faults.latencyMs else 0
+    else:
+        millis = faults.latencyMs
+    return max(millis, 0) / 1000
+
+
+async def _simulate_faults():
+    retry_after = {"Retry-After": str(faults.retryAfterSeconds)}
+    if faults.maxRps and not throughput_cap.allow(faults.maxRps):
+        raise HTTPException(status_code=429, detail="throughput cap", headers=retry_after)
+    delay = _sample_latency()
+    if delay:
+        await asyncio.sleep(delay)
+    roll = random.random()
+    if roll < faults.rateLimitRate:
+        raise HTTPException(status_code=429, detail="simulated rate limit", headers=retry_after)
+    if roll < faults.rateLimitRate + faults.errorRate:
+        raise HTTPException(status_code=503, detail="simulated failure")
+
+
+class BatchWriter:
+    """
+    Collects rows from concurrent requests and inserts them with one executemany per flush.
+    """
+
+    def __init__(self, model, max_batch: int = 500, interval_seconds: float = 0.005):
+        self.model = model
+        self.max_batch = max_batch
+        self.interval_seconds = interval_seconds
+        self._rows: list = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def add(self, row: dict) -> int:
+        future = asyncio.get_running_loop().create_future()
+        self._rows.append((row, future))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_soon())
+        return await future
+
+    async def _flush_soon(self):
+        await asyncio.sleep(self.interval_seconds)
+        while self._rows:
+            batch, self._rows = self._rows[: self.max_batch], self._rows[self.max_batch :]
+            try:
+                ids = await asyncio.to_thread(self._insert, [row for row, _ in batch])
+                error = None
+            except Exception as exc:  # noqa: BLE001
+                ids, error = [None] * len(batch), exc
+            for (_, future), record_id in zip(batch, ids):
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(record_id)
+                else:
+                    future.set_exception(error)
+
+    def _insert(self, rows: list[dict]) -> list[int]:
+        with SessionLocal() as db:
+            result = db.execute(insert(self.model).returning(self.model.id, sort_by_parameter_order=True), rows)
+            ids = list(result.scalars())
+            db.commit()
+        return ids
+
+
+webhook_writer = BatchWriter(ReceivedWebhook)
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -68,8 +196,9 @@ def _serialize(record: ReceivedWebhook) -> dict:
 
 
 @app.post("/webhooks")
-async def webhooks(payload: Webhook, db: Session = Depends(get_db)):
+async def webhooks(payload: Webhook):
     # We should also add authentication here to simulate real RGS behavior, not added for mock simplicity
+    await _simulate_faults()
     logger.info(
         "RGS received webhook event=%s refId=%s correlationId=%s status=%s",
         payload.event,
@@ -77,28 +206,115 @@ async def webhooks(payload: Webhook, db: Session = Depends(get_db)):
         payload.correlationId,
         payload.status,
     )
-    record = ReceivedWebhook(
-        event=payload.event, 
-        ref_id=payload.refId, 
-        status=payload.status,
-        playerId=payload.playerId,
-        amountCents=payload.amountCents,
-        currency=payload.currency,
-        correlationId=payload.correlationId
-    )
-    db.add(record)
-    db.commit()
-    db.refresh(record)
-    return {"accepted": True, "id": record.id}
+    record_id = await webhook_writer.add({
+        "event": payload.event,
+        "ref_id": payload.refId,
+        "status": payload.status,
+        "playerId": payload.playerId,
+        "amountCents": payload.amountCents,
+        "currency": payload.currency,
+        "correlationId": payload.correlationId,
+    })
+    return {"accepted": True, "id": record_id}
+
+
+def _naive(value: Optional[datetime]) -> Optional[datetime]:
+    return value.replace(tzinfo=None) if value is not None else None
+
+
+def _in_range(query, column, created_from: Optional[datetime], created_to: Optional[datetime]):
+    # SQLite stores server_default timestamps without fractional seconds, which compare
+    # inconsistently against bound datetimes; widen by a second here and filter exactly in Python.
+    if created_from is not None:
+        query = query.filter(column >= created_from - timedelta(seconds=1))
+    if created_to is not None:
+        query = query.filter(column < created_to + timedelta(seconds=1))
+    return query
+
+
+def _within(created_at: Optional[datetime], created_from: Optional[datetime], created_to: Optional[datetime]) -> bool:
+    created_at = _naive(created_at)
+    if created_at is None:
+        return created_from is None and created_to is None
+    return (created_from is None or created_at >= created_from) and (created_to is None or created_at < created_to)
 
 
 @app.get("/webhooks")
-async def list_webhooks(db: Session = Depends(get_db)):
-    records: List[ReceivedWebhook] = db.query(ReceivedWebhook).order_by(ReceivedWebhook.created_at).all()
+async def list_webhooks(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=10_000),
+    afterId: int = 0,
+    createdFrom: Optional[datetime] = None,
+    createdTo: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Received webhooks in id order. With `limit`, a full page sets X-Next-After-Id for the next request.
+    `createdFrom` / `createdTo` restrict the list to a half-open creation time range.
+    """
+    created_from, created_to = _naive(createdFrom), _naive(createdTo)
+    query = db.query(ReceivedWebhook).filter(ReceivedWebhook.id > afterId).order_by(ReceivedWebhook.id)
+    query = _in_range(query, ReceivedWebhook.created_at, created_from, created_to)
+    if limit:
+        query = query.limit(limit)
+    records: List[ReceivedWebhook] = query.all()
+    if limit and len(records) == limit:
+        response.headers["X-Next-After-Id"] = str(records[-1].id)
+    records = [r for r in records if _within(r.created_at, created_from, created_to)]
     logger.info("Listing %s received webhooks", len(records))
     return [_serialize(r) for r in records]
 
 
+BUCKET_FORMATS = {"day": "%Y-%m-%dT00:00:00", "hour": "%Y-%m-%dT%H:00:00", "minute": "%Y-%m-%dT%H:%M:00"}
+
+
+@app.get("/webhooks/digest")
+async def webhooks_digest(
+    granularity: Literal["day", "hour", "minute"] = "hour",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Per-bucket count and XOR of blake2b-64 hashes over correlationId|amountCents|status.
+    """
+    created_from, created_to = _naive(start), _naive(end)
+    query = db.query(
+        ReceivedWebhook.created_at, ReceivedWebhook.correlationId, ReceivedWebhook.amountCents, ReceivedWebhook.status
+    )
+    buckets: dict[str, list[int]] = {}
+    for created_at, correlation_id, amount_cents, status in _in_range(query, ReceivedWebhook.created_at, created_from, created_to):
+        if not _within(created_at, created_from, created_to):
+            continue
+        key = f"{correlation_id}|{int(amount_cents)}|{status}".encode()
+        entry = buckets.setdefault(created_at.strftime(BUCKET_FORMATS[granularity]), [0, 0])
+        entry[0] += 1
+        entry[1] ^= int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "big")
+    return [
+        {"bucket": bucket, "count": count, "hash": f"{value:016x}"}
+        for bucket, (count, value) in sorted(buckets.items())
+    ]
+
+
+@app.get("/admin/faults")
+async def get_faults():
+    return faults
+
+
+@app.put("/admin/faults")
+async def set_faults(update: dict):
+    """
+    Change simulated latency, errors and throughput; omitted fields keep their value.
+    """
+    global faults
+    try:
+        faults = FaultConfig.model_validate({**faults.model_dump(), **update})
+    except ValidationError as exc:
+        raise HTTPException(status_code=422, detail=exc.errors(include_url=False, include_context=False))
+    logger.warning("Updated mock RGS faults: %s", faults.model_dump())
+    return faults
+
+
 @app.post("/admin/clear-db")
 async def clear_db(db: Session = Depends(get_db)):
     """
@@ -1,8 +1,8 @@
 import asyncio
 from datetime import datetime, timedelta, UTC
-import os
+import subprocess
 import sys
-from importlib import reload
+import time
 from pathlib import Path
 
 import pytest
@@ -14,46 +14,43 @@ if str(ROOT) not in sys.path:
 
 
 @pytest.fixture(scope="function")
-def app_module(tmp_path_factory):
+def app_module(tmp_path_factory, monkeypatch):
     """
-    Reload the app with a disposable SQLite DB and disable background workers.
+    Point the app at a disposable SQLite DB, reset in-memory state and disable background workers.
     """
+    import app.config as config
+    import app.database as database
+    import app.models.models as models
+    import app.main as main
+
     db_path = tmp_path_factory.mktemp("data") / "test.db"
-    new_env = {
-        "DB_URL": f"sqlite:///{db_path}",
-        "BEARER_TOKEN": "testtoken",
-        "OPERATOR_BASE_URL": "http://mock-operator:8001",
-        "RGS_WEBHOOK_URL": "http://mock-rgs:8002/webhooks",
-        "TIMESTAMP_SKEW_SECONDS": "5",
-    }
-    old_env = {k: os.environ.get(k) for k in new_env}
-    os.environ.update(new_env)
+    test_settings = config.Settings(
+        db_url=f"sqlite:///{db_path}",
+        bearer_token="testtoken",
+        operator_base_url="http://mock-operator:8001",
+        rgs_webhook_url="http://mock-rgs:8002/webhooks",
+        timestamp_skew_seconds=5,
+        run_background_tasks=False,
+        outbox_log_dir=str(db_path.parent / "outbox-log"),
+    )
+    for field in config.Settings.model_fields:
+        monkeypatch.setattr(config.settings, field, getattr(test_settings, field))
+    database.dispose_engine()
+    main.player_mapping_service.invalidate()
+    main.balance_ledger.clear()
+    main.account_status_cache.clear()
+    main.recent_outbox_keys.clear()
+    main.recent_transactions.clear()
+    main.transaction_statuses.clear()
+    main.admission_controller.clear()
+    main.lane_metrics.clear()
+    main.outbox_log.close()
+    main.delivery_targets.clear()
 
-    try:
-        import app.config as config
-        import app.database as database
-        import app.models.models as models
-        import app.security as security
-        import app.main as main
-
-        reload(config)
-        reload(database)
-        reload(models)
-        reload(security)
-        reload(main)
-
-        # Disable the endless background worker during tests.
-        main.app.router.on_startup.clear()
-
-        models.Base.metadata.drop_all(bind=database.engine)
-        models.Base.metadata.create_all(bind=database.engine)
-        return main, database, models
-    finally:
-        for key, value in old_env.items():
-            if value is None:
-                os.environ.pop(key, None)
-            else:
-                os.environ[key] = value
+    models.Base.metadata.drop_all(bind=database.engine)
+    models.Base.metadata.create_all(bind=database.engine)
+    yield main, database, models
+    database.dispose_engine()
 
 
 @pytest.fixture
@@ -166,7 +163,7 @@ def test_operator_retry_on_server_errors(monkeypatch):
     statuses = [500, 500, 200]
     calls = {"invokes": 0}
 
-    async def fake_request(method, url, json):
+    async def fake_request(method, url, content, headers):
         status = statuses[calls["invokes"]]
         calls["invokes"] += 1
         return type("Resp", (), {"status_code": status, "headers": {}, "json": lambda: {"ok": True}})()
@@ -201,7 +198,7 @@ def test_rate_limit_returns_429_on_second_call(monkeypatch):
         max_retries=0, 
         retry_backoff_seconds=3600)
 
-    async def first_only_request(method, url, json):
+    async def first_only_request(method, url, content, headers):
         return FakeResponse(200)
 
     monkeypatch.setattr(client.client, "request", first_only_request)
@@ -357,4 +354,1771 @@ def test_wallet_action_valid_signature_accepted(client, app_module):
     }
     resp = client.post("/wallet/debit", json=payload, headers=headers)
     assert resp.status_code == 200
-    body = resp.json()
\ No newline at end of file
+    body = resp.json()
+
+def test_wallet_action_uses_stored_player_mapping(client, app_module):
+    main, database, models = app_module
+    with database.SessionLocal() as db:
+        db.add(models.PlayerMapping(player_id="player-9", external_player_id="op-777"))
+        db.commit()
+
+    payload = {
+        "playerId": "player-9",
+        "amountCents": 500,
+        "currency": "USD",
+        "refId": "ref-map",
+    }
+    resp = client.post("/wallet/debit", json=payload, headers=headers)
+    assert resp.status_code == 200
+
+    with database.SessionLocal() as db:
+        outbox = db.query(models.OperatorWebhookOutbox).one()
+        assert outbox.target_url.endswith("v2/players/op-777/withdraw")
+
+    # Unmapped players fall back to the derived external id.
+    payload = {**payload, "playerId": "player-10", "refId": "ref-map-2"}
+    client.post("/wallet/debit", json=payload, headers=headers)
+    with database.SessionLocal() as db:
+        targets = [r.target_url for r in db.query(models.OperatorWebhookOutbox).all()]
+        assert any(t.endswith("v2/players/player-10_ext/withdraw") for t in targets)
+
+
+def test_player_mapping_lookups_are_coalesced_and_negatively_cached(app_module):
+    main, database, models = app_module
+    service = main.player_mapping_service
+    with database.SessionLocal() as db:
+        db.add(models.PlayerMapping(player_id="player-1", external_player_id="op-1"))
+        db.commit()
+
+    async def burst(player_id):
+        return await asyncio.gather(*(service.resolve(player_id) for _ in range(20)))
+
+    loads = service.loads
+    assert asyncio.run(burst("player-1")) == ["op-1"] * 20
+    assert service.loads == loads + 1
+    assert asyncio.run(burst("missing")) == [None] * 20
+    assert service.loads == loads + 2
+
+    # Both the hit and the miss are now served from cache.
+    asyncio.run(burst("player-1"))
+    asyncio.run(burst("missing"))
+    assert service.loads == loads + 2
+
+    assert service.invalidate("player-1") == 1
+    asyncio.run(service.resolve("player-1"))
+    assert service.loads == loads + 3
+
+
+def test_player_mapping_invalidate_endpoint(client, app_module):
+    main, _, _ = app_module
+    main.player_mapping_service._put("player-1", "op-1")
+    main.player_mapping_service._put("player-2", "op-2")
+    resp = client.post("/admin/player-mappings/invalidate", params={"player_id": "player-1"}, headers=headers)
+    assert resp.json() == {"status": "invalidated", "count": 1}
+    resp = client.post("/admin/player-mappings/invalidate", headers=headers)
+    assert resp.json() == {"status": "invalidated", "count": 1}
+
+
+def test_wallet_actions_maintain_running_balance(client, app_module):
+    main, database, models = app_module
+    debit = {"playerId": "player-1", "amountCents": 500, "currency": "USD", "refId": "ref-b1"}
+    credit = {"playerId": "player-1", "amountCents": 1200, "currency": "USD", "refId": "ref-b2"}
+    other = {"playerId": "player-2", "amountCents": 300, "currency": "USD", "refId": "ref-b3"}
+
+    assert client.post("/wallet/debit", json=debit, headers=headers).json()["balanceCents"] == -500
+    assert client.post("/wallet/credit", json=credit, headers=headers).json()["balanceCents"] == 700
+    assert client.post("/wallet/credit", json=other, headers=headers).json()["balanceCents"] == 300
+
+    with database.SessionLocal() as db:
+        balances = [t.balance_cents for t in db.query(models.Transaction).order_by(models.Transaction.id)]
+        assert balances == [-500, 700, 300]
+
+
+def test_ledger_recovers_from_snapshot_and_transaction_log(app_module):
+    main, database, models = app_module
+    ledger = main.balance_ledger
+
+    with database.SessionLocal() as db:
+        db.add(models.Transaction(ref_id="r1", player_id="p1", amount_cents=1000, currency="USD", direction="credit", status="sent"))
+        db.add(models.Transaction(ref_id="r2", player_id="p1", amount_cents=250, currency="USD", direction="debit", status="sent"))
+        db.commit()
+        assert ledger.balance(db, "p1") == 750
+
+        ledger.record("p1", 750, 2)
+        sessions = database.ShardSessions()
+        assert ledger.snapshot(sessions) == 1
+        assert ledger.snapshot(sessions) == 0
+        sessions.close()
+
+        db.add(models.Transaction(ref_id="r3", player_id="p1", amount_cents=50, currency="USD", direction="debit", status="sent"))
+        db.commit()
+
+        # A cold ledger replays only the tail after the snapshot.
+        ledger.clear()
+        assert ledger.balance(db, "p1") == 700
+
+
+def test_ledger_lock_serializes_concurrent_updates(app_module):
+    main, _, _ = app_module
+    ledger = main.balance_ledger
+    ledger.record("p1", 0, 0)
+
+    async def bet(i):
+        async with ledger.lock("p1"):
+            current = ledger._balances["p1"][0]
+            await asyncio.sleep(0)
+            ledger.record("p1", current - 10, i)
+
+    async def burst():
+        await asyncio.gather(*(bet(i) for i in range(50)))
+
+    asyncio.run(burst())
+    assert ledger._balances["p1"][0] == -500
+
+
+def _signed_status(client, body):
+    from app import security
+
+    timestamp = str(int(time.time()))
+    signature = security.compute_signature(body, timestamp)
+    return client.post("/webhooks/player-status", json=body, headers={"X-Signature": signature, "X-Timestamp": timestamp})
+
+
+def test_status_webhook_blocks_player_locally(client, app_module):
+    _, database, models = app_module
+    body = {"playerId": "player-1_ext", "status": "BLOCKED"}
+    assert client.post("/webhooks/player-status", json=body).status_code == 401
+    resp = client.post("/webhooks/player-status", json=body, headers={"X-Signature": "bad", "X-Timestamp": str(int(time.time()))})
+    assert resp.status_code == 401
+    resp = _signed_status(client, body)
+    assert resp.json() == {"status": "accepted"}
+
+    payload = {"playerId": "player-1", "amountCents": 500, "currency": "USD", "refId": "ref-blocked"}
+    resp = client.post("/wallet/debit", json=payload, headers=headers)
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "REJECTED"
+    assert resp.json()["reason"] == "User Account Is Blocked"
+    with database.SessionLocal() as db:
+        assert db.query(models.OperatorWebhookOutbox).count() == 0
+
+    _signed_status(client, {"playerId": "player-1_ext", "status": "active"})
+    resp = client.post("/wallet/debit", json=payload, headers=headers)
+    assert resp.json()["status"] == "initiated"
+
+
+def test_account_status_bulk_refresh_replaces_cache(monkeypatch, app_module):
+    import app.account_status as account_status
+
+    async def fake_statuses():
+        return [{"playerId": "p1_ext", "status": "suspended"}, {"playerId": "p2_ext", "status": "active"}]
+
+    cache = account_status.account_status_cache
+    monkeypatch.setattr(cache, "ttl_seconds", cache.ttl_seconds)
+    cache.update("p3_ext", "blocked")
+    monkeypatch.setattr(account_status.operator_client, "list_player_statuses", fake_statuses)
+    assert asyncio.run(account_status.refresh_account_statuses()) == 2
+    assert cache.is_blocked("p1_ext")
+    assert not cache.is_blocked("p2_ext")
+    assert not cache.is_blocked("p3_ext")
+
+    # Expired entries no longer count as blocked.
+    cache.ttl_seconds = -1
+    cache.update("p1_ext", "blocked")
+    assert not cache.is_blocked("p1_ext")
+
+
+def test_dispatchers_split_outbox_by_record_id(monkeypatch, app_module):
+    _, database, models = app_module
+    import app.webhooks as webhooks
+
+    with database.SessionLocal() as db:
+        for _ in range(4):
+            db.add(models.RGSWebhookOutbox(event_type="debit", payload={}, target_url="http://mock-rgs/webhooks", status="pending"))
+        db.commit()
+
+    delivered = []
+
+    class FakeResponse:
+        status_code = 200
+        headers = {}
+
+    async def fake_request(method, url, json):
+        return FakeResponse()
+
+    monkeypatch.setattr(webhooks.integration_client, "_request_with_retry", fake_request)
+    monkeypatch.setattr(webhooks.settings, "dispatcher_count", 2)
+    monkeypatch.setattr(webhooks.settings, "dispatcher_index", 1)
+    with database.SessionLocal() as db:
+        asyncio.run(webhooks.process_outbox(db))
+        sent = db.query(models.RGSWebhookOutbox.id).filter(models.RGSWebhookOutbox.status == "sent").all()
+        assert sorted(r.id for r in sent) == [1, 3]
+
+
+def test_serve_worker_env_disables_embedded_worker():
+    from app.serve import worker_env
+
+    single = worker_env(api_workers=1, dispatchers=0)
+    assert single["RUN_OUTBOX_WORKER"] == "true"
+    assert single["CREATE_SCHEMA_ON_STARTUP"] == "false"
+
+    scaled = worker_env(api_workers=8, dispatchers=2)
+    assert scaled["RUN_OUTBOX_WORKER"] == "false"
+    assert scaled["DISPATCHER_COUNT"] == "2"
+    assert scaled["LEDGER_VERIFY_TAIL"] == "true"
+
+
+def test_serve_applies_worker_env_to_a_single_api_worker(app_module, monkeypatch):
+    main, database, _ = app_module
+    import app.serve as serve
+
+    # main() updates the environment for its children; keep that from leaking into other tests.
+    monkeypatch.setattr(serve.os, "environ", {name: value for name, value in serve.os.environ.items() if name not in serve.worker_env(1, 2)})
+    monkeypatch.setattr(database, "init_db", lambda: None)
+    started = []
+
+    class FakeProcess:
+        def __init__(self, target, args, name, daemon):
+            self.args = args
+
+        def start(self):
+            started.append(self.args)
+
+        def terminate(self):
+            pass
+
+        def join(self, timeout=None):
+            pass
+
+    class Context:
+        Process = FakeProcess
+
+    monkeypatch.setattr(serve.multiprocessing, "get_context", lambda method: Context())
+    in_process = {}
+    monkeypatch.setattr(
+        serve.uvicorn, "run",
+        lambda app, **kwargs: in_process.update(workers=kwargs["workers"], run_outbox_worker=main.settings.run_outbox_worker, dispatcher_count=main.settings.dispatcher_count),
+    )
+
+    serve.main(["--api-workers", "1", "--dispatchers", "2"])
+    assert started == [(0,), (1,)]
+    assert in_process == {"workers": 1, "run_outbox_worker": False, "dispatcher_count": 2}
+
+
+def test_ledger_verify_tail_picks_up_rows_from_other_processes(client, app_module, monkeypatch):
+    main, database, models = app_module
+    monkeypatch.setattr(main.balance_ledger, "verify_tail", True)
+    payload = {"playerId": "player-1", "amountCents": 500, "currency": "USD", "refId": "ref-v1"}
+    assert client.post("/wallet/credit", json=payload, headers=headers).json()["balanceCents"] == 500
+
+    # Another API worker commits a credit this process has not seen.
+    with database.SessionLocal() as db:
+        db.add(models.Transaction(ref_id="ref-v2", player_id="player-1", amount_cents=300, currency="USD", direction="credit", status="initiated"))
+        db.commit()
+
+    payload = {**payload, "refId": "ref-v3"}
+    assert client.post("/wallet/debit", json=payload, headers=headers).json()["balanceCents"] == 300
+
+
+def test_import_does_not_build_engine_or_clients():
+    code = (
+        "import app.main, app.database as d, app.webhooks as w;"
+        "from app.clients.operator_client import operator_client;"
+        "from app.clients.rgs_client import rgs_client;"
+        "assert d._engine is None;"
+        "assert w.integration_client._client is None;"
+        "assert operator_client._client is None and rgs_client._client is None"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+def test_lifespan_closes_clients_and_engine(app_module):
+    main, database, _ = app_module
+    import app.webhooks as webhooks
+
+    with TestClient(main.app) as client:
+        assert client.get("/health").status_code == 200
+        assert webhooks.integration_client.client is not None
+        assert database._engine is not None
+    assert webhooks.integration_client._client is None
+    assert database._engine is None
+
+
+def test_sqlite_performance_pragmas_applied(app_module):
+    _, database, _ = app_module
+    with database.engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+
+
+def test_engine_pool_settings_apply_to_queue_pools_only(app_module, monkeypatch):
+    main, database, _ = app_module
+    monkeypatch.setattr(main.settings, "db_pool_size", 3)
+
+    memory = database._create_engine("sqlite://")
+    with memory.connect() as conn:
+        assert conn.exec_driver_sql("SELECT 1").scalar() == 1
+    memory.dispose()
+    file_engine = database._create_engine(main.settings.db_url)
+    assert file_engine.pool.size() == 3
+    file_engine.dispose()
+
+
+def test_group_commit_batches_concurrent_writes(app_module):
+    _, database, models = app_module
+    from sqlalchemy import event
+    from app.group_commit import GroupCommitWriter
+
+    writer = GroupCommitWriter(interval_ms=5, max_batch=100)
+    commits = []
+    event.listen(database.engine, "commit", lambda conn: commits.append(1))
+
+    def write_txn(ref_id):
+        def write(session):
+            txn = models.Transaction(ref_id=ref_id, player_id="p1", amount_cents=1, currency="USD", direction="debit", status="initiated")
+            session.add(txn)
+            session.flush()
+            return txn.id
+        return write
+
+    async def burst():
+        # ref-3 twice: the duplicate must fail alone without losing the other writes.
+        refs = ["ref-1", "ref-2", "ref-3", "ref-3", "ref-4"]
+        return await asyncio.gather(*(writer.submit(write_txn(r)) for r in refs), return_exceptions=True)
+
+    results = asyncio.run(burst())
+    assert writer.batches == 1
+    assert sum(isinstance(r, Exception) for r in results) == 1
+    with database.SessionLocal() as db:
+        assert db.query(models.Transaction).count() == 4
+
+    commits.clear()
+
+    async def clean_burst():
+        return await asyncio.gather(*(writer.submit(write_txn(f"ref-b{i}")) for i in range(10)))
+
+    assert len(asyncio.run(clean_burst())) == 10
+    assert len(commits) == 1
+
+
+def test_wallet_and_webhook_through_group_commit(client, app_module, monkeypatch):
+    main, database, models = app_module
+    monkeypatch.setattr(main.settings, "group_commit_enabled", True)
+    payload = {"playerId": "player-1", "amountCents": 500, "currency": "USD", "refId": "ref-gc"}
+    resp = client.post("/wallet/debit", json=payload, headers={**headers, "Idempotency-Key": "gc-key"})
+    body = resp.json()
+    assert body["status"] == "initiated"
+    assert body["balanceCents"] == -500
+
+    webhook_payload = {
+        "playerId": "player-1_ext",
+        "amount": 5.00,
+        "currency": "USD",
+        "status": "OK",
+        "event": "withdraw",
+        "refId": "ref-gc",
+        "correlationId": body["correlationId"],
+    }
+    assert client.post("/webhooks/incoming", json=webhook_payload).status_code == 200
+    assert client.post("/webhooks/incoming", json={**webhook_payload, "refId": "nope"}).status_code == 404
+
+    with database.SessionLocal() as db:
+        assert db.query(models.Transaction).one().status == "sent"
+        assert db.query(models.IdempotencyKey).count() == 1
+        assert db.query(models.RGSWebhookOutbox).count() == 1
+
+
+@pytest.fixture
+def sharded_client(app_module, tmp_path, monkeypatch):
+    main, database, models = app_module
+    monkeypatch.setattr(main.settings, "shard_db_urls", [f"sqlite:///{tmp_path}/shard0.db", f"sqlite:///{tmp_path}/shard1.db"])
+    database.dispose_engine()
+    database.init_db()
+    with TestClient(main.app) as client:
+        yield client
+
+
+def test_sharded_mode_routes_player_data_by_player_id(sharded_client, app_module, monkeypatch):
+    main, database, models = app_module
+    import app.webhooks as webhooks
+
+    players = [f"player-{i}" for i in range(8)]
+    correlation_ids = {}
+    for i, player_id in enumerate(players):
+        payload = {"playerId": player_id, "amountCents": 100, "currency": "USD", "refId": f"ref-s{i}"}
+        resp = sharded_client.post("/wallet/credit", json=payload, headers=headers)
+        correlation_ids[player_id] = resp.json()["correlationId"]
+
+    shards_used = {database.shard_for(p) for p in players}
+    assert shards_used == {0, 1}
+    for shard in (0, 1):
+        with database.shard_session(shard) as db:
+            stored = {t.player_id for t in db.query(models.Transaction)}
+            assert stored == {p for p in players if database.shard_for(p) == shard}
+            assert db.query(models.OperatorWebhookOutbox).count() == len(stored)
+    with database.SessionLocal() as db:
+        assert db.query(models.Transaction).count() == 0
+
+    # Callbacks carry the external id and still find the right shard.
+    for i, player_id in enumerate(players):
+        webhook_payload = {
+            "playerId": f"{player_id}_ext",
+            "amount": 1.0,
+            "currency": "USD",
+            "status": "OK",
+            "event": "deposit",
+            "refId": f"ref-s{i}",
+            "correlationId": correlation_ids[player_id],
+        }
+        assert sharded_client.post("/webhooks/incoming", json=webhook_payload).status_code == 200
+
+    listing = sharded_client.get("/webhooks/outbox", params={"queue": "rgs"}, headers=headers).json()
+    assert len(listing) == 8
+    assert {item["shard"] for item in listing} == {0, 1}
+
+    class FakeResponse:
+        status_code = 200
+        headers = {}
+
+    async def fake_request(method, url, json):
+        return FakeResponse()
+
+    monkeypatch.setattr(webhooks.integration_client, "_request_with_retry", fake_request)
+    for shard in (0, 1):
+        with database.shard_session(shard) as db:
+            asyncio.run(webhooks.process_outbox(db))
+    listing = sharded_client.get("/webhooks/outbox", params={"queue": "operator", "status": "sent"}, headers=headers).json()
+    assert len(listing) == 8
+
+
+def test_inbox_mode_acknowledges_then_processes_in_batches(client, app_module, monkeypatch):
+    main, database, models = app_module
+    from app.inbox import process_inbox
+
+    created = []
+    for i in range(3):
+        payload = {"playerId": "player-1", "amountCents": 500, "currency": "USD", "refId": f"ref-in{i}"}
+        created.append(client.post("/wallet/debit", json=payload, headers=headers).json()["correlationId"])
+
+    monkeypatch.setattr(main.settings, "webhook_inbox_enabled", True)
+    for i, correlation_id in enumerate(created + ["unknown-corr"]):
+        webhook_payload = {
+            "playerId": "player-1_ext",
+            "amount": 5.00,
+            "currency": "USD",
+            "status": "OK",
+            "event": "withdraw",
+            "refId": f"ref-in{i}",
+            "correlationId": correlation_id,
+        }
+        resp = client.post("/webhooks/incoming", json=webhook_payload)
+        assert resp.json() == {"status": "accepted"}
+
+    with database.SessionLocal() as db:
+        assert db.query(models.WebhookInbox).count() == 4
+        assert {t.status for t in db.query(models.Transaction)} == {"initiated"}
+        assert db.query(models.RGSWebhookOutbox).count() == 0
+
+        sessions = database.ShardSessions()
+        assert process_inbox(db, sessions) == 4
+        assert process_inbox(db, sessions) == 0
+        sessions.close()
+
+    with database.SessionLocal() as db:
+        assert {t.status for t in db.query(models.Transaction)} == {"sent"}
+        rgs = db.query(models.RGSWebhookOutbox).all()
+        assert len(rgs) == 3
+        assert rgs[0].status == "pending"
+        assert rgs[0].payload["amountCents"] == 500
+        statuses = sorted(i.status for i in db.query(models.WebhookInbox))
+        assert statuses == ["processed", "processed", "processed", "unmatched"]
+
+
+def test_inbox_worker_processes_batches_off_the_event_loop(client, app_module, monkeypatch):
+    main, database, models = app_module
+    import app.inbox as inbox
+
+    payload = {"playerId": "player-1", "amountCents": 500, "currency": "USD", "refId": "ref-thread"}
+    correlation_id = client.post("/wallet/debit", json=payload, headers=headers).json()["correlationId"]
+    monkeypatch.setattr(main.settings, "webhook_inbox_enabled", True)
+    webhook_payload = {
+        "playerId": "player-1_ext", "amount": 5.00, "currency": "USD", "status": "OK",
+        "event": "withdraw", "refId": "ref-thread", "correlationId": correlation_id,
+    }
+    assert client.post("/webhooks/incoming", json=webhook_payload).json() == {"status": "accepted"}
+
+    process_batch = inbox._process_batch
+
+    def slow_batch(db, sessions):
+        time.sleep(0.3)
+        return process_batch(db, sessions)
+
+    monkeypatch.setattr(inbox, "_process_batch", slow_batch)
+
+    async def run():
+        ticks = 0
+        worker = asyncio.create_task(inbox.background_inbox_worker())
+        # The loop keeps running while the batch is applied.
+        while main.transaction_statuses.get(correlation_id)["status"] != "sent" and ticks < 500:
+            await asyncio.sleep(0.01)
+            ticks += 1
+        worker.cancel()
+        return ticks
+
+    assert asyncio.run(run()) >= 10
+    with database.SessionLocal() as db:
+        assert db.query(models.Transaction).one().status == "sent"
+
+
+def test_duplicate_callbacks_enqueue_one_rgs_notification(client, app_module, monkeypatch):
+    main, database, models = app_module
+    from app.webhooks import process_outbox, integration_client
+
+    create_resp = client.post(
+        "/wallet/debit",
+        json={"playerId": "player-1", "amountCents": 500, "currency": "USD", "refId": "ref-dup"},
+        headers=headers,
+    )
+    correlation_id = create_resp.json()["correlationId"]
+    webhook_payload = {
+        "playerId": "player-1",
+        "amount": 5.00,
+        "currency": "USD",
+        "status": "PENDING",
+        "event": "withdraw",
+        "refId": "ref-dup",
+        "correlationId": correlation_id,
+    }
+    for _ in range(3):
+        assert client.post("/webhooks/incoming", json=webhook_payload, headers=headers).status_code == 200
+    main.recent_outbox_keys.clear()
+    assert client.post("/webhooks/incoming", json=webhook_payload, headers=headers).status_code == 200
+    with database.SessionLocal() as db:
+        assert db.query(models.RGSWebhookOutbox).count() == 1
+
+    # A newer status for the same transaction supersedes the undelivered one.
+    webhook_payload["status"] = "OK"
+    assert client.post("/webhooks/incoming", json=webhook_payload, headers=headers).status_code == 200
+
+    delivered = []
+
+    class FakeResponse:
+        status_code = 200
+        headers = {}
+
+    async def fake_request(method, url, json):
+        if url == str(main.settings.rgs_webhook_url):
+            delivered.append(json)
+        return FakeResponse()
+
+    monkeypatch.setattr(integration_client, "_request_with_retry", fake_request)
+    with database.SessionLocal() as db:
+        asyncio.run(process_outbox(db))
+        statuses = sorted(r.status for r in db.query(models.RGSWebhookOutbox).all())
+    assert [p["status"] for p in delivered] == ["OK"]
+    assert statuses == ["sent", "superseded"]
+
+
+def test_inbox_skips_already_enqueued_callbacks(client, app_module, monkeypatch):
+    main, database, models = app_module
+    from app.inbox import process_inbox
+
+    create_resp = client.post(
+        "/wallet/debit",
+        json={"playerId": "player-1", "amountCents": 500, "currency": "USD", "refId": "ref-inbox-dup"},
+        headers=headers,
+    )
+    webhook_payload = {
+        "playerId": "player-1",
+        "amount": 5.00,
+        "currency": "USD",
+        "status": "OK",
+        "event": "withdraw",
+        "refId": "ref-inbox-dup",
+        "correlationId": create_resp.json()["correlationId"],
+    }
+    assert client.post("/webhooks/incoming", json=webhook_payload, headers=headers).status_code == 200
+    monkeypatch.setattr(main.settings, "webhook_inbox_enabled", True)
+    for _ in range(2):
+        client.post("/webhooks/incoming", json=webhook_payload, headers=headers)
+    main.recent_outbox_keys.clear()
+    with database.SessionLocal() as db:
+        sessions = database.ShardSessions()
+        assert process_inbox(db, sessions) == 2
+        sessions.close()
+        assert db.query(models.RGSWebhookOutbox).count() == 1
+
+
+def test_webhook_matched_from_recent_transactions(client, app_module, monkeypatch):
+    main, database, models = app_module
+    from sqlalchemy import inspect
+
+    indexes = inspect(database.engine).get_indexes("transactions")
+    assert any(
+        index["name"] == "ix_transactions_correlation_ref" and index["column_names"] == ["correlation_id", "ref_id"]
+        for index in indexes
+    )
+
+    create_resp = client.post(
+        "/wallet/debit",
+        json={"playerId": "player-1", "amountCents": 500, "currency": "USD", "refId": "ref-recent"},
+        headers=headers,
+    )
+    correlation_id = create_resp.json()["correlationId"]
+    webhook_payload = {
+        "playerId": "player-1",
+        "amount": 5.00,
+        "currency": "USD",
+        "status": "OK",
+        "event": "withdraw",
+        "refId": "ref-recent",
+        "correlationId": correlation_id,
+    }
+    hits = main.recent_transactions.hits
+    assert client.post("/webhooks/incoming", json=webhook_payload, headers=headers).status_code == 200
+    assert main.recent_transactions.hits == hits + 1
+    with database.SessionLocal() as db:
+        assert db.query(models.Transaction).one().status == "sent"
+
+    # A mismatched refId is not served from the map and still 404s.
+    webhook_payload["refId"] = "other-ref"
+    assert client.post("/webhooks/incoming", json=webhook_payload, headers=headers).status_code == 404
+
+    # Expired entries fall back to the indexed table lookup.
+    monkeypatch.setattr(main.recent_transactions, "ttl_seconds", -1)
+    main.recent_transactions.add(correlation_id, 1, "ref-recent")
+    webhook_payload.update(refId="ref-recent", status="FAILED")
+    assert client.post("/webhooks/incoming", json=webhook_payload, headers=headers).status_code == 200
+    assert main.recent_transactions.get(correlation_id, "ref-recent") is None
+
+
+def test_exhausted_outbox_records_move_to_dead_letter_and_replay(client, app_module, monkeypatch):
+    main, database, models = app_module
+    import app.webhooks as webhooks
+
+    assert webhooks.retry_delay_seconds(3) == 8
+    assert webhooks.retry_delay_seconds(10_000) == main.settings.outbox_max_backoff_seconds
+
+    with database.SessionLocal() as db:
+        db.add(models.RGSWebhookOutbox(event_type="debit", payload={"foo": "bar"}, target_url="http://mock-rgs/webhooks", status="pending"))
+        db.commit()
+
+    class FakeResponse:
+        status_code = 500
+        headers = {}
+
+    async def fake_request(method, url, json):
+        return FakeResponse()
+
+    monkeypatch.setattr(webhooks.integration_client, "_request_with_retry", fake_request)
+    monkeypatch.setattr(main.settings, "outbox_max_attempts", 2)
+    with database.SessionLocal() as db:
+        asyncio.run(webhooks.process_outbox(db))
+        record = db.query(models.RGSWebhookOutbox).one()
+        assert record.status == "failed"
+        # Not due yet: the next pass does not load it.
+        asyncio.run(webhooks.process_outbox(db))
+        assert db.query(models.RGSWebhookOutbox).one().attempt_count == 1
+        record.next_attempt_at = datetime.now(UTC) - timedelta(seconds=1)
+        db.commit()
+        asyncio.run(webhooks.process_outbox(db))
+        assert db.query(models.RGSWebhookOutbox).count() == 0
+
+    resp = client.get("/admin/dead-letter?queue=rgs", headers=headers)
+    assert resp.status_code == 200
+    [letter] = resp.json()
+    assert letter["attemptCount"] == 2
+    assert letter["lastError"] == "remote error 500"
+
+    resp = client.post("/admin/dead-letter/replay", json={"queue": "rgs"}, headers=headers)
+    assert resp.json() == {"status": "replayed", "count": 1}
+    assert client.get("/admin/dead-letter", headers=headers).json() == []
+    with database.SessionLocal() as db:
+        record = db.query(models.RGSWebhookOutbox).one()
+        assert (record.status, record.attempt_count, record.payload) == ("pending", 0, {"foo": "bar"})
+
+
+def test_bulk_replay_filters_counts_and_staggers_release(client, app_module, monkeypatch):
+    main, database, models = app_module
+
+    with database.SessionLocal() as db:
+        for i in range(7):
+            db.add(models.RGSWebhookOutbox(
+                event_type="debit" if i < 5 else "credit",
+                payload={},
+                target_url="http://mock-rgs/webhooks",
+                status="failed",
+                attempt_count=4,
+                last_error="remote error 503",
+            ))
+        db.add(models.RGSWebhookOutbox(event_type="debit", payload={}, target_url="http://mock-rgs/webhooks", status="sent"))
+        db.commit()
+
+    body = {"eventType": "debit", "dryRun": True}
+    resp = client.post("/admin/replay/rgs", json=body, headers=headers)
+    assert resp.json() == {"status": "dry-run", "count": 5}
+    with database.SessionLocal() as db:
+        assert db.query(models.RGSWebhookOutbox).filter(models.RGSWebhookOutbox.status == "failed").count() == 7
+
+    monkeypatch.setattr(main.settings, "bulk_replay_chunk_size", 2)
+    body.update(dryRun=False, releasePerSecond=2)
+    resp = client.post("/admin/replay/rgs", json=body, headers=headers)
+    assert resp.json() == {"status": "replayed", "count": 5}
+    with database.SessionLocal() as db:
+        replayed = db.query(models.RGSWebhookOutbox).filter(models.RGSWebhookOutbox.status == "pending").order_by(models.RGSWebhookOutbox.id).all()
+        assert [(r.attempt_count, r.last_error) for r in replayed] == [(0, None)] * 5
+        release = [r.next_attempt_at for r in replayed]
+        assert release[0] == release[1] and release[2] == release[3]
+        assert (release[2] - release[0]).total_seconds() == pytest.approx(1)
+        assert (release[4] - release[0]).total_seconds() == pytest.approx(2)
+        assert db.query(models.RGSWebhookOutbox).filter(models.RGSWebhookOutbox.status == "failed").count() == 2
+
+
+def test_outbox_listing_pages_by_cursor_and_projects_fields(client, app_module):
+    _, database, models = app_module
+
+    same_time = datetime(2024, 1, 1, 12, 0, 0)
+    with database.SessionLocal() as db:
+        for i in range(5):
+            db.add(models.RGSWebhookOutbox(
+                event_type="debit",
+                payload={"n": i},
+                target_url="http://mock-rgs/webhooks",
+                status="failed" if i == 4 else "pending",
+                created_at=same_time if i < 3 else same_time + timedelta(minutes=i),
+            ))
+        db.commit()
+
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        url = "/webhooks/outbox?queue=rgs&limit=2&fields=id,status"
+        resp = client.get(url + (f"&cursor={cursor}" if cursor else ""), headers=headers)
+        assert resp.status_code == 200
+        assert all(set(item) == {"id", "status"} for item in resp.json())
+        seen.extend(item["id"] for item in resp.json())
+        pages += 1
+        cursor = resp.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert pages == 3
+    assert seen == [5, 4, 3, 2, 1]
+
+    full = client.get("/webhooks/outbox?queue=rgs&limit=1", headers=headers).json()
+    assert full[0]["payload"] == {"n": 4}
+    assert client.get("/webhooks/outbox?fields=bogus", headers=headers).status_code == 422
+    assert client.get("/webhooks/outbox?cursor=not-a-cursor", headers=headers).status_code == 400
+
+    counts = client.get("/webhooks/outbox/counts", headers=headers).json()
+    assert counts == {"rgs": {"pending": 4, "failed": 1}, "operator": {}}
+
+
+def test_admission_sheds_debits_and_caps_inflight_per_player(client, app_module, monkeypatch):
+    main, database, models = app_module
+
+    payload = {"playerId": "player-1", "amountCents": 100, "currency": "USD", "refId": "ref-adm-1"}
+    assert client.post("/wallet/debit", json=payload, headers=headers).status_code == 200
+
+    main.admission_controller.sample_outbox()
+    state = client.get("/admin/admission", headers=headers).json()
+    assert state["signals"]["outboxDepth"] == 1
+    assert state["shedding"] is False
+
+    monkeypatch.setattr(main.settings, "admission_max_outbox_depth", 0)
+    resp = client.post("/wallet/debit", json={**payload, "refId": "ref-adm-2"}, headers=headers)
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == str(main.settings.admission_retry_after_seconds)
+    # Credits still settle while debits are shed.
+    assert client.post("/wallet/credit", json={**payload, "refId": "ref-adm-3"}, headers=headers).status_code == 200
+    state = client.get("/admin/admission", headers=headers).json()
+    assert state["reasons"] == ["outbox_depth"] and state["shed"] == 1
+
+    monkeypatch.setattr(main.settings, "admission_max_outbox_depth", 10_000)
+    main.admission_controller.observe_commit(10.0)
+    assert "commit_latency" in main.admission_controller.overloaded()
+    # Shed debits never commit, so idle sample intervals decay the latency back under the threshold.
+    main.admission_controller.age_commit_latency()
+    for _ in range(30):
+        main.admission_controller.age_commit_latency()
+    assert "commit_latency" not in main.admission_controller.overloaded()
+    main.admission_controller.clear()
+
+    async def hold_slots():
+        async with main.admission_controller.player_slot("player-1"):
+            async with main.admission_controller.player_slot("player-1"):
+                with pytest.raises(main.HTTPException) as exc:
+                    async with main.admission_controller.player_slot("player-1"):
+                        pass
+                assert exc.value.status_code == 429
+                async with main.admission_controller.player_slot("player-2"):
+                    pass
+
+    monkeypatch.setattr(main.settings, "admission_player_max_inflight", 2)
+    asyncio.run(hold_slots())
+    assert main.admission_controller.state()["playersInflight"] == 0
+
+
+def test_sync_operator_mode_confirms_rejects_or_falls_back(client, app_module, monkeypatch):
+    main, database, models = app_module
+    import httpx
+    import app.webhooks as webhooks
+
+    outcomes = []
+
+    async def fake_request(method, url, json):
+        outcome = outcomes.pop(0)
+        if outcome == "slow":
+            await asyncio.sleep(1)
+            outcome = 200
+        if outcome == 403:
+            return httpx.Response(403, json={"detail": "account blocked"})
+        return httpx.Response(outcome, json={"status": "OK", "correlationId": json["correlationId"]})
+
+    monkeypatch.setattr(webhooks.integration_client, "_request_with_retry", fake_request)
+    monkeypatch.setattr(main.settings, "operator_call_mode", "sync")
+    monkeypatch.setattr(main.settings, "operator_sync_deadline_ms", 100)
+
+    def debit(ref_id, amount=100):
+        body = {"playerId": "player-1", "amountCents": amount, "currency": "USD", "refId": ref_id}
+        return client.post("/wallet/debit", json=body, headers={**headers, "Idempotency-Key": ref_id}).json()
+
+    outcomes.append(200)
+    confirmed = debit("ref-sync-1")
+    assert (confirmed["status"], confirmed["balanceCents"]) == ("confirmed", -100)
+
+    outcomes.append(403)
+    rejected = debit("ref-sync-2", 50)
+    assert (rejected["status"], rejected["reason"], rejected["balanceCents"]) == ("REJECTED", "account blocked", -100)
+    # The idempotent replay returns the final outcome, not `initiated`.
+    assert debit("ref-sync-2", 50) == rejected
+
+    outcomes.append("slow")
+    pending = debit("ref-sync-3", 25)
+    assert (pending["status"], pending["balanceCents"]) == ("initiated", -125)
+
+    with database.SessionLocal() as db:
+        statuses = [t.status for t in db.query(models.Transaction).order_by(models.Transaction.id)]
+        outbox = [r.status for r in db.query(models.OperatorWebhookOutbox).order_by(models.OperatorWebhookOutbox.id)]
+    assert statuses == ["confirmed", "rejected", "initiated"]
+    assert outbox == ["sent", "sent", "pending"]
+
+    # A cold ledger recovers the same balance because rejected rows are skipped.
+    main.balance_ledger.clear()
+    with database.SessionLocal() as db:
+        assert main.balance_ledger.balance(db, "player-1") == -125
+
+
+def test_reconciliation_clients_follow_mock_pagination(app_module, monkeypatch):
+    main, _, _ = app_module
+    import httpx
+    from app.clients.operator_client import operator_client
+
+    rows = [{"reference": f"ref-{i}", "correlationId": f"corr-{i}"} for i in range(1, 6)]
+    requests_seen = []
+
+    def handler(request):
+        limit = int(request.url.params["limit"])
+        after_id = int(request.url.params["afterId"])
+        requests_seen.append(after_id)
+        page = rows[after_id : after_id + limit]
+        page_headers = {"X-Next-After-Id": str(after_id + limit)} if len(page) == limit else {}
+        return httpx.Response(200, json=page, headers=page_headers)
+
+    monkeypatch.setattr(main.settings, "reconciliation_page_size", 2)
+    monkeypatch.setattr(operator_client, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://op"))
+
+    async def fetch():
+        try:
+            return await operator_client.list_transactions()
+        finally:
+            await operator_client.aclose()
+
+    assert asyncio.run(fetch()) == rows
+    assert requests_seen == [0, 2, 4]
+
+
+def test_digest_reconciliation_fetches_only_differing_buckets(app_module, monkeypatch):
+    main, _, _ = app_module
+    import httpx
+    from app.clients.operator_client import operator_client
+    from app.clients.rgs_client import rgs_client
+    from app.reconciliation import compute_digest
+
+    day = datetime(2026, 1, 5)
+    rgs_rows = [
+        (day + timedelta(seconds=37 * i), {"refId": f"ref-{i}", "correlationId": f"corr-{i}", "event": "debit", "amountCents": 100 + i, "status": "OK"})
+        for i in range(2000)
+    ]
+    operator_rows = [
+        (created_at, {"reference": row["refId"], "correlationId": row["correlationId"], "direction": "withdraw", "amount": row["amountCents"] / 100, "status": "OK"})
+        for created_at, row in rgs_rows
+        if row["correlationId"] != "corr-500"
+    ]
+    # Stored on each side of an hour boundary, but the same transaction.
+    rgs_rows.append((day + timedelta(hours=13, seconds=-1), {"refId": "ref-edge", "correlationId": "corr-edge", "event": "credit", "amountCents": 50, "status": "OK"}))
+    operator_rows.append((day + timedelta(hours=13, seconds=1), {"reference": "ref-edge", "correlationId": "corr-edge", "direction": "deposit", "amount": 0.5, "status": "OK"}))
+    listed = []
+
+    def serve(rows, cents):
+        def handler(request):
+            params = request.url.params
+            if request.url.path.endswith("/digest"):
+                start, end = datetime.fromisoformat(params["start"]), datetime.fromisoformat(params["end"])
+                selected = [
+                    (created_at, row["correlationId"], cents(row), row["status"])
+                    for created_at, row in rows
+                    if start <= created_at < end
+                ]
+                return httpx.Response(200, json=compute_digest(selected, params["granularity"]))
+            start, end = datetime.fromisoformat(params["createdFrom"]), datetime.fromisoformat(params["createdTo"])
+            page = [row for created_at, row in rows if start <= created_at < end]
+            listed.extend(page)
+            return httpx.Response(200, json=page)
+
+        return httpx.MockTransport(handler)
+
+    monkeypatch.setattr(main.settings, "reconciliation_mode", "digest")
+    monkeypatch.setattr(rgs_client, "_client", httpx.AsyncClient(transport=serve(rgs_rows, lambda row: row["amountCents"])))
+    monkeypatch.setattr(
+        operator_client,
+        "_client",
+        httpx.AsyncClient(transport=serve(operator_rows, lambda row: round(row["amount"] * 100)), base_url="http://op"),
+    )
+
+    async def reconcile():
+        try:
+            return await main.generate_reconciliation_csv(day, day + timedelta(days=1))
+        finally:
+            await rgs_client.aclose()
+            await operator_client.aclose()
+
+    csv_text, mismatch_count = asyncio.run(reconcile())
+    assert mismatch_count == 1
+    assert "ref-500,corr-500,debit,6.0,True,False" in csv_text
+    # Only the minutes around the missing row and the boundary pair are listed.
+    assert len(listed) < 20
+    assert {row["correlationId"] for row in listed} >= {"corr-500", "corr-edge"}
+
+
+def test_hub_reconciliation_digest_matches_operator_format(client, app_module):
+    main, database, models = app_module
+    from app.reconciliation import compute_digest
+
+    created_at = datetime(2026, 1, 5, 10, 15, 30)
+    with database.SessionLocal() as db:
+        db.add_all([
+            models.Transaction(ref_id="ref-1", player_id="player-1", amount_cents=125, currency="USD", direction="debit", status="confirmed", correlation_id="corr-1", created_at=created_at),
+            models.Transaction(ref_id="ref-2", player_id="player-1", amount_cents=300, currency="USD", direction="credit", status="rejected", correlation_id="corr-2", created_at=created_at),
+            models.Transaction(ref_id="ref-3", player_id="player-1", amount_cents=50, currency="USD", direction="debit", status="sent", correlation_id="corr-3", created_at=created_at + timedelta(hours=2)),
+        ])
+        db.commit()
+
+    resp = client.get(
+        "/reconciliation/digest",
+        params={"granularity": "minute", "start": "2026-01-05T10:00:00", "end": "2026-01-05T11:00:00"},
+        headers=headers,
+    )
+    assert resp.status_code == 200
+    assert resp.json() == compute_digest(
+        [(created_at, "corr-1", 125, "OK"), (created_at, "corr-2", 300, "REJECTED")], "minute"
+    )
+    assert resp.json()[0]["bucket"] == "2026-01-05T10:15:00"
+    assert resp.json()[0]["count"] == 2
+
+
+def test_capture_strips_secrets_and_replay_resigns(client, app_module, monkeypatch, tmp_path):
+    main, database, models = app_module
+    import json
+    import httpx
+    import app.security as security
+    from app.capture import capture_writer
+    from app.replay import load_capture, replay
+
+    capture_file = tmp_path / "capture.jsonl"
+    monkeypatch.setattr(main.settings, "capture_file", str(capture_file))
+    payload = {"playerId": "player-1", "amountCents": 500.0, "currency": "USD", "refId": "ref-cap"}
+    timestamp = str(int(datetime.now().timestamp()))
+    signed_headers = {
+        **headers,
+        "X-Signature": security.compute_signature(payload, timestamp),
+        "X-Timestamp": timestamp,
+        "Idempotency-Key": "idem-cap",
+    }
+    assert client.post("/wallet/debit", json=payload, headers=signed_headers).status_code == 200
+    assert client.get("/health").status_code == 200
+    capture_writer.flush()
+
+    [line] = capture_file.read_text().splitlines()
+    record = json.loads(line)
+    assert (record["m"], record["p"], record["b"], record["s"], record["signed"]) == ("POST", "/wallet/debit", payload, 200, True)
+    assert record["h"]["idempotency-key"] == "idem-cap"
+    assert not {"authorization", "x-signature", "x-timestamp"} & set(record["h"])
+
+    monkeypatch.setattr(main.settings, "capture_file", "")
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://hub") as replay_client:
+            return await replay(load_capture(str(capture_file)), replay_client, speed=None, suffix="-r1")
+
+    summary = asyncio.run(run())
+    assert summary["requests"] == 1 and summary["statuses"] == {"200": 1}
+    with database.SessionLocal() as db:
+        assert sorted(t.ref_id for t in db.query(models.Transaction)) == ["ref-cap", "ref-cap-r1"]
+
+
+def test_contract_mapping_matches_models_and_keeps_whole_cents():
+    import random
+    from decimal import Decimal, ROUND_HALF_EVEN
+    from app.contracts.contracts import OperatorWalletRequest, RgsRequest
+    from app.contracts.mapping import operator_wallet_payload, rgs_payload, units_to_cents
+    from app.schemas.app_schemas import WalletRequest, WebhookPayload
+
+    rng = random.Random(20240101)
+    for _ in range(5_000):
+        cents = rng.choice([rng.randint(0, 10_000), rng.randint(0, 10**12)])
+        request = WalletRequest(playerId="p", amountCents=cents, currency=rng.choice(["USD", "EUR"]), refId=f"ref-{cents}")
+        expected = OperatorWalletRequest.from_wallet_request(request, "corr").model_dump(by_alias=True)
+        assert operator_wallet_payload(request, "corr") == expected
+
+        # Operator amounts arrive as JSON decimals with two places.
+        amount = float(f"{cents / 100:.2f}")
+        payload = WebhookPayload(
+            playerId="p", amount=amount, currency="USD", status="OK",
+            event=rng.choice(["withdraw", "deposit"]), refId="r", correlationId="c",
+        )
+        mapped = rgs_payload(payload)
+        reference = RgsRequest.from_webhook_payload(payload).model_dump(by_alias=True)
+        assert mapped["amountCents"] == cents
+        assert isinstance(mapped["amountCents"], int)
+        assert {k: v for k, v in mapped.items() if k != "amountCents"} == {k: v for k, v in reference.items() if k != "amountCents"}
+        assert abs(reference["amountCents"] - cents) < 1e-3
+
+    # Float products drift (1.1 * 100 == 110.00000000000001); the mapping does not.
+    assert units_to_cents(1.1) == 110
+    for _ in range(2_000):
+        amount = round(rng.uniform(0, 1_000), rng.choice([3, 4]))
+        exact = (Decimal(repr(amount)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_EVEN)
+        assert units_to_cents(amount) == int(exact)
+    assert units_to_cents(1.015) == 102
+    assert units_to_cents(1e15) == 10**17
+
+
+def test_wallet_rejects_fractional_cents(client, app_module):
+    _, database, models = app_module
+    payload = {"playerId": "player-1", "currency": "USD", "refId": "ref-frac"}
+    for amount in (0.5, 10.5, 11.5):
+        resp = client.post("/wallet/debit", json={**payload, "amountCents": amount}, headers=headers)
+        assert resp.status_code == 422
+    resp = client.post("/wallet/debit", json={**payload, "amountCents": 1250.0}, headers=headers)
+    assert resp.status_code == 200
+    with database.SessionLocal() as db:
+        assert db.query(models.Transaction.amount_cents).scalar() == 1250
+        assert db.query(models.OperatorWebhookOutbox).one().payload["amount"] == 12.5
+
+
+def test_outbox_payloads_are_stored_encoded_and_sent_as_is(client, app_module, monkeypatch):
+    main, database, models = app_module
+    from app import json_codec
+    from app.webhooks import integration_client, process_outbox
+
+    resp = client.post(
+        "/wallet/debit",
+        json={"playerId": "player-1", "amountCents": 1234, "currency": "EUR", "refId": "ref-enc"},
+        headers=headers,
+    )
+    assert resp.json() == {
+        "status": "initiated",
+        "balanceCents": -1234,
+        "reason": None,
+        "refId": "ref-enc",
+        "correlationId": resp.json()["correlationId"],
+    }
+
+    sent = []
+
+    class FakeResponse:
+        status_code = 200
+        headers = {}
+
+    async def fake_send(method, url, content, headers):
+        sent.append((content, headers))
+        return FakeResponse()
+
+    monkeypatch.setattr(integration_client.client, "request", fake_send)
+    with database.SessionLocal() as db:
+        record = db.query(models.OperatorWebhookOutbox).one()
+        assert isinstance(record.payload, json_codec.EncodedPayload)
+        raw = record.payload.raw
+        asyncio.run(process_outbox(db))
+
+    assert sent == [(raw, {"Content-Type": "application/json"})]
+    assert json_codec.stdlib_loads(raw) == {"amount": 12.34, "currency": "EUR", "reference": "ref-enc", "correlationId": resp.json()["correlationId"]}
+    listing = client.get("/webhooks/outbox", params={"queue": "operator"}, headers=headers).json()
+    assert listing[0]["payload"]["amount"] == 12.34
+
+    # Both backends agree on what they produce.
+    value = {"a": [1, 2.5, None, True], "b": "ünï", "c": datetime(2024, 1, 1, 12, 0)}
+    assert json_codec.stdlib_loads(json_codec.stdlib_dumps(value)) == json_codec.loads(json_codec.dumps(value))
+
+
+def test_outbox_lanes_are_weighted_and_promote_starved_records(client, app_module, monkeypatch):
+    main, database, models = app_module
+    import app.webhooks as webhooks
+
+    with database.SessionLocal() as db:
+        for i in range(4):
+            db.add(models.OperatorWebhookOutbox(event_type="credit", payload={"n": f"c{i}"}, target_url="http://op/credit"))
+            db.add(models.OperatorWebhookOutbox(event_type="debit", payload={"n": f"d{i}"}, target_url="http://op/debit"))
+            db.add(models.RGSWebhookOutbox(event_type="debit", payload={"n": f"n{i}"}, target_url="http://rgs/webhooks"))
+        db.commit()
+
+    class FakeResponse:
+        status_code = 200
+        headers = {}
+
+    delivered = []
+
+    async def fake_request(method, url, json):
+        delivered.append(json["n"][0])
+        return FakeResponse()
+
+    monkeypatch.setattr(webhooks.integration_client, "_request_with_retry", fake_request)
+    monkeypatch.setattr(main.settings, "outbox_max_inflight", 1)
+    with database.SessionLocal() as db:
+        asyncio.run(webhooks.process_outbox(db))
+
+    # Weights 4:2:1 interleave credits, debits and notifications instead of draining one queue first.
+    assert "".join(delivered[:7]) == "cdcncdc"
+    assert sorted(delivered) == sorted("cccc" "dddd" "nnnn")
+    lanes = client.get("/admin/outbox/lanes", headers=headers).json()
+    assert {lane: data["sent"] for lane, data in lanes.items()} == {"credit": 4, "debit": 4, "notification": 4}
+    assert lanes["credit"]["pending"] == 0 and lanes["credit"]["inflight"] == 0
+
+    delivered.clear()
+    with database.SessionLocal() as db:
+        db.add(models.OperatorWebhookOutbox(event_type="credit", payload={"n": "c"}, target_url="http://op/credit"))
+        waited = datetime.utcnow() - timedelta(minutes=5)
+        db.add(models.RGSWebhookOutbox(
+            event_type="debit", payload={"n": "n"}, target_url="http://rgs/webhooks", created_at=waited, next_attempt_at=waited,
+        ))
+        db.commit()
+        asyncio.run(webhooks.process_outbox(db))
+    assert delivered == ["n", "c"]
+    assert client.get("/admin/outbox/lanes", headers=headers).json()["notification"]["promoted"] == 1
+
+
+def test_log_outbox_backend_enqueues_delivers_and_recovers(client, app_module, monkeypatch):
+    main, database, models = app_module
+    import os
+    import app.webhooks as webhooks
+    from app.outbox_log import outbox_log
+
+    monkeypatch.setattr(main.settings, "outbox_backend", "log")
+    monkeypatch.setattr(main.settings, "outbox_log_segment_bytes", 600)
+    correlation_ids = []
+    for i in range(4):
+        resp = client.post(
+            "/wallet/debit",
+            json={"playerId": "player-1", "amountCents": 100 + i, "currency": "USD", "refId": f"ref-log{i}"},
+            headers=headers,
+        )
+        correlation_ids.append(resp.json()["correlationId"])
+    webhook_payload = {
+        "playerId": "player-1_ext", "amount": 1.00, "currency": "USD", "status": "OK",
+        "event": "withdraw", "refId": "ref-log0", "correlationId": correlation_ids[0],
+    }
+    for _ in range(2):
+        assert client.post("/webhooks/incoming", json=webhook_payload).status_code == 200
+
+    with database.SessionLocal() as db:
+        assert db.query(models.OperatorWebhookOutbox).count() == 0
+        assert db.query(models.RGSWebhookOutbox).count() == 0
+    counts = client.get("/webhooks/outbox/counts", headers=headers).json()
+    assert counts["operator"]["pending"] == 4 and counts["rgs"]["pending"] == 1
+
+    # Reopening rebuilds the index from the segments.
+    outbox_log.close()
+    assert [r.payload["amount"] for r in sorted(outbox_log.due("operator"), key=lambda r: r.id)] == [1.0, 1.01, 1.02, 1.03]
+
+    class FakeResponse:
+        def __init__(self, status_code):
+            self.status_code = status_code
+            self.headers = {}
+
+    delivered = []
+
+    async def fake_request(method, url, json):
+        delivered.append(json["correlationId"])
+        return FakeResponse(500 if json["correlationId"] == correlation_ids[3] else 200)
+
+    monkeypatch.setattr(webhooks.integration_client, "_request_with_retry", fake_request)
+    monkeypatch.setattr(main.settings, "outbox_max_attempts", 1)
+    with database.SessionLocal() as db:
+        asyncio.run(webhooks.process_outbox(db))
+    assert sorted(delivered) == sorted(correlation_ids + [correlation_ids[0]])
+
+    outbox_log.close()
+    assert outbox_log.counts() == {}
+    [letter] = client.get("/admin/dead-letter?queue=operator", headers=headers).json()
+    assert letter["payload"]["correlationId"] == correlation_ids[3]
+    # Segments holding only delivered records are compacted away.
+    assert len(os.listdir(main.settings.outbox_log_dir)) < 3
+
+    # A torn write at the tail is cut off on recovery.
+    resp = client.post(
+        "/wallet/credit",
+        json={"playerId": "player-1", "amountCents": 5, "currency": "USD", "refId": "ref-log-tail"},
+        headers=headers,
+    )
+    outbox_log.close()
+    last = sorted(os.listdir(main.settings.outbox_log_dir))[-1]
+    with open(os.path.join(main.settings.outbox_log_dir, last), "ab") as handle:
+        handle.write(b"\x00\x00\x01\x00partial")
+    assert [r.payload["correlationId"] for r in outbox_log.due("operator")] == [resp.json()["correlationId"]]
+
+
+def test_delivery_targets_isolate_a_failing_brand(client, app_module, monkeypatch):
+    main, database, models = app_module
+    import app.webhooks as webhooks
+    from app.config import DeliveryTarget
+
+    monkeypatch.setattr(main.settings, "delivery_targets", {
+        "slow": DeliveryTarget(base_url="http://brand-slow:9000", rate_limit_per_minute=600, concurrency=1, breaker_failure_threshold=2),
+        "fast": DeliveryTarget(base_url="http://brand-fast:9000", concurrency=2),
+    })
+    with database.SessionLocal() as db:
+        for i in range(5):
+            for brand in ("slow", "fast"):
+                db.add(models.OperatorWebhookOutbox(
+                    event_type="debit", payload={"brand": brand, "i": i}, target_url=f"http://brand-{brand}:9000/v2/players/p{i}/withdraw",
+                ))
+        db.commit()
+
+    class FakeResponse:
+        def __init__(self, status_code):
+            self.status_code = status_code
+            self.headers = {}
+
+    calls = {"slow": 0, "fast": 0}
+
+    def fake_for(brand, status_code):
+        async def fake_request(method, url, json):
+            calls[brand] += 1
+            return FakeResponse(status_code)
+        return fake_request
+
+    slow = webhooks.delivery_targets.for_host("brand-slow:9000")
+    fast = webhooks.delivery_targets.for_host("brand-fast:9000")
+    assert slow.client is not fast.client is not webhooks.integration_client
+    assert (slow.client.rate_limit_per_minute, fast.concurrency) == (600, 2)
+    monkeypatch.setattr(slow.client, "_request_with_retry", fake_for("slow", 503))
+    monkeypatch.setattr(fast.client, "_request_with_retry", fake_for("fast", 200))
+
+    with database.SessionLocal() as db:
+        asyncio.run(webhooks.process_outbox(db))
+        statuses = {
+            (r.payload["brand"], r.status) for r in db.query(models.OperatorWebhookOutbox)
+        }
+        assert statuses == {("fast", "sent"), ("slow", "failed"), ("slow", "pending")}
+    # The breaker opened after two failures; the other slow records were not attempted.
+    assert calls == {"slow": 2, "fast": 5}
+    targets = client.get("/admin/targets", headers=headers).json()
+    assert targets["brand-slow:9000"]["breaker"] == "open"
+    assert targets["brand-slow:9000"]["skipped"] == 3
+    assert targets["brand-fast:9000"] == {**targets["brand-fast:9000"], "name": "fast", "breaker": "closed", "sent": 5}
+
+    # After the reset period one trial goes through and closes the circuit again.
+    slow.breaker.opened_at -= main.settings.breaker_reset_seconds
+    monkeypatch.setattr(slow.client, "_request_with_retry", fake_for("slow", 200))
+    with database.SessionLocal() as db:
+        asyncio.run(webhooks.process_outbox(db))
+    assert slow.breaker.state == "closed"
+    assert calls["slow"] == 5
+
+
+def test_rate_limited_outbox_records_stay_due_later(client, app_module, monkeypatch):
+    main, database, models = app_module
+    import httpx
+    import app.webhooks as webhooks
+    from app.config import DeliveryTarget
+
+    monkeypatch.setattr(main.settings, "delivery_targets", {"limited": DeliveryTarget(base_url="http://brand-limited:9000", rate_limit_per_minute=1)})
+    with database.SessionLocal() as db:
+        for i in range(3):
+            db.add(models.OperatorWebhookOutbox(
+                event_type="debit", payload={"i": i}, target_url=f"http://brand-limited:9000/v2/players/p{i}/withdraw",
+            ))
+        db.commit()
+    calls = []
+    limited = webhooks.delivery_targets.for_host("brand-limited:9000")
+    limited.client._client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: calls.append(request) or httpx.Response(200, json={})))
+
+    with database.SessionLocal() as db:
+        asyncio.run(webhooks.process_outbox(db))
+        records = db.query(models.OperatorWebhookOutbox).order_by(models.OperatorWebhookOutbox.id).all()
+        assert len(calls) == 1
+        assert [(r.status, r.attempt_count) for r in records] == [("sent", 1), ("pending", 0), ("pending", 0)]
+        # Due again when the limiter frees a slot, not counted toward the dead letter.
+        assert all(r.next_attempt_at > datetime.utcnow() + timedelta(seconds=50) for r in records[1:])
+    state = client.get("/admin/targets", headers=headers).json()["brand-limited:9000"]
+    assert (state["sent"], state["failed"], state["throttled"], state["consecutiveFailures"]) == (1, 0, 2, 0)
+
+
+def test_outbox_delivered_rejection_reverses_the_transaction(client, app_module):
+    main, database, models = app_module
+    import httpx
+    import app.webhooks as webhooks
+    from app.database import ShardSessions
+
+    payload = {"playerId": "player-1", "amountCents": 500, "currency": "USD", "refId": "ref-blocked"}
+    resp = client.post("/wallet/debit", json=payload, headers=headers)
+    assert resp.json()["balanceCents"] == -500
+    # A snapshot taken before the operator answered already counts the debit.
+    sessions = ShardSessions()
+    main.balance_ledger.snapshot(sessions)
+    sessions.close()
+
+    target = webhooks.delivery_targets.for_host("mock-operator:8001")
+    target.client._client = httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: httpx.Response(403, json={"detail": "account blocked"}))
+    )
+    with database.SessionLocal() as db:
+        asyncio.run(webhooks.process_outbox(db))
+        assert db.query(models.OperatorWebhookOutbox).one().last_error == "rejected 403"
+
+    [entry] = client.get("/wallet/transactions/ref-blocked", headers=headers).json()["transactions"]
+    assert (entry["status"], entry["reason"], entry["balanceCents"]) == ("rejected", "account blocked", 0)
+    main.transaction_statuses.clear()
+    [entry] = client.get("/wallet/transactions/ref-blocked", headers=headers).json()["transactions"]
+    assert (entry["status"], entry["balanceCents"]) == ("rejected", 0)
+
+    credit = {**payload, "refId": "ref-after", "amountCents": 100}
+    assert client.post("/wallet/credit", json=credit, headers=headers).json()["balanceCents"] == 100
+    # A cold ledger recovers the same balance from the corrected snapshot.
+    main.balance_ledger.clear()
+    assert client.post("/wallet/credit", json={**credit, "refId": "ref-cold"}, headers=headers).json()["balanceCents"] == 200
+
+
+def test_transaction_status_query_uses_cache_and_database(client, app_module):
+    main, database, models = app_module
+    payload = {"playerId": "player-1", "amountCents": 500, "currency": "USD", "refId": "ref-status"}
+    correlation_id = client.post("/wallet/debit", json=payload, headers=headers).json()["correlationId"]
+
+    resp = client.get("/wallet/transactions/ref-status", headers=headers)
+    assert resp.status_code == 200
+    [entry] = resp.json()["transactions"]
+    assert (entry["correlationId"], entry["direction"], entry["status"], entry["amountCents"]) == (correlation_id, "debit", "initiated", 500)
+    assert client.get("/wallet/transactions/missing", headers=headers).status_code == 404
+
+    webhook_payload = {
+        "playerId": "player-1", "amount": 5.00, "currency": "USD", "status": "OK",
+        "event": "withdraw", "refId": "ref-status", "correlationId": correlation_id,
+    }
+    assert client.post("/webhooks/incoming", json=webhook_payload).status_code == 200
+    assert main.transaction_statuses.get(correlation_id)["status"] == "sent"
+
+    # Another process moved the transaction on: non-final cache entries are re-read.
+    client.post("/wallet/credit", json={**payload, "refId": "ref-other"}, headers=headers)
+    with database.SessionLocal() as db:
+        db.query(models.Transaction).filter(models.Transaction.ref_id == "ref-other").update({"status": "confirmed"})
+        db.commit()
+
+    main.transaction_statuses.clear()
+    resp = client.post(
+        "/wallet/transactions/query",
+        json={"refIds": ["ref-status", "ref-other", "ref-none"], "correlationIds": [correlation_id, "corr-none"]},
+        headers=headers,
+    )
+    assert resp.status_code == 200
+    body = resp.json()
+    assert [(t["refId"], t["status"]) for t in body["transactions"]] == [("ref-other", "confirmed"), ("ref-status", "sent")]
+    assert body["missing"] == {"refIds": ["ref-none"], "correlationIds": ["corr-none"]}
+    # Loaded from the database into the cache.
+    assert main.transaction_statuses.get(correlation_id)["status"] == "sent"
+
+
+def test_transaction_status_long_poll_wakes_on_callback(app_module, monkeypatch):
+    main, _, _ = app_module
+    import time
+    import httpx
+
+    # Only the in-process notification can end the wait early.
+    monkeypatch.setattr(main.settings, "transaction_status_poll_seconds", 30.0)
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://hub", headers=headers) as hub:
+            payload = {"playerId": "player-1", "amountCents": 250, "currency": "USD", "refId": "ref-poll"}
+            correlation_id = (await hub.post("/wallet/debit", json=payload)).json()["correlationId"]
+
+            started = time.monotonic()
+            unchanged = await hub.get("/wallet/transactions/ref-poll", params={"wait": 0.2})
+            assert unchanged.json()["transactions"][0]["status"] == "initiated"
+            assert time.monotonic() - started >= 0.2
+
+            async def callback():
+                await asyncio.sleep(0.1)
+                webhook_payload = {
+                    "playerId": "player-1", "amount": 2.50, "currency": "USD", "status": "OK",
+                    "event": "withdraw", "refId": "ref-poll", "correlationId": correlation_id,
+                }
+                return await hub.post("/webhooks/incoming", json=webhook_payload)
+
+            started = time.monotonic()
+            polled, delivered = await asyncio.gather(
+                hub.get("/wallet/transactions/ref-poll", params={"wait": 10, "status": "initiated"}),
+                callback(),
+            )
+            assert delivered.status_code == 200
+            assert polled.json()["transactions"][0]["status"] == "sent"
+            assert time.monotonic() - started < 2
+
+    asyncio.run(run())
+
+
+def test_transaction_status_long_poll_returns_its_connection_while_waiting(client, app_module, monkeypatch):
+    main, database, _ = app_module
+    import time
+    import httpx
+
+    payload = {"playerId": "player-1", "amountCents": 250, "currency": "USD", "refId": "ref-pool"}
+    assert client.post("/wallet/debit", json=payload, headers=headers).status_code == 200
+    monkeypatch.setattr(main.settings, "db_pool_size", 1)
+    monkeypatch.setattr(main.settings, "db_max_overflow", 0)
+    monkeypatch.setattr(main.settings, "transaction_status_poll_seconds", 30.0)
+    database.dispose_engine()
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://hub", headers=headers) as hub:
+            async def lookup():
+                await asyncio.sleep(0.1)
+                started = time.monotonic()
+                resp = await hub.get("/wallet/transactions/ref-unknown")
+                return resp.status_code, time.monotonic() - started
+
+            polled, (status_code, elapsed) = await asyncio.gather(
+                hub.get("/wallet/transactions/ref-pool", params={"wait": 1}),
+                lookup(),
+            )
+            assert polled.status_code == 200
+            assert status_code == 404 and elapsed < 0.5
+
+    asyncio.run(run())
+
+
+def test_transaction_status_serves_single_direction_refs_from_cache(client, app_module):
+    main, database, _ = app_module
+    from sqlalchemy import event
+
+    payload = {"playerId": "player-1", "amountCents": 500, "currency": "USD", "refId": "ref-single"}
+    correlation_id = client.post("/wallet/debit", json=payload, headers=headers).json()["correlationId"]
+    webhook_payload = {
+        "playerId": "player-1", "amount": 5.00, "currency": "USD", "status": "OK",
+        "event": "withdraw", "refId": "ref-single", "correlationId": correlation_id,
+    }
+    assert client.post("/webhooks/incoming", json=webhook_payload).status_code == 200
+    main.transaction_statuses.clear()
+    assert client.get("/wallet/transactions/ref-single", headers=headers).status_code == 200
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(database.engine, "before_cursor_execute", listener)
+    try:
+        resp = client.get("/wallet/transactions/ref-single", headers=headers)
+        assert [t["status"] for t in resp.json()["transactions"]] == ["sent"]
+        resp = client.post("/wallet/transactions/query", json={"refIds": ["ref-single"]}, headers=headers)
+        assert [t["correlationId"] for t in resp.json()["transactions"]] == [correlation_id]
+    finally:
+        event.remove(database.engine, "before_cursor_execute", listener)
+    assert statements == []
+
+
+def test_sharded_mode_keeps_keys_and_refs_unique_across_shards(sharded_client, app_module):
+    main, database, models = app_module
+    player_a, player_b = "player-0", next(f"player-{i}" for i in range(1, 20) if database.shard_for(f"player-{i}") != database.shard_for("player-0"))
+    payload = {"playerId": player_a, "amountCents": 100, "currency": "USD", "refId": "ref-x"}
+    first = sharded_client.post("/wallet/debit", json=payload, headers={**headers, "Idempotency-Key": "idem-x"})
+    assert first.status_code == 200
+    # Same player, same key: answered from the player's shard.
+    assert sharded_client.post("/wallet/debit", json=payload, headers={**headers, "Idempotency-Key": "idem-x"}).json() == first.json()
+
+    other = {**payload, "playerId": player_b, "refId": "ref-y"}
+    resp = sharded_client.post("/wallet/debit", json=other, headers={**headers, "Idempotency-Key": "idem-x"})
+    assert resp.status_code == 409 and resp.json()["detail"] == "idempotency conflict"
+    resp = sharded_client.post("/wallet/debit", json={**payload, "playerId": player_b}, headers=headers)
+    assert resp.status_code == 409 and resp.json()["detail"] == "duplicate reference"
+    # The credit for the same refId is a separate reservation.
+    assert sharded_client.post("/wallet/credit", json=payload, headers=headers).status_code == 200
+
+    for shard in (0, 1):
+        with database.shard_session(shard) as db:
+            assert db.query(models.Transaction).filter(models.Transaction.player_id == player_b).count() == 0
+
+
+def test_concurrent_duplicate_callback_is_treated_as_duplicate(client, app_module, monkeypatch):
+    main, database, models = app_module
+    import app.webhooks as webhooks
+
+    payload = {"playerId": "player-1", "amountCents": 500, "currency": "USD", "refId": "ref-race"}
+    correlation_id = client.post("/wallet/debit", json=payload, headers=headers).json()["correlationId"]
+    webhook_payload = {
+        "playerId": "player-1_ext", "amount": 5.00, "currency": "USD", "status": "OK",
+        "event": "withdraw", "refId": "ref-race", "correlationId": correlation_id,
+    }
+    assert client.post("/webhooks/incoming", json=webhook_payload).status_code == 200
+
+    # The next callback misses the committed row once, as if both checked before either committed.
+    real_existing = webhooks.existing_dedup_keys
+    misses = []
+
+    def racing_existing(db, model, keys):
+        if not misses:
+            misses.append(keys)
+            return set()
+        return real_existing(db, model, keys)
+
+    monkeypatch.setattr(webhooks, "existing_dedup_keys", racing_existing)
+    webhooks.recent_outbox_keys.clear()
+    assert client.post("/webhooks/incoming", json=webhook_payload).status_code == 200
+    assert misses
+    with database.SessionLocal() as db:
+        assert db.query(models.RGSWebhookOutbox).count() == 1
+
+
+def test_init_db_adds_columns_to_existing_tables(app_module, tmp_path, monkeypatch):
+    main, database, models = app_module
+    from sqlalchemy import create_engine, inspect, text
+
+    db_url = f"sqlite:///{tmp_path}/old.db"
+    old = create_engine(db_url)
+    with old.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE rgs_webhook_outbox (id INTEGER PRIMARY KEY, event_type VARCHAR NOT NULL, target_url VARCHAR NOT NULL, "
+            "payload BLOB NOT NULL, status VARCHAR NOT NULL, attempt_count INTEGER, next_attempt_at DATETIME, "
+            "last_error VARCHAR, created_at DATETIME)"
+        ))
+    old.dispose()
+
+    monkeypatch.setattr(main.settings, "db_url", db_url)
+    database.dispose_engine()
+    database.init_db()
+    inspector = inspect(database.get_engine())
+    assert "dedup_key" in {column["name"] for column in inspector.get_columns("rgs_webhook_outbox")}
+    assert any(index["unique"] and index["column_names"] == ["dedup_key"] for index in inspector.get_indexes("rgs_webhook_outbox"))
+    database.dispose_engine()
+
+
+def test_inbox_sets_aside_invalid_callbacks(client, app_module, monkeypatch):
+    main, database, models = app_module
+    from app.inbox import process_inbox
+
+    payload = {"playerId": "player-1", "amountCents": 500, "currency": "USD", "refId": "ref-bad"}
+    correlation_id = client.post("/wallet/debit", json=payload, headers=headers).json()["correlationId"]
+    webhook_payload = {
+        "playerId": "player-1_ext", "amount": 5.00, "currency": "USD", "status": "OK",
+        "event": "withdraw", "refId": "ref-bad", "correlationId": correlation_id,
+    }
+    monkeypatch.setattr(main.settings, "webhook_inbox_enabled", True)
+    assert client.post("/webhooks/incoming", json={**webhook_payload, "event": "bonus"}).status_code == 422
+
+    with database.SessionLocal() as db:
+        # Stored by an older process before the event was validated.
+        db.add(models.WebhookInbox(payload={**webhook_payload, "event": "bonus"}, status="pending"))
+        db.commit()
+    assert client.post("/webhooks/incoming", json=webhook_payload).status_code == 200
+
+    with database.SessionLocal() as db:
+        sessions = database.ShardSessions()
+        try:
+            assert process_inbox(db, sessions) == 2
+            assert process_inbox(db, sessions) == 0
+        finally:
+            sessions.close()
+        inbox = {i.status: i for i in db.query(models.WebhookInbox)}
+        assert set(inbox) == {"failed", "processed"}
+        assert "bonus" in inbox["failed"].last_error
+        assert db.query(models.RGSWebhookOutbox).count() == 1
+
+
+def test_sharded_dead_letter_replay_by_ids_requires_shard(sharded_client, app_module):
+    main, database, models = app_module
+    for shard in (0, 1):
+        with database.shard_session(shard) as db:
+            db.add(models.DeadLetterOutbox(
+                queue="rgs", original_id=1, event_type="debit", target_url="http://rgs/webhooks",
+                payload={"refId": f"ref-{shard}"}, attempt_count=5,
+            ))
+            db.commit()
+
+    resp = sharded_client.post("/admin/dead-letter/replay", json={"ids": [1]}, headers=headers)
+    assert resp.status_code == 400
+    resp = sharded_client.post("/admin/dead-letter/replay", params={"shard": 1}, json={"ids": [1]}, headers=headers)
+    assert resp.json() == {"status": "replayed", "count": 1}
+    with database.shard_session(0) as db:
+        assert db.query(models.DeadLetterOutbox).count() == 1
+
+
+def _import_mock(name, tmp_path, monkeypatch):
+    import importlib
+
+    monkeypatch.setenv("DB_URL", f"sqlite:///{tmp_path}/{name}.db")
+    monkeypatch.delenv("INTEGRATION_WEBHOOK_URL", raising=False)
+    monkeypatch.delitem(sys.modules, f"{name}.main", raising=False)
+    return importlib.import_module(f"{name}.main")
+
+
+@pytest.fixture
+def mock_operator(tmp_path, monkeypatch):
+    module = _import_mock("mock_operator", tmp_path, monkeypatch)
+    yield module
+    module.engine.dispose()
+
+
+def test_mock_operator_books_concurrent_duplicates_once(mock_operator):
+    import httpx
+
+    body = {"amount": 5.0, "currency": "USD", "reference": "ref-dup", "correlationId": "corr-dup"}
+
+    async def run():
+        transport = httpx.ASGITransport(app=mock_operator.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://operator") as operator:
+            # Both calls pass the validation before either is stored, like a timed-out inline call and its outbox retry.
+            responses = await asyncio.gather(*[operator.post("/v2/players/p1/withdraw", json=body) for _ in range(3)])
+            assert [r.status_code for r in responses] == [200, 200, 200]
+            # A duplicate that reaches the database anyway is skipped by the unique index.
+            mock_operator.transaction_writer._insert(
+                [{"player": "p1", "amount": 5.0, "currency": "USD", "reference": "ref-dup", "direction": "withdraw", "status": "OK", "correlation_id": "corr-dup"}]
+            )
+            return (await operator.get("/v2/transactions")).json()
+
+    assert [t["reference"] for t in asyncio.run(run())] == ["ref-dup"]
+
+
+def test_mock_operator_fault_settings(mock_operator):
+    client = TestClient(mock_operator.app)
+    body = {"amount": 1.0, "currency": "USD", "reference": "ref-fault", "correlationId": "corr-fault"}
+
+    resp = client.put("/admin/faults", json={"errorRate": 1})
+    assert resp.status_code == 200 and resp.json()["errorRate"] == 1
+    assert client.post("/v2/players/p1/deposit", json=body).status_code == 503
+
+    client.put("/admin/faults", json={"errorRate": 0, "rateLimitRate": 1, "retryAfterSeconds": 2})
+    resp = client.post("/v2/players/p1/deposit", json=body)
+    assert resp.status_code == 429 and resp.headers["Retry-After"] == "2.0"
+
+    assert client.put("/admin/faults", json={"errorRate": 2}).status_code == 422
+    client.put("/admin/faults", json={"rateLimitRate": 0, "maxRps": 1})
+    statuses = [client.post("/v2/players/p1/deposit", json=body).status_code for _ in range(3)]
+    assert statuses[0] == 200 and 429 in statuses[1:]
+    assert client.get("/admin/faults").json()["maxRps"] == 1
+    assert len(client.get("/v2/transactions").json()) == 1
+
+
+def test_mock_digest_endpoints_match_the_hub_digest(mock_operator, tmp_path, monkeypatch):
+    from app.clients.common import range_params
+    from app.reconciliation import compute_digest
+
+    mock_rgs = _import_mock("mock_rgs", tmp_path, monkeypatch)
+    times = [datetime(2026, 1, 1, 10, 5), datetime(2026, 1, 1, 10, 40), datetime(2026, 1, 1, 11, 15)]
+    rows = [(created_at, f"corr-{i}", 125 * (i + 1), "OK") for i, created_at in enumerate(times)]
+    with mock_operator.SessionLocal() as db:
+        for created_at, correlation_id, amount_cents, status in rows:
+            db.add(mock_operator.Transaction(
+                player="p1", amount=amount_cents / 100, currency="USD", reference=f"ref-{correlation_id}",
+                direction="withdraw", status=status, created_at=created_at, correlation_id=correlation_id,
+            ))
+        db.commit()
+    with mock_rgs.SessionLocal() as db:
+        for created_at, correlation_id, amount_cents, status in rows:
+            db.add(mock_rgs.ReceivedWebhook(
+                event="withdraw", ref_id=f"ref-{correlation_id}", status=status, playerId="p1",
+                amountCents=amount_cents, currency="USD", correlationId=correlation_id, created_at=created_at,
+            ))
+        db.commit()
+
+    try:
+        operator, rgs = TestClient(mock_operator.app), TestClient(mock_rgs.app)
+        for granularity in ("day", "hour", "minute"):
+            expected = compute_digest(rows, granularity)
+            assert operator.get("/v2/transactions/digest", params={"granularity": granularity}).json() == expected
+            assert rgs.get("/webhooks/digest", params={"granularity": granularity}).json() == expected
+
+        window = {"start": "2026-01-01T10:30:00", "end": "2026-01-01T11:00:00"}
+        expected = compute_digest(rows[1:2], "hour")
+        assert operator.get("/v2/transactions/digest", params=window).json() == expected
+        assert rgs.get("/webhooks/digest", params=window).json() == expected
+
+        params = range_params(datetime(2026, 1, 1, 10, 30), datetime(2026, 1, 1, 11, 30))
+        assert [t["correlationId"] for t in operator.get("/v2/transactions", params=params).json()] == ["corr-1", "corr-2"]
+        assert [w["correlationId"] for w in rgs.get("/webhooks", params=params).json()] == ["corr-1", "corr-2"]
+    finally:
+        mock_rgs.engine.dispose()
+
+
+def test_mock_operator_signs_status_callbacks(app_module, mock_operator, monkeypatch):
+    main, _, _ = app_module
+    import types
+    import httpx
+
+    hub = lambda timeout: httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), timeout=timeout)
+    monkeypatch.setattr(mock_operator, "httpx", types.SimpleNamespace(AsyncClient=hub))
+    monkeypatch.setattr(mock_operator, "INTEGRATION_STATUS_WEBHOOK_URL", "http://hub/webhooks/player-status")
+    monkeypatch.setattr(mock_operator, "HMAC_SECRET", main.settings.hmac_secret)
+
+    asyncio.run(mock_operator._send_status_callback("p9_ext", "blocked"))
+    assert main.account_status_cache.is_blocked("p9_ext")
+
+
+def test_capture_writers_sharing_a_file_keep_lines_whole(app_module, tmp_path, monkeypatch):
+    main, _, _ = app_module
+    import json
+    import threading
+    from app.capture import CaptureWriter
+
+    capture_file = tmp_path / "shared.jsonl"
+    monkeypatch.setattr(main.settings, "capture_file", str(capture_file))
+    monkeypatch.setattr(main.settings, "capture_flush_every", 3)
+    # Stand-ins for API worker processes appending to the same file.
+    writers = [CaptureWriter() for _ in range(4)]
+
+    def produce(index, writer):
+        for i in range(200):
+            writer.write({"w": index, "i": i, "b": "x" * 5000})
+        writer.close()
+
+    threads = [threading.Thread(target=produce, args=item) for item in enumerate(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    records = [json.loads(line) for line in capture_file.read_text().splitlines()]
+    assert len(records) == 800
+    for index in range(4):
+        assert [r["i"] for r in records if r["w"] == index] == list(range(200))
+
+
+def test_operator_brand_header_routes_to_its_delivery_target(client, app_module, monkeypatch):
+    main, database, models = app_module
+    import app.webhooks as webhooks
+    from app.config import DeliveryTarget
+
+    monkeypatch.setattr(main.settings, "delivery_targets", {"brand-a": DeliveryTarget(base_url="http://brand-a.example/api", timeout_seconds=3)})
+    payload = {"playerId": "player-1", "amountCents": 500, "currency": "USD", "refId": "ref-brand"}
+    assert client.post("/wallet/debit", json=payload, headers={**headers, "X-Operator-Brand": "brand-a"}).status_code == 200
+    resp = client.post("/wallet/debit", json={**payload, "refId": "ref-nobrand"}, headers={**headers, "X-Operator-Brand": "brand-z"})
+    assert resp.status_code == 400
+    assert client.post("/wallet/credit", json=payload, headers=headers).status_code == 200
+
+    with database.SessionLocal() as db:
+        urls = {r.event_type: r.target_url for r in db.query(models.OperatorWebhookOutbox)}
+    assert urls["debit"] == "http://brand-a.example/api/v2/players/player-1_ext/withdraw"
+    assert urls["credit"].startswith(str(main.settings.operator_base_url))
+
+    target = webhooks.delivery_targets.for_url(urls["debit"])
+    assert target.name == "brand-a" and target.client.timeout_seconds == 3
+    assert webhooks.delivery_targets.for_url(urls["credit"]).client.timeout_seconds == main.settings.target_timeout_seconds